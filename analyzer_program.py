@@ -1,14 +1,21 @@
-import time
-import pandas as pd
-import speedtest
-import subprocess
-import openpyxl
-import re
 import base64
-import seaborn as sns
-import matplotlib.pyplot as plt
+import json
+import time
 import streamlit as st
 import os
+from engine.store import ReadingStore, COLUMNS, POINT_METRICS
+from engine.dataset import DatasetCache
+from engine.aggregates import ReadingAggregates
+from engine.export import ExportCache, FORMATS
+from engine.sessions import SessionError, create_session, list_sessions, merge_sessions
+from engine.signal import format_signal
+from engine.adb import AdbClient
+from engine.throughput import make_backend
+from engine.adaptive import AdaptivePolicy
+from engine import survey
+from engine import charts
+from engine.timing import tracer
+from engine.spatial import HeatmapCache, floor_plan_path, plan_aspect, save_floor_plan
 
 # Streamlit page configuration
 st.set_page_config(
@@ -17,11 +24,14 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
-def set_background(image_file):
+# Every rerun is timed as a "render.page" span (see the performance panel)
+page_started = time.perf_counter()
+@st.cache_data
+def background_css(image_file):
+     """Encode the background image once per server process, not on every rerun."""
      with open(image_file, "rb") as image:
          encoded_string = base64.b64encode(image.read()).decode()
-     st.markdown(
-         f"""
+     return f"""
          <style>
          .stApp {{
              background-image: url(data:image/jpg;base64,{encoded_string});
@@ -30,253 +40,376 @@ def set_background(image_file):
              background-repeat: no-repeat;
          }}
          </style>
-         """,
-         unsafe_allow_html=True
-     )
+         """
+
+def set_background(image_file):
+     st.markdown(background_css(image_file), unsafe_allow_html=True)
 set_background("images/13.jpg")
 
 # Global state variables
 if "wifi_connected" not in st.session_state:
     st.session_state.wifi_connected = False
-if "wireless_device_id" not in st.session_state:
-    st.session_state.wireless_device_id = None
+if "wireless_device_ids" not in st.session_state:
+    st.session_state.wireless_device_ids = []
 if "test_results" not in st.session_state:
     st.session_state.test_results = None
 if "available_devices" not in st.session_state:
     st.session_state.available_devices = []
-if "location_counts" not in st.session_state:
-    st.session_state.location_counts = {}
-if "completed_floors" not in st.session_state:
-    st.session_state.completed_floors = set()
+if "survey" not in st.session_state:
+    st.session_state.survey = None
 if "tests_run" not in st.session_state:
     st.session_state.tests_run = False
+if "samplers" not in st.session_state:
+    st.session_state.samplers = {}
+if "test_job" not in st.session_state:
+    st.session_state.test_job = None
+if "last_timings" not in st.session_state:
+    st.session_state.last_timings = {}
+if "plan_uploads" not in st.session_state:
+    st.session_state.plan_uploads = {}
 
 # Paths
 adb_path = r"app/adb.exe"
-excel_path = r"Data/network_readings.xlsx"
-if "excel_cleared" not in st.session_state:
-    if os.path.exists(excel_path):
-        try:
-            os.remove(excel_path)
-            st.session_state.excel_cleared = True
-            st.toast("📁 Fresh Excel file created for this session.")
-        except Exception as e:
-            st.error(f"❌ Failed to delete existing Excel file: {str(e)}")
-            st.stop()
+adb_client = AdbClient(adb_path)
+# Seconds between background `adb devices` polls
+device_poll_interval = 5.0
+first_poll_timeout = 1.0
+# Continuous sampling keeps the most recent samples only (about 30 min at 2 Hz)
+sample_buffer_size = 4096
+live_chart_points = 600
+sessions_dir = r"Data/sessions"
+export_dir = r"Data/exports"
+floor_plan_dir = r"Data/floor_plans"
+# Map cells farther than this (fraction of the plan width) from any reading count as unmeasured
+coverage_gap = 0.15
+
+@st.cache_resource
+def get_store(path):
+    """Open the reading store once per server process."""
+    return ReadingStore(path)
+
+# Everything derived from a store is cached per database path, i.e. per survey session
+@st.cache_resource
+def get_dataset_cache(path):
+    """Share one dataset cache across reruns and sessions."""
+    return DatasetCache(get_store(path))
+
+@st.cache_resource
+def get_aggregates(path):
+    """Running floor/location/device statistics, updated as each reading is saved."""
+    return ReadingAggregates.attach(get_store(path))
+
+@st.cache_resource
+def get_export_cache(path, directory):
+    """Exports are written on request and reused until new readings arrive."""
+    return ExportCache(get_store(path), directory)
+
+@st.cache_resource
+def get_heatmap_cache(path):
+    """Coverage maps live across reruns and only take in newly saved points."""
+    return HeatmapCache(get_store(path))
+
+@st.cache_data
+def get_plan_aspect(path, modified):
+    """Height / width of a floor plan, read once per uploaded file."""
+    return plan_aspect(path)
+
+@st.cache_data
+def get_sessions(directory, modified):
+    """Saved sessions, parsed again only when a checkpoint in ``directory`` is written."""
+    return list_sessions(directory)
 
 # Ensure output directory exists
-def ensure_output_directory(path):
-    """Create directory for the given path if it doesn't exist."""
+def ensure_output_directory(directory):
+    """Create ``directory`` if it doesn't exist."""
     try:
-        directory = os.path.dirname(path)
         os.makedirs(directory, exist_ok=True)
         return True, None
     except Exception as e:
         return False, f"Failed to create directory {directory}: {str(e)}"
 
 # Check output path
-success, error = ensure_output_directory(excel_path)
+success, error = ensure_output_directory(sessions_dir)
 if not success:
     st.error(error, icon="❌")
-    st.error("❌ Cannot save Excel file. Check permissions and paths.", icon="❌")
+    st.error("❌ Cannot save readings. Check permissions and paths.", icon="❌")
     st.stop()
 
-# Helper Functions
-def level_bars(level):
-    """Returns a visual representation of signal strength using bars."""
-    bars = bars = [
-        "🔴 ▁ |",
-        "🟠 ▃ ||",
-        "🟡 ▆ |||",
-        "🟢 █ ||||"
-    ]
-    try:
-        level = int(level)
-    except (ValueError, TypeError):
-        level = 0
-    return bars[min(level, len(bars)-1)]
+def resume_session(session):
+    """Make ``session`` the active survey: restore its plan, progress and devices."""
+    # Only readings saved after the last checkpoint are read back
+    found = session.catch_up(get_store(session.db_path))
+    if found:
+        session.save()
+    st.session_state.survey = session
+    st.session_state.num_floors = min(max(session.floors, 1), 10)
+    st.session_state.points_per_floor = min(max(session.points_per_floor, 1), 10)
+    st.session_state.tests_run = session.tests() > 0
+    st.session_state.test_results = None
+    if session.devices:
+        st.session_state.wireless_device_ids = list(session.devices)
+        st.session_state.wifi_connected = True
+    elif st.session_state.wireless_device_ids:
+        # A fresh session carries on with the phones already connected
+        for device_id in st.session_state.wireless_device_ids:
+            session.bind_device(device_id)
+        session.save()
+
+# Survey sessions: readings and progress live on disk, so a refresh or restart picks up where it left off
+st.sidebar.title("📂 Survey Session")
+if "pending_session" in st.session_state:
+    st.session_state.session_select = st.session_state.pop("pending_session")
+# Checkpoints are moved into place on every create/save/merge, which bumps the directory mtime
+saved_sessions = {session.id: session for session in get_sessions(sessions_dir, os.stat(sessions_dir).st_mtime_ns)}
+if not saved_sessions:
+    first_session = create_session(sessions_dir, f"Survey {time.strftime('%Y-%m-%d')}")
+    saved_sessions[first_session.id] = first_session
+session_id = st.sidebar.selectbox(
+    "Session", options=list(saved_sessions) + [None], key="session_select",
+    format_func=lambda key: "➕ New Session" if key is None else saved_sessions[key].title()
+)
+if session_id is None:
+    # Coming back to a session afterwards restores it from its checkpoint
+    st.session_state.survey = None
+    new_session_name = st.sidebar.text_input("Session Name", value=f"Survey {time.strftime('%Y-%m-%d %H:%M')}")
+    if st.sidebar.button("Start Session ▶️"):
+        try:
+            st.session_state.pending_session = create_session(sessions_dir, new_session_name).id
+            st.rerun()
+        except SessionError as e:
+            st.sidebar.error(str(e), icon="❌")
+    st.info("Name the new survey session in the sidebar and start it.", icon="ℹ️")
+    st.stop()
+with st.sidebar.expander("🔀 Merge Sessions"):
+    merge_ids = st.multiselect("Sessions to Merge", options=list(saved_sessions), format_func=lambda key: saved_sessions[key].title(), key="merge_select")
+    merge_name = st.text_input("Merged Session Name", value="Merged survey", key="merge_name")
+    if st.button("Merge 🔀"):
+        try:
+            st.session_state.pending_session = merge_sessions(sessions_dir, [saved_sessions[key] for key in merge_ids], merge_name).id
+            st.rerun()
+        except SessionError as e:
+            st.error(str(e), icon="❌")
+if st.session_state.survey is None or st.session_state.survey.id != session_id:
+    resume_session(saved_sessions[session_id])
+    if st.session_state.survey.tests():
+        st.toast(f"📁 Resumed {st.session_state.survey.name}.")
+survey_session = st.session_state.survey
+st.sidebar.caption(f"🧭 {survey_session.tests()} point(s) measured on {len(survey_session.progress)} floor(s)")
+
+store = get_store(survey_session.db_path)
+dataset_cache = get_dataset_cache(survey_session.db_path)
+heatmap_cache = get_heatmap_cache(survey_session.db_path)
+aggregates = get_aggregates(survey_session.db_path)
+export_cache = get_export_cache(survey_session.db_path, os.path.join(export_dir, survey_session.id))
+# Each survey is its own building, so floor plans are kept per session too
+session_plan_dir = os.path.join(floor_plan_dir, survey_session.id)
 
-def get_adb_devices():
-    """Retrieve a list of connected ADB devices."""
-    try:
-        result = subprocess.run([adb_path, "devices"], capture_output=True, text=True, check=True)
-        devices = [line.split()[0] for line in result.stdout.strip().splitlines() if "device" in line and not line.startswith("List")]
-        return devices, None
-    except subprocess.CalledProcessError as e:
-        return [], f"❌ ADB command failed: {str(e)}"
-    except Exception as e:
-        return [], f"❌ Exception: {str(e)}"
+# Helper Functions
+@st.cache_resource
+def get_device_watcher():
+    """Poll ``adb devices`` in the background; reruns only read the last result."""
+    return survey.DeviceWatcher(adb_client, interval=device_poll_interval).start()
+
+def add_wireless_device(device_id, usb_device=None):
+    """Remember a Wi-Fi ADB device for this session's tests, and in the survey checkpoint."""
+    if device_id not in st.session_state.wireless_device_ids:
+        st.session_state.wireless_device_ids.append(device_id)
+    st.session_state.wifi_connected = True
+    st.session_state.survey.bind_device(device_id, usb_device)
+    st.session_state.survey.save()
 
 def establish_wifi_adb_connection(usb_device):
     """Establish Wi-Fi ADB connection to the specified device."""
-    try:
-        if not usb_device:
-            return False, "No device selected.", "Please choose a device from the dropdown.</span>"
-
-        subprocess.run([adb_path, "-s", usb_device, "tcpip", "5555"], check=True)
-        time.sleep(2)
-
-        ip_result = subprocess.run(
-            [adb_path, "-s", usb_device, "shell", "ip -f inet addr show"],
-            capture_output=True, text=True, check=True
-        )
-        device_ip = None
-        current_interface = ""
-        for line in ip_result.stdout.strip().splitlines():
-            if re.match(r"\d+:\s+\w+", line):
-                current_interface = line.split(":")[1].strip()
-            elif "inet " in line and ("wlan" in current_interface or "wifi" in current_interface):
-                match = re.search(r'inet (\d+\.\d+\.\d+\.\d+)/', line)
-                if match:
-                    device_ip = match.group(1)
-                    break
-
-        if not device_ip:
-            return False, "❌ <span style='color:red'>Could not find valid Wi-Fi IP address.", "Ensure device is connected to Wi-Fi.</span>"
-
-        wireless_device_id = f"{device_ip}:5555"
-        connect_result = subprocess.run(
-            [adb_path, "connect", wireless_device_id],
-            capture_output=True, text=True, check=True
-        )
-        if "connected" in connect_result.stdout.lower():
-            st.session_state.wifi_connected = True
-            st.session_state.wireless_device_id = wireless_device_id
-            return True, f"✅ <span style='color:green'>Connected to {wireless_device_id} 📡</span>", f"<span style='color:green'>You can detach your mobile phone 📱</span>"
-        return False, f"❌ <span style='color:red'>Failed to connect: {connect_result.stdout.strip()}", "Check ADB setup and firewall settings.</span>"
-    except subprocess.CalledProcessError as e:
-        return False, f"❌ <span style='color:red'>ADB command failed: {str(e)}", "ADB error occurred during connection attempt.</span>"
-    except Exception as e:
-        return False, f"❌ <span style='color:red'>Exception: {str(e)}", "Unexpected error during connection.</span>"
-
-def get_signal_strength():
-    """Get mobile network signal strength via ADB."""
-    try:
-        if not st.session_state.wifi_connected:
-            return "Wi-Fi ADB connection not established."
-        
-        result = subprocess.run(
-            [adb_path, "-s", st.session_state.wireless_device_id, "shell", "dumpsys telephony.registry"],
-            capture_output=True, text=True, check=True
-        )
-        output = result.stdout
-
-        match_5g = re.search(r"ssRsrp\s*=\s*(-?\d+).*?level\s*=\s*(\d+)", output)
-        if match_5g:
-            rsrp_5g, level_5g = match_5g.groups()
-            return f"5G NR | Signal Strength: {rsrp_5g} dBm | Level: {level_bars(level_5g)}"
-
-        match_4g = re.search(r"mLte=CellSignalStrengthLte:.*?rsrp\s*=\s*(-?\d+).*?level\s*=\s*(\d+)", output)
-        if match_4g:
-            rsrp_4g, level_4g = match_4g.groups()
-            return f"4G LTE | Signal Strength: {rsrp_4g} dBm | Level: {level_bars(level_4g)}"
-
-        return "⚠️ <span style='color:orange'>Signal Strength Not Found</span>"
-    except Exception as e:
-        return f"❌ <span style='color:red'>Error: {str(e)}</span>"
-
-def get_internet_speed(floor, location):
-    """Measure internet speed with retry or fall back to saved data."""
-    for attempt in range(2):
-        try:
-            stest = speedtest.Speedtest()
-            stest.get_best_server()
-            download_speed = stest.download() / 1_000_000
-            upload_speed = stest.upload() / 1_000_000
-            return round(download_speed, 2), round(upload_speed, 2), None
-        except Exception as e:
-            if attempt == 1:
-                try:
-                    df = pd.read_excel(excel_path, sheet_name=f"Floor_{floor}")
-                    if not df.empty and location in df["Location"].values:
-                        location_data = df[df["Location"] == location]
-                        download_speed = location_data["Download Speed (Mbps)"].mean()
-                        upload_speed = location_data["Upload Speed (Mbps)"].mean()
-                        return round(download_speed, 2), round(upload_speed, 2), f"Speedtest failed: {str(e)}. Using saved data."
-                    return 0, 0, f"⚠️ <span style='color:yellow'>Speedtest failed: {str(e)}. Using placeholders (0 Mbps).</span>"
-                except:
-                    return 0, 0, f"⚠️ <span style='color:yellow'>Speedtest failed: {str(e)}. Using placeholders (0 Mbps).</span>"
-
-def save_to_excel(floor, row):
-    try:
-        import openpyxl
-        sheet_name = f"Floor_{floor}"
-        new_row = pd.DataFrame([row], columns=[
-            "Floor", "Location", "Signal Strength (dBm)",
-            "Download Speed (Mbps)", "Upload Speed (Mbps)"
-        ])
-
-        # Load existing sheets if the file exists
-        if os.path.exists(excel_path):
-            with pd.ExcelFile(excel_path, engine='openpyxl') as xls:
-                existing_sheets = xls.sheet_names
-                all_data = {}
-                for sheet in existing_sheets:
-                    all_data[sheet] = pd.read_excel(xls, sheet_name=sheet)
-        else:
-            all_data = {}
-
-        # Append or create the sheet for the floor
-        if sheet_name in all_data:
-            all_data[sheet_name] = pd.concat([all_data[sheet_name], new_row], ignore_index=True)
+    device_id, message, text = survey.establish_wifi_adb_connection(adb_client, usb_device)
+    if device_id:
+        add_wireless_device(device_id, usb_device)
+    return device_id is not None, message, text
+
+def make_signal_reader(device_id):
+    """Signal reader bound to ``device_id``, safe to call off the script thread."""
+    return survey.make_signal_reader(adb_client, device_id)
+
+def render_sampling_panel(samplers):
+    """Live chart and per-location summary of the continuous samplers, one per device."""
+    import pandas as pd
+    series, summaries = [], []
+    for device_id, sampler in samplers.items():
+        timestamps, dbm = sampler.series()
+        buffered = len(timestamps)
+        timestamps, dbm = charts.downsample(timestamps, dbm, max_points=live_chart_points)
+        status = "running" if sampler.running else "stopped"
+        st.caption(f"{device_id}: {buffered} samples buffered ({sampler.buffer.written} taken, {status}, {sampler.errors} errors)")
+        if sampler.last_error:
+            st.warning(f"Last sampling error on {device_id}: {sampler.last_error}", icon="⚠️")
+        series.append(pd.DataFrame({"Time": pd.to_datetime(timestamps, unit="s"), "Signal Strength (dBm)": dbm, "Device": device_id}))
+        summary = pd.DataFrame.from_dict(sampler.summaries(), orient="index")
+        summary.insert(0, "Device", device_id)
+        summaries.append(summary)
+    data = pd.concat(series, ignore_index=True)
+    if not data.empty:
+        st.line_chart(data, x="Time", y="Signal Strength (dBm)", color="Device")
+        st.dataframe(pd.concat(summaries))
+
+def render_test_job(job):
+    """Progress, partial results and a cancel button for the running test."""
+    partial = job.partial
+    st.progress(job.progress, text=f"{job.phase}... ({job.elapsed:.0f}s)")
+    lines = []
+    for device_id, (signal, samples) in partial["signals"].items():
+        lines.append(f"⚡ <b>Signal</b> ({device_id}): {format_signal(signal) if signal is not None else 'waiting...'} ({samples} samples)")
+    if partial.get("download") is not None:
+        lines.append(f"⬇️ <b>Download Speed</b>: {partial['download']} Mbps")
+    st.markdown("<br>".join(lines), unsafe_allow_html=True)
+    if st.button("Cancel Test ✖️"):
+        job.cancel()
+    if not job.running:
+        # Hand the outcome back to the full page so the analysis refreshes
+        finish_test_job(job)
+        st.rerun()
+
+def finish_test_job(job):
+    """Record a finished test in the session and build its result message."""
+    from engine.runner import DONE, CANCELLED
+    st.session_state.test_job = None
+    st.session_state.last_timings = dict(job.timings)
+    if job.state == CANCELLED:
+        st.session_state.test_results = f"⚠️ <span style='color:orange'>Test at {job.location} cancelled.</span>"
+        return
+    if job.state != DONE:
+        st.session_state.test_results = f"❌ <span style='color:red'>Test failed: {job.error}</span>"
+        return
+    result = job.result
+    lines = []
+    for device_id in job.devices:
+        signal = job.signals.get(device_id)
+        if signal is not None:
+            signal_text = format_signal(signal)
+        elif result["signal_errors"][device_id]:
+            signal_text = f"❌ <span style='color:red'>Error: {result['signal_errors'][device_id]}</span>"
         else:
-            all_data[sheet_name] = new_row
-
-        # Now write all sheets back (including updated one)
-        with pd.ExcelWriter(excel_path, engine='openpyxl', mode='w') as writer:
-            for sheet_name, df in all_data.items():
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-        return True, f"✅ <span style='color:green'>Data saved to {sheet_name} sheet.</span>"
+            signal_text = "⚠️ <span style='color:orange'>Signal Strength Not Found</span>"
+        lines.append(f"⚡ <b>Signal</b> ({device_id}): {signal_text}")
+    bounds = result["bounds"]
+    lines.append(f"⬇️ <b>Download Speed</b>: {survey.format_speed(result['download'], bounds.get('download'))}")
+    lines.append(f"⬆️ <b>Upload Speed</b>: {survey.format_speed(result['upload'], bounds.get('upload'))}")
+    if result["speed_error"]:
+        lines.append(result["speed_error"])
+    lines.extend(result["save_messages"].values())
+    result_message = "<br>".join(lines)
+    st.session_state.test_results = result_message
+    # Checkpoint the point together with the newest stored row, once a reading of it was saved
+    if any(result["saved"].values()):
+        st.session_state.survey.record(job.floor, job.location, store.last_id())
+        st.session_state.survey.save()
+
+@st.cache_resource
+def get_throughput_backend(name, target=None, server_ttl=None):
+    """Build the selected throughput backend once; speedtest.net keeps its server choice."""
+    return make_backend(name, target, server_ttl)
+
+def get_internet_speed(backend, floor, location, progress=None, cancel_event=None, policy=None):
+    """Measure internet speed, retrying a failed phase or falling back to saved data."""
+    return survey.get_internet_speed(backend, store, floor, location, progress, cancel_event, policy)
+
+def save_reading(floor, location, signal, download_speed, upload_speed, device=None, timings=None, position=None, bounds=None):
+    """Append a single reading to the data store."""
+    return survey.save_reading(store, floor, location, signal, download_speed, upload_speed, device, timings, position, bounds)
+
+def render_performance_panel():
+    """Sidebar breakdown of where the time went, plus a Chrome trace download."""
+    with st.sidebar.expander("⏱️ Performance", expanded=True):
+        if st.session_state.last_timings:
+            st.caption("Last test (s)")
+            st.dataframe([{"Stage": stage, "Time": value} for stage, value in st.session_state.last_timings.items()], hide_index=True)
+        summary = tracer.summary()
+        if summary:
+            st.caption("All stages since start (ms)")
+            st.dataframe(summary, hide_index=True)
+        st.download_button(
+            label="Download Trace 🧾",
+            data=json.dumps(tracer.chrome_trace()),
+            file_name="network_analyzer_trace.json",
+            mime="application/json"
+        )
+        if st.button("Clear Timings"):
+            tracer.clear()
 
-    except ImportError:
-        return False, "❌ <span style='color:red'>openpyxl is not installed. Run 'pip install openpyxl'.</span>"
-    except Exception as e:
-        return False, f"❌ <span style='color:red'>Error saving to Excel: {str(e)}</span>"
+    
+def show_chart(chart):
+    """Display a chart from the chart layer, whichever backend built it."""
+    if isinstance(chart, bytes):
+        st.image(chart, use_column_width=True)
+    else:
+        st.altair_chart(chart, use_container_width=True)
 
+def floor_means_frame():
+    """Per-floor averages from the running aggregates, as the floor charts expect them."""
+    import pandas as pd
+    return pd.DataFrame(aggregates.floor_means())
 
-    
-def extract_signal_info(value):
-    """Extract signal strength value from string."""
-    if not isinstance(value, str):
-        return None
-    match_signal = re.search(r"Signal Strength:\s*(-?\d+)\s*dBm", value, re.IGNORECASE)
-    return int(match_signal.group(1)) if match_signal else None
-
-def load_excel(floor=None):
-    """Load data from Excel for all floors or a specific floor."""
+def load_dataset():
+    """Return the cached dataset; it is only rebuilt after a new reading is saved."""
     if not st.session_state.tests_run:
         return None, None
     try:
-        import openpyxl
-        if not os.path.exists(excel_path):
-            return None, "No data file found. Run tests to generate data."
-        
-        if floor is not None:
-            sheet_name = f"Floor_{floor}"
-            df = pd.read_excel(excel_path, sheet_name=sheet_name)
-            if df.empty:
-                return None, f"No data for Floor {floor}."
-            return df, None
-        
-        with pd.ExcelFile(excel_path) as xls:
-            all_dfs = [pd.read_excel(xls, sheet_name=sheet) for sheet in xls.sheet_names]
-        if not all_dfs:
-            return None, "Excel file is empty."
-        df = pd.concat(all_dfs, ignore_index=True)
-        return df, None
-    except ImportError:
-        return None, "Error: openpyxl library not installed. Run 'pip install openpyxl'."
+        dataset = dataset_cache.get()
+        if dataset.empty:
+            return None, "No data recorded yet. Run tests to generate data."
+        return dataset, None
     except Exception as e:
-        return None, f"Error loading Excel: {str(e)}"
+        return None, f"Error loading data: {str(e)}"
+
+def load_readings(floor=None):
+    """Load readings for all floors or a specific floor."""
+    dataset, error = load_dataset()
+    if dataset is None:
+        return None, error
+    if floor is not None:
+        df = dataset.floor(floor)
+        if df is None:
+            return None, f"No data for Floor {floor}."
+        return df, None
+    return dataset.frame, None
 
 # Sidebar Configuration
 st.sidebar.title("⚙️ Settings")
-num_floors = st.sidebar.number_input("🔢 Number of Floors", min_value=1, max_value=10, value=1)
-points_per_floor = st.sidebar.number_input("📍 Points per Floor", min_value=1, max_value=10, value=1)
-
-# Fetch available devices
-devices, error = get_adb_devices()
+num_floors = st.sidebar.number_input("🔢 Number of Floors", min_value=1, max_value=10, key="num_floors")
+points_per_floor = st.sidebar.number_input("📍 Points per Floor", min_value=1, max_value=10, key="points_per_floor")
+if (num_floors, points_per_floor) != (survey_session.floors, survey_session.points_per_floor):
+    survey_session.floors, survey_session.points_per_floor = num_floors, points_per_floor
+    survey_session.save()
+
+# Throughput backend
+backend_name = st.sidebar.selectbox("🚀 Speed Test Backend", options=["speedtest.net", "iperf3", "HTTP"])
+if backend_name == "iperf3":
+    backend_target = st.sidebar.text_input("iperf3 Server Host", value="192.168.1.10")
+    throughput_backend = get_throughput_backend(backend_name, backend_target)
+elif backend_name == "HTTP":
+    backend_target = st.sidebar.text_input("HTTP Test Server URL", value="http://127.0.0.1:8090")
+    throughput_backend = get_throughput_backend(backend_name, backend_target)
+else:
+    server_ttl_minutes = st.sidebar.number_input("⏳ Re-select Server After (min)", min_value=1, max_value=240, value=30)
+    throughput_backend = get_throughput_backend(backend_name, server_ttl=server_ttl_minutes * 60)
+
+# Adaptive speed tests stop once the rate has settled and skip the upload unless asked
+adaptive_policy = None
+if st.sidebar.checkbox("🎯 Adaptive Speed Test", help="Stop each test once the measured rate is stable"):
+    confidence = st.sidebar.select_slider("Confidence", options=[0.8, 0.9, 0.95, 0.99], value=0.95)
+    tolerance = st.sidebar.slider("Stop Within ± (%)", min_value=2, max_value=30, value=10)
+    short_upload = st.sidebar.checkbox("Short Upload Test", value=False)
+    adaptive_policy = AdaptivePolicy(confidence, tolerance / 100, short_upload=short_upload)
+
+# Chart rendering backend
+chart_style = st.sidebar.radio("📊 Chart Style", options=["Interactive", "Static"], horizontal=True)
+chart_backend = charts.ALTAIR if chart_style == "Interactive" else charts.MATPLOTLIB
+
+# Available devices come from the background watcher; only the very first
+# run waits (briefly) for its first poll
+device_watcher = get_device_watcher()
+device_watcher.wait(timeout=first_poll_timeout)
+if st.sidebar.button("🔄 Refresh Devices"):
+    device_watcher.refresh(timeout=first_poll_timeout)
+devices, error = device_watcher.devices, device_watcher.error
 if error:
     st.sidebar.error(error, icon="❌")
 elif not devices:
@@ -284,9 +417,16 @@ elif not devices:
 else:
     st.session_state.available_devices = devices
 
-# Device selection dropdown
-selected_device = st.sidebar.selectbox("🔍 Select ADB Device", options=st.session_state.available_devices, key="device_select")
+# Device selection, one worker per connected device during tests
+selected_devices = st.sidebar.multiselect("🔍 Select ADB Devices", options=st.session_state.available_devices, key="device_select")
 connect_button = st.sidebar.button("🔗 Connect via Wi-Fi ADB")
+if st.session_state.wireless_device_ids:
+    st.sidebar.caption("📡 Testing with: " + ", ".join(st.session_state.wireless_device_ids))
+    # After an app or ADB server restart the session's Wi-Fi devices need reconnecting
+    missing_devices = [device_id for device_id in st.session_state.wireless_device_ids if ":" in device_id and device_id not in devices]
+    reconnect_button = bool(missing_devices) and st.sidebar.button("🔗 Reconnect Session Devices")
+else:
+    missing_devices, reconnect_button = [], False
 
 # Main Page
 st.title("🌐 Mobile Network Analyzer")
@@ -296,18 +436,28 @@ status_box = st.empty()
 
 # Handle ADB Connection
 if connect_button:
-    if not selected_device:
+    if not selected_devices:
         status_box.error(" Please select a device.", icon="❌")
     else:
-        connected, message, text = establish_wifi_adb_connection(selected_device)
-        status_box.markdown(f"{message}<br>{text}", unsafe_allow_html=True)
+        messages = []
+        for device in selected_devices:
+            connected, message, text = establish_wifi_adb_connection(device)
+            messages.append(f"{message}<br>{text}")
+        status_box.markdown("<br>".join(messages), unsafe_allow_html=True)
+if reconnect_button:
+    messages = [survey.reconnect_wifi_device(adb_client, device_id)[1] for device_id in missing_devices]
+    device_watcher.refresh(timeout=first_poll_timeout)
+    status_box.markdown("<br>".join(messages), unsafe_allow_html=True)
 st.sidebar.write('---')
 
-# Delete existing Excel file to start fresh
-if st.sidebar.button("🔁 Reset Excel File"):
-    if os.path.exists(excel_path):
-        os.remove(excel_path)
-        st.sidebar.success(" Excel file reset.",icon="✅")
+# Delete this session's readings to start it afresh
+if st.sidebar.button("🔁 Reset Data"):
+    store.clear()
+    export_cache.clear()
+    survey_session.reset()
+    survey_session.save()
+    st.sidebar.success(" Data reset.",icon="✅")
+show_performance = st.sidebar.toggle("⏱️ Show Performance Panel")
 
 # Test Configuration
 st.subheader("Test Configuration 🖥️",divider="green")
@@ -316,6 +466,27 @@ with col1:
     floor_number = st.selectbox("Select Floor 🔻", options=list(range(1, num_floors+1)), key="floor_select")
 with col2:
     location_name = st.text_input("Location Name ✒️", key="location_input")
+with st.expander("🗺️ Position on Floor Plan"):
+    uploaded_plan = st.file_uploader(f"Floor Plan for Floor {floor_number}", type=["png", "jpg", "jpeg"], key=f"plan_upload_{survey_session.id}_{floor_number}")
+    if uploaded_plan is not None and st.session_state.plan_uploads.get((survey_session.id, floor_number)) != uploaded_plan.file_id:
+        try:
+            save_floor_plan(session_plan_dir, floor_number, uploaded_plan.getvalue(), uploaded_plan.name)
+            st.session_state.plan_uploads[survey_session.id, floor_number] = uploaded_plan.file_id
+        except Exception as e:
+            st.error(f"Failed to save floor plan: {str(e)}", icon="❌")
+    tag_position = st.checkbox("Tag this point with its position", key="tag_position")
+    col_x, col_y = st.columns(2)
+    with col_x:
+        position_x = st.slider("X (% of plan width) ↔️", 0.0, 100.0, 50.0, step=0.5, key="position_x")
+    with col_y:
+        position_y = st.slider("Y (% of plan height) ↕️", 0.0, 100.0, 50.0, step=0.5, key="position_y")
+    position = (position_x / 100, position_y / 100) if tag_position else None
+    if position is not None and heatmap_cache.count(floor_number, "Signal Strength (dBm)"):
+        plan_path = floor_plan_path(session_plan_dir, floor_number)
+        aspect = get_plan_aspect(plan_path, os.path.getmtime(plan_path)) if plan_path else 1.0
+        nearest = heatmap_cache.get(floor_number, "Signal Strength (dBm)", aspect).index.nearest(*position)
+        if nearest is not None:
+            st.caption(f"📍 Nearest measured point is {nearest[0] * 100:.1f}% of the plan width away.")
 st.write("---")
 # Run Test, Stop, and Exit Buttons
 col3, col4, col5 = st.columns(3)
@@ -331,40 +502,31 @@ st.write('---')
 # Result Box
 result_box = st.empty()
 
-# Floor tracking
-floor_key = str(floor_number)
-if floor_key not in st.session_state.location_counts:
-    st.session_state.location_counts[floor_key] = 0
-
 # Run Test Logic
 if run_button:
     if not st.session_state.wifi_connected:
         result_box.error("Please establish Wi-Fi ADB connection first.", icon="❌")
     elif not location_name:
         result_box.error("Please enter a location name.", icon="❌")
-    elif st.session_state.location_counts[floor_key] >= points_per_floor:
+    elif survey_session.tests(floor_number) >= points_per_floor:
         st.error(f"Maximum points ({points_per_floor}) reached for Floor {floor_number} Select another floor.", icon="❌")
+    elif st.session_state.test_job is not None:
+        result_box.warning("A test is already running. Wait for it to finish or cancel it.", icon="⚠️")
     else:
-        with st.spinner("Running test..."):
-            st.session_state.tests_run = True
-            signal_strength = get_signal_strength()
-            download_speed, upload_speed, speed_error = get_internet_speed(floor_number, location_name)
-
-            result_message = f"⚡ <b>Signal</b>: {signal_strength}<br>⬇️ <b>Download Speed</b>: {download_speed if download_speed is not None else 'N/A'} Mbps<br>⬆️ <b>Upload Speed</b>: {upload_speed if upload_speed is not None else 'N/A'} Mbps"
-            if speed_error:
-                result_message += f"<br>{speed_error}"
-
-            success, save_message = save_to_excel(floor_number, [
-                floor_number, location_name, signal_strength,
-                download_speed if download_speed is not None else 0,
-                upload_speed if upload_speed is not None else 0
-            ])
-            result_message += f"<br>{save_message}"
-
-            st.session_state.test_results = result_message
-            result_box.markdown(result_message, unsafe_allow_html=True)
-            # Increment location count after successful test
-            st.session_state.location_counts[floor_key] += 1
+        st.session_state.tests_run = True
+        st.session_state.test_results = None
+        from engine.runner import TestJob
+        st.session_state.test_job = TestJob(
+            floor_number, location_name,
+            readers={device_id: make_signal_reader(device_id) for device_id in st.session_state.wireless_device_ids},
+            measure_speed=lambda progress, cancel_event: get_internet_speed(throughput_backend, floor_number, location_name, progress, cancel_event, adaptive_policy),
+            save=save_reading,
+            position=position,
+        ).start()
+
+# Running tests update themselves in place without rerunning the whole page
+if st.session_state.test_job is not None:
+    st.fragment(run_every=0.5)(render_test_job)(st.session_state.test_job)
 
 # Display persistent results
 if st.session_state.test_results:
@@ -372,8 +534,9 @@ if st.session_state.test_results:
 
 # Stop Floor Logic
 if stop_button:
-    if floor_key not in st.session_state.completed_floors:
-        st.session_state.completed_floors.add(floor_key)
+    if floor_number not in survey_session.completed_floors:
+        survey_session.complete_floor(floor_number)
+        survey_session.save()
         status_box.success(f"Stopped testing Floor {floor_number}. Select another floor.", icon="✅")
     else:
         status_box.warning(f"Floor {floor_number} already stopped.", icon="⚠️")
@@ -381,139 +544,190 @@ if stop_button:
 # Exit Logic
 if exit_button:
     status_box.info("Exiting and displaying results...", icon="🛑")
-    df, error = load_excel()
+    dataset, error = load_dataset()
     if error:
         st.error(error, icon="❌")
-    elif df is not None:
+    elif dataset is not None:
         st.subheader("📊 Final Results")
-        st.dataframe(df[["Floor", "Location", "Signal Strength (dBm)", "Download Speed (Mbps)", "Upload Speed (Mbps)"]])
-        
-        df["Signal Strength (dBm) Extracted"] = df["Signal Strength (dBm)"].apply(extract_signal_info)
-        df["Floor"] = pd.to_numeric(df["Floor"], errors="coerce")
-        df = df.dropna(subset=["Floor"])
-        floor_means = df.groupby("Floor").mean(numeric_only=True).reset_index()
+        st.dataframe(dataset.frame[COLUMNS])
+        # Read the generation first; a save in between only causes one extra redraw
+        summary_version = (survey_session.id, store.generation)
+        floor_means = floor_means_frame()
         
         col1, col2 = st.columns(2)
         with col1:
             st.subheader("🗂️ Average Signal Strength per Floor")
-            plt.figure(figsize=(10, 5))
-            sns.lineplot(data=floor_means, x="Floor", y="Signal Strength (dBm) Extracted", marker="o", linewidth=2.5, color="red", label="Signal Strength")
-            sns.scatterplot(data=floor_means, x="Floor", y="Signal Strength (dBm) Extracted", s=100, color="black")
-            plt.xlabel("Floor")
-            plt.ylabel("Average Signal Strength (dBm)")
-            plt.grid(True, linestyle="--", alpha=0.7)
-            plt.axhline(y=-90, color="gray", linestyle="dashed", label="Weak Signal (-90 dBm)")
-            plt.axhline(y=-70, color="blue", linestyle="dashed", label="Good Signal (-70 dBm)")
-            plt.legend()
-            st.pyplot(plt.gcf())
-            plt.clf()
+            show_chart(charts.signal_by_floor(floor_means, summary_version, chart_backend))
         
         with col2:
             st.subheader("🛜 Average Internet Speed per Floor")
-            plt.figure(figsize=(10, 5))
-            sns.barplot(data=floor_means.melt(id_vars=["Floor"], value_vars=["Download Speed (Mbps)", "Upload Speed (Mbps)"]),
-                        x="Floor", y="value", hue="variable", palette={"Download Speed (Mbps)": "blue", "Upload Speed (Mbps)": "green"})
-            plt.xlabel("Floor")
-            plt.ylabel("Speed (Mbps)")
-            plt.grid(axis="y", linestyle="--", alpha=0.7)
-            plt.legend(title="Speed Type")
-            st.pyplot(plt.gcf())
-            plt.clf()
+            show_chart(charts.speed_by_floor(floor_means, summary_version, chart_backend))
+        st.subheader("🏢 Building Summary")
+        st.dataframe(aggregates.building(), hide_index=True)
+    tracer.add("render.page", page_started, time.perf_counter(), exit=True)
+    if show_performance:
+        render_performance_panel()
     st.stop()
 
+# Continuous Sampling
+st.header("📈 Continuous Sampling",divider="green")
+col6, col7, col8 = st.columns(3)
+with col6:
+    sample_rate = st.number_input("Sampling Rate (Hz) ⏱️", min_value=0.2, max_value=10.0, value=2.0, step=0.5)
+with col7:
+    start_sampling = st.button("Start Sampling ▶️")
+with col8:
+    stop_sampling = st.button("Stop Sampling ⏹️")
+
+samplers = st.session_state.samplers
+if start_sampling:
+    if not st.session_state.wifi_connected:
+        st.error("Please establish Wi-Fi ADB connection first.", icon="❌")
+    else:
+        for sampler in samplers.values():
+            sampler.stop()
+        from engine.sampler import SignalSampler
+        samplers = {
+            device_id: SignalSampler(make_signal_reader(device_id), rate_hz=sample_rate, capacity=sample_buffer_size)
+            for device_id in st.session_state.wireless_device_ids
+        }
+        for sampler in samplers.values():
+            sampler.start()
+        st.session_state.samplers = samplers
+if stop_sampling:
+    for sampler in samplers.values():
+        sampler.stop()
+
+if samplers:
+    # Samples are tagged with whatever floor/location the form currently shows
+    for sampler in samplers.values():
+        sampler.set_location(f"Floor {floor_number} · {location_name}" if location_name else None)
+    # The panel refreshes itself while sampling without rerunning the whole page
+    sampling = any(sampler.running for sampler in samplers.values())
+    st.fragment(run_every=1.0 if sampling else None)(render_sampling_panel)(samplers)
+else:
+    st.info("Start sampling to record signal continuously while you walk the floor.", icon="ℹ️")
+st.write("---")
+
 # Floor-Specific Visualizations
+section_started = time.perf_counter()
 st.header("📝 Floor-Specific Analysis",divider="green")
 selected_floor = st.selectbox("Select Floor for Analysis 🔽", options=list(range(1, num_floors+1)), key="floor_analysis")
-df, error = load_excel(selected_floor)
+dataset, error = load_dataset()
+df, error = load_readings(selected_floor)
+chart_version = (survey_session.id, dataset.generation) if dataset is not None else None
 if error:
     st.warning(error, icon="⚠️")
 elif df is not None:
-    df["Signal Strength (dBm) Extracted"] = df["Signal Strength (dBm)"].apply(extract_signal_info)
     st.write('---')
     st.subheader(f"📊 Data for Floor {selected_floor}",divider="blue")
-    st.dataframe(df[["Floor", "Location", "Signal Strength (dBm)", "Download Speed (Mbps)", "Upload Speed (Mbps)"]])
+    st.dataframe(df[COLUMNS])
     st.write('---')
 
     st.subheader(f"🛰️ Signal Strength - Floor {selected_floor}")
-    plt.figure(figsize=(10, 5))
-    plt.plot(df["Location"], df["Signal Strength (dBm) Extracted"], marker="o", linestyle="-", color="red")
-    plt.xlabel("Location")
-    plt.ylabel("Signal Strength (dBm)")
-    plt.title(f"Signal Strength - Floor {selected_floor}")
-    plt.xticks(rotation=45)
-    plt.grid(True)
-    st.pyplot(plt.gcf())
-    plt.clf()
+    show_chart(charts.floor_signal(df, selected_floor, chart_version, chart_backend))
     
     st.write("---")
 
     st.subheader(f"📚 Internet Speed - Floor {selected_floor}")
-    plt.figure(figsize=(10, 5))
-    plt.plot(df["Location"], df["Download Speed (Mbps)"], marker="o", linestyle="-", color="blue", label="Download Speed")
-    plt.plot(df["Location"], df["Upload Speed (Mbps)"], marker="o", linestyle="-", color="green", label="Upload Speed")
-    plt.xlabel("Location")
-    plt.ylabel("Speed (Mbps)")
-    plt.title(f"Internet Speed - Floor {selected_floor}")
-    plt.xticks(rotation=45)
-    plt.legend()
-    plt.grid(True)
-    st.pyplot(plt.gcf())
-    plt.clf()
+    show_chart(charts.floor_speed(df, selected_floor, chart_version, chart_backend))
 else:
     st.warning(f"No data available for Floor {selected_floor}. Run tests to generate data.", icon="⚠️")
 st.write("---")
 
+tracer.add("render.floor_analysis", section_started, time.perf_counter())
+
+# Coverage Map
+section_started = time.perf_counter()
+st.header("🗺️ Coverage Map",divider="green")
+col9, col10 = st.columns(2)
+with col9:
+    coverage_floor = st.selectbox("Select Floor for Coverage 🔽", options=list(range(1, num_floors+1)), key="coverage_floor")
+with col10:
+    coverage_metric = st.selectbox("Metric 📐", options=list(POINT_METRICS), key="coverage_metric")
+if heatmap_cache.count(coverage_floor, coverage_metric):
+    plan_path = floor_plan_path(session_plan_dir, coverage_floor)
+    aspect = get_plan_aspect(plan_path, os.path.getmtime(plan_path)) if plan_path else 1.0
+    heatmap = heatmap_cache.get(coverage_floor, coverage_metric, aspect)
+    # Drawing over the plan image needs the static renderer
+    map_backend = charts.MATPLOTLIB if plan_path else chart_backend
+    show_chart(charts.coverage_map(heatmap, coverage_metric, coverage_floor, plan_path, coverage_gap, map_backend, version=survey_session.id))
+    st.caption(
+        f"{heatmap.count} positioned readings · {heatmap.gap_fraction(coverage_gap):.0%} of the floor is more than "
+        f"{coverage_gap:.0%} of the plan width from a reading (left blank)."
+    )
+else:
+    st.info(f"No positioned readings on Floor {coverage_floor} yet. Tag test points on the floor plan to build a coverage map.", icon="ℹ️")
+st.write("---")
+tracer.add("render.coverage_map", section_started, time.perf_counter())
+
 # Average Plots Across All Floors
+section_started = time.perf_counter()
 st.header("📑 Average Analysis Across Floors",divider="green")
-df, error = load_excel()
-if error:
-    st.warning(error, icon="⚠️")
-elif df is not None:
-    df["Signal Strength (dBm) Extracted"] = df["Signal Strength (dBm)"].apply(extract_signal_info)
-    df["Floor"] = pd.to_numeric(df["Floor"], errors="coerce")
-    df = df.dropna(subset=["Floor"])
-    floor_means = df.groupby("Floor").mean(numeric_only=True).reset_index()
+# Averages come from the running aggregates, so this section never re-reads the store
+summary_version = (survey_session.id, store.generation)
+if st.session_state.tests_run and aggregates.groups("floor"):
+    floor_means = floor_means_frame()
     
     st.subheader("🛰️ Average Signal Strength per Floor")
-    plt.figure(figsize=(10, 5))
-    sns.lineplot(data=floor_means, x="Floor", y="Signal Strength (dBm) Extracted", marker="o", linewidth=2.5, color="red", label="Signal Strength")
-    sns.scatterplot(data=floor_means, x="Floor", y="Signal Strength (dBm) Extracted", s=100, color="black")
-    plt.xlabel("Floor")
-    plt.ylabel("Average Signal Strength (dBm)")
-    plt.title("Signal Strength by Floor")
-    plt.grid(True, linestyle="--", alpha=0.7)
-    plt.axhline(y=-90, color="gray", linestyle="dashed", label="Weak Signal (-90 dBm)")
-    plt.axhline(y=-70, color="blue", linestyle="dashed", label="Good Signal (-70 dBm)")
-    plt.legend()
-    st.pyplot(plt.gcf())
-    plt.clf()
+    show_chart(charts.signal_by_floor(floor_means, summary_version, chart_backend, title="Signal Strength by Floor"))
        
     st.write('---')
 
     st.subheader("🛜 Average Internet Speed per Floor")
-    plt.figure(figsize=(10, 5))
-    sns.barplot(data=floor_means.melt(id_vars=["Floor"], value_vars=["Download Speed (Mbps)", "Upload Speed (Mbps)"]),
-                    x="Floor", y="value", hue="variable", palette={"Download Speed (Mbps)": "blue", "Upload Speed (Mbps)": "green"})
-    plt.xlabel("Floor")
-    plt.ylabel("Speed (Mbps)")
-    plt.title("Internet Speed by Floor")
-    plt.grid(axis="y", linestyle="--", alpha=0.7)
-    plt.legend(title="Speed Type")
-    st.pyplot(plt.gcf())
-    plt.clf()
+    show_chart(charts.speed_by_floor(floor_means, summary_version, chart_backend, title="Internet Speed by Floor"))
+
+    carrier_means = aggregates.carrier_means()
+    if len({carrier for carriers in carrier_means.values() for carrier in carriers}) > 1:
+        st.write('---')
+        st.subheader("📡 Average Signal Strength per Carrier (dBm)")
+        import pandas as pd
+        # Floors down, carriers across, so one survey pass compares operators directly
+        st.dataframe(pd.DataFrame.from_dict(carrier_means, orient="index").rename_axis("Floor"))
+
+    st.write('---')
+    st.subheader("🏢 Building Summary")
+    st.dataframe(aggregates.building(), hide_index=True)
+    with st.expander("📋 Statistics per Floor, Location and Device"):
+        col11, col12 = st.columns(2)
+        with col11:
+            summary_scope = st.selectbox("Group By", options=["floor", "location", "device"], format_func=str.title)
+        with col12:
+            summary_metric = st.selectbox("Metric", options=list(POINT_METRICS), key="summary_metric")
+        st.dataframe(aggregates.table(summary_scope, summary_metric), hide_index=True)
 else:
     st.warning("No data available for average analysis. Run tests to generate data.", icon="⚠️")
 
-data_file = "Data/network_readings.xlsx"
+tracer.add("render.average_analysis", section_started, time.perf_counter())
 
-if os.path.exists(data_file):
-    with open(data_file, "rb") as file:
-        csv_data = file.read()
-    st.download_button(
-        label="Download Data ✉️",
-        data=csv_data,
-        file_name="Network_data.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+# Exports are built from the store only when requested and reused until the data changes
+if dataset is not None:
+    col13, col14 = st.columns(2)
+    with col13:
+        export_format = st.selectbox("Export Format 📄", options=list(FORMATS), format_func=lambda fmt: {"csv": "CSV", "parquet": "Parquet", "xlsx": "Excel (sheet per floor)"}[fmt])
+    with col14:
+        export_floor = st.selectbox("Export Floors 🏢", options=[None] + list(range(1, num_floors+1)), format_func=lambda floor: "All floors" if floor is None else f"Floor {floor}")
+    if st.button("Prepare Data Export 📦"):
+        try:
+            export_path = export_cache.get(export_format, export_floor)
+
+            def read_export(path=export_path):
+                with open(path, "rb") as file:
+                    return file.read()
+
+            # Streamlit serves downloads from memory; given a callable it only reads
+            # the file when the button is clicked, not each time the button is drawn.
+            st.download_button(
+                label="Download Data ✉️",
+                data=read_export,
+                file_name=os.path.basename(export_path).replace("network_readings", "Network_data"),
+                mime=FORMATS[export_format][1]
+            )
+        except Exception as e:
+            st.error(f"Failed to export data: {str(e)}", icon='❌')
 else:
-    st.error(f"Data file not found. Please run some tests first to generate the Excel file.</span>",icon='❌')
+    st.error(f"No data recorded yet. Please run some tests first to generate data.</span>",icon='❌')
+
+tracer.add("render.page", page_started, time.perf_counter())
+if show_performance:
+    render_performance_panel()
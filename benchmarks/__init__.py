@@ -0,0 +1,4 @@
+"""Offline benchmarks for the Network Analyzer hot paths.
+
+Run a benchmark from the repository root, e.g. ``python -m benchmarks.bench_dumpsys``.
+"""
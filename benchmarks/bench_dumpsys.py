@@ -0,0 +1,72 @@
+"""Per-sample parse time of the telephony registry parser over captured dumps.
+
+Usage::
+
+    python -m benchmarks.bench_dumpsys [--repeat N]
+
+Each fixture in ``benchmarks/fixtures/dumpsys`` is parsed as it arrives with
+the full command and as it arrives with the on-device ``grep`` filter, next
+to the two-regex scan the app used before the parser existed.
+"""
+import argparse
+import os
+import re
+import time
+
+from engine.dumpsys import narrow_output, parse_signal
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "dumpsys")
+
+_LEGACY_5G = re.compile(r"ssRsrp\s*=\s*(-?\d+).*?level\s*=\s*(\d+)")
+_LEGACY_4G = re.compile(r"mLte=CellSignalStrengthLte:.*?rsrp\s*=\s*(-?\d+).*?level\s*=\s*(\d+)")
+
+
+def legacy_parse(output):
+    """The original get_signal_strength scan, kept as the comparison point."""
+    match = _LEGACY_5G.search(output)
+    if match:
+        return match.groups()
+    match = _LEGACY_4G.search(output)
+    return match.groups() if match else None
+
+
+def load_fixtures():
+    fixtures = {}
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith(".txt"):
+            with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+                fixtures[name[:-4]] = f.read()
+    return fixtures
+
+
+def time_per_call(func, arg, repeat):
+    """Best-of-three mean seconds per call."""
+    best = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            func(arg)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=200, help="parses per timing run")
+    args = parser.parse_args(argv)
+
+    print(f"{'fixture':<24}{'bytes':>10}{'narrow':>10}{'parse':>12}{'narrowed':>12}{'legacy':>12}")
+    for name, output in load_fixtures().items():
+        narrowed = narrow_output(output)
+        assert parse_signal(narrowed, 0) == parse_signal(output, 0), f"{name}: narrowed output parses differently"
+        full_t = time_per_call(parse_signal, output, args.repeat)
+        narrow_t = time_per_call(parse_signal, narrowed, args.repeat)
+        legacy_t = time_per_call(legacy_parse, output, args.repeat)
+        print(
+            f"{name:<24}{len(output):>10}{len(narrowed):>10}"
+            f"{full_t * 1e6:>10.1f}us{narrow_t * 1e6:>10.1f}us{legacy_t * 1e6:>10.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Cold-start budget: import time and first paint of the app and the CLI.
+
+Usage::
+
+    python -m benchmarks.bench_startup [--repeat N] [--strict]
+
+Every measurement runs in a fresh interpreter so nothing is cached. The
+first paint is one full script run of ``analyzer_program.py`` under
+Streamlit's ``AppTest`` against the fake ADB server, followed by a rerun,
+from a scratch directory so the sessions it creates under ``Data/`` are
+thrown away.
+Heavy modules that the first paint or the CLI start loaded are reported;
+with ``--strict`` the exit status is non-zero when a budget is exceeded or
+a module in :data:`LAZY_MODULES` was loaded, so a cold-start regression
+fails CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE = os.path.join(ROOT, "benchmarks", "fixtures", "dumpsys", "single_sim_lte.txt")
+
+# Modules that must only be loaded by the section that uses them.
+LAZY_MODULES = ("pandas", "numpy", "matplotlib", "seaborn", "altair", "speedtest", "openpyxl")
+CLI_FORBIDDEN = ("streamlit", "pandas", "numpy", "matplotlib", "seaborn")
+
+# Median milliseconds; generous enough for a laptop, tight enough to catch
+# an eager heavy import (pandas alone adds a few hundred ms).
+BUDGET_MS = {
+    "import engine.cli": 250,
+    "app first paint": 1500,
+    "app rerun": 250,
+}
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{"ms": (time.perf_counter() - start) * 1000, "modules": sorted(sys.modules)}}))
+"""
+
+_PAINT_PROBE = """
+import json, sys, time
+from engine.fake_adb import FakeAdbServer, FakeDevice
+with open({fixture!r}, encoding="utf-8") as f:
+    server = FakeAdbServer({{"emulator-5554": FakeDevice.from_dumpsys(f.read())}}, port={port}).start()
+from streamlit.testing.v1 import AppTest
+before = set(sys.modules)
+app = AppTest.from_file({script!r}, default_timeout=60)
+start = time.perf_counter()
+app.run()
+paint = (time.perf_counter() - start) * 1000
+start = time.perf_counter()
+app.run()
+rerun = (time.perf_counter() - start) * 1000
+server.stop()
+print(json.dumps({{"paint": paint, "rerun": rerun, "exception": [str(e.value) for e in app.exception],
+                  "modules": sorted(set(sys.modules) - before)}}))
+"""
+
+
+def _probe(code, port=None, cwd=ROOT):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, (ROOT, env.get("PYTHONPATH"))))
+    if port is not None:
+        # Read by engine.adb at import time, so it must be set before the child starts.
+        env["ANDROID_ADB_SERVER_PORT"] = str(port)
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _paint_probe(port):
+    """First paint and rerun timings from a scratch working directory."""
+    with tempfile.TemporaryDirectory() as workdir:
+        # The app reads its assets and writes Data/ relative to the working directory.
+        shutil.copytree(os.path.join(ROOT, "images"), os.path.join(workdir, "images"))
+        code = _PAINT_PROBE.format(fixture=FIXTURE, port=port, script=os.path.join(ROOT, "analyzer_program.py"))
+        return _probe(code, port, cwd=workdir)
+
+
+def _free_port():
+    import socket
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _loaded(modules, names):
+    return [name for name in names if name in modules]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per measurement (median is reported)")
+    parser.add_argument("--strict", action="store_true", help="exit non-zero on a budget or lazy-import violation")
+    args = parser.parse_args(argv)
+
+    results, violations = {}, []
+
+    runs = [_probe(_IMPORT_PROBE.format(module="engine.cli")) for _ in range(args.repeat)]
+    results["import engine.cli"] = statistics.median(run["ms"] for run in runs)
+    for name in _loaded(runs[0]["modules"], CLI_FORBIDDEN):
+        violations.append(f"engine.cli imports {name}")
+
+    runs = [_paint_probe(_free_port()) for _ in range(args.repeat)]
+    if runs[0]["exception"]:
+        violations.append(f"app raised: {runs[0]['exception']}")
+    results["app first paint"] = statistics.median(run["paint"] for run in runs)
+    results["app rerun"] = statistics.median(run["rerun"] for run in runs)
+    for name in _loaded(runs[0]["modules"], LAZY_MODULES):
+        violations.append(f"first paint loads {name}")
+
+    print(f"{'measurement':<22}{'median':>10}{'budget':>10}")
+    for name, value in results.items():
+        budget = BUDGET_MS[name]
+        flag = "" if value <= budget else "  over budget"
+        print(f"{name:<22}{value:>8.0f}ms{budget:>8}ms{flag}")
+        if value > budget:
+            violations.append(f"{name} took {value:.0f}ms (budget {budget}ms)")
+    for violation in violations:
+        print(f"! {violation}")
+    if args.strict and violations:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Benchmark suite for the storage, parsing and analysis hot paths.
+
+Usage::
+
+    python -m benchmarks.suite [--sizes 10,1000,100000] [--baseline PATH] [--save-baseline PATH] [--strict]
+
+For every survey size (readings in the store, spread over up to 200 floors)
+the suite times saving a reading, a batch of readings, loading the store,
+the per-floor aggregation (pandas groupby, next to reading the running
+aggregates and seeding them from the store), the cached dataset build and
+the CSV, Parquet and Excel exports. Saves run with running aggregates subscribed, as in the app.
+Size-independent stages parse the recorded dumpsys fixtures, read a signal
+through the fake ADB server and run a whole survey point against the fake
+ADB server and :class:`engine.fake_throughput.FixedRateBackend`, and
+compare a fixed-length speed test with an adaptive one that stops once
+the (jittered) rate has converged. A short session is recorded through
+:mod:`engine.replay` and replayed as fast as possible, timing the signal
+read and the whole survey point on replayed data. The suite needs no
+phone and no network.
+
+Each stage reports throughput, p50/p90/p99 latency and peak Python memory
+(``tracemalloc``, measured in a separate untimed call). Results are compared
+against a stored baseline (``benchmarks/baseline.json`` by default); a p50
+more than ``--tolerance`` slower is flagged, and with ``--strict`` fails the
+run.
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import floors_for, make_readings, populate
+from engine.dumpsys import narrow_output, parse_signal
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures", "dumpsys")
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+DEFAULT_SIZES = (10, 1000, 100_000)
+# openpyxl writes a few thousand rows per second; larger Excel exports are skipped
+EXPORT_LIMIT = 10_000
+SAVE_BATCH = 1000
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def measure(func, calls, items_per_call=1):
+    """Time ``calls`` calls of ``func`` and then trace one more for peak memory."""
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    latencies.sort()
+    return {
+        "calls": calls,
+        "items_per_s": items_per_call * calls / sum(latencies),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p90_ms": percentile(latencies, 0.90) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_kb": peak / 1024,
+    }
+
+
+def _calls(size, small, large):
+    """Fewer repetitions for the stages whose cost grows with the store."""
+    return small if size <= 10_000 else large
+
+
+def store_stages(size, workdir, repeat):
+    """Stages that run against a store already holding ``size`` readings."""
+    from engine.aggregates import ReadingAggregates
+    from engine.dataset import build_dataset
+    from engine.export import export_readings
+    from engine.store import ReadingStore
+
+    store = ReadingStore(os.path.join(workdir, f"survey_{size}.db"))
+    try:
+        readings = make_readings(size)
+        populate(store, readings)
+        extra = iter(make_readings(repeat * 5 + 1, floors=floors_for(size), seed=1))
+
+        def save():
+            floor, location, signal, download, upload, device = next(extra)
+            store.append(floor, location, signal, download, upload, device=device)
+
+        batch = make_readings(SAVE_BATCH, floors=floors_for(size), seed=2)
+        df = store.read_frame()
+
+        def aggregate():
+            df.groupby("Floor").mean(numeric_only=True)
+            df.assign(Carrier=df["Carrier"].fillna("Unknown")).groupby(["Floor", "Carrier"])["Signal Strength (dBm)"].mean().unstack("Carrier")
+
+        # Read-only stages first, while the store still holds exactly ``size`` readings
+        results = {
+            "load": measure(store.read_frame, _calls(size, repeat, 3), size),
+            "aggregate": measure(aggregate, _calls(size, repeat, 3), size),
+            "dataset": measure(lambda: build_dataset(store, 0), _calls(size, repeat, 3), size),
+            "aggregates_seed": measure(
+                lambda: store.unsubscribe(ReadingAggregates.attach(store)), _calls(size, 3, 1), size
+            ),
+        }
+        aggregates = ReadingAggregates.attach(store)
+
+        def summaries():
+            aggregates.floor_means()
+            aggregates.carrier_means()
+            aggregates.building()
+
+        results["aggregates_read"] = measure(summaries, repeat * 5)
+        for fmt in ("csv", "parquet", "xlsx"):
+            if fmt == "xlsx" and size > EXPORT_LIMIT:
+                continue
+            path = os.path.join(workdir, f"export.{fmt}")
+            results[f"export_{fmt}"] = measure(lambda: export_readings(store, path), _calls(size, 3, 1), size)
+        results["save"] = measure(save, repeat * 5)
+        results["save_batch"] = measure(lambda: populate(store, batch), 3, SAVE_BATCH)
+        return results
+    finally:
+        store.close()
+
+
+def parse_stages(repeat):
+    results = {}
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if not name.endswith(".txt"):
+            continue
+        with open(os.path.join(FIXTURE_DIR, name), encoding="utf-8") as f:
+            output = f.read()
+        narrowed = narrow_output(output)
+        key = name[:-4]
+        results[f"parse_full[{key}]"] = measure(lambda: parse_signal(output), repeat * 5)
+        results[f"parse_narrow[{key}]"] = measure(lambda: parse_signal(narrowed), repeat * 20)
+    return results
+
+
+def device_stages(workdir, repeat):
+    """Signal read and a full survey point over the fake ADB server."""
+    from engine.adaptive import AdaptivePolicy
+    from engine.adb import AdbClient, close_sessions
+    from engine.cli import run_point
+    from engine.fake_adb import FakeAdbServer, FakeDevice
+    from engine.fake_throughput import FixedRateBackend
+    from engine.replay import Recorder, RecordingBackend, RecordingClient, ReplayBackend, ReplayClient, Trace
+    from engine.store import ReadingStore
+    from engine.survey import get_internet_speed, get_signal_strength
+
+    with open(os.path.join(FIXTURE_DIR, "dual_sim_nr_nsa.txt"), encoding="utf-8") as f:
+        device = FakeDevice.from_dumpsys(f.read())
+    server = FakeAdbServer({"emulator-5554": device}).start()
+    store = ReadingStore(os.path.join(workdir, "points.db"))
+    try:
+        client = AdbClient(port=server.address[1])
+        backend = FixedRateBackend(delay=0.05)
+        # A half-second transfer per phase, sampled every 20ms with 5% jitter
+        jittery = FixedRateBackend(delay=0.5, jitter=0.05)
+        policy = AdaptivePolicy(interval=0.02, short_upload=True)
+        point = {"floor": 1, "location": "Lobby"}
+        trace_path = os.path.join(workdir, "session.jsonl.gz")
+        with Recorder(trace_path) as recorder:
+            recording = RecordingClient(client, recorder)
+            run_point(point, ["emulator-5554"], recording, RecordingBackend(backend, recorder), store, 10.0, log=lambda *args: None)
+        trace = Trace.load(trace_path)
+        replay_client, replay_backend = ReplayClient(trace), ReplayBackend(trace)
+        return {
+            "adb_signal": measure(lambda: get_signal_strength(client, "emulator-5554"), repeat * 5),
+            "survey_point": measure(
+                lambda: run_point(point, ["emulator-5554"], client, backend, store, 10.0, log=lambda *args: None), 5
+            ),
+            "speed_fixed": measure(lambda: get_internet_speed(jittery, store, 1, "Lobby"), 3),
+            "speed_adaptive": measure(lambda: get_internet_speed(jittery, store, 1, "Lobby", policy=policy), 5),
+            "replay_signal": measure(lambda: get_signal_strength(replay_client, "emulator-5554"), repeat * 20),
+            "replay_point": measure(
+                lambda: run_point(point, ["emulator-5554"], replay_client, replay_backend, store, 10.0, log=lambda *args: None),
+                repeat * 5,
+            ),
+        }
+    finally:
+        close_sessions()
+        store.close()
+        server.stop()
+
+
+def compare(results, baseline, tolerance):
+    """Lines describing each stage against the baseline, plus the regressions."""
+    lines, regressions = [], []
+    header = f"{'stage':<34}{'items/s':>12}{'p50':>11}{'p90':>11}{'p99':>11}{'peak':>10}{'vs base':>10}"
+    lines.append(header)
+    for name, stats in results.items():
+        delta = ""
+        base = baseline.get(name)
+        if base:
+            change = stats["p50_ms"] / base["p50_ms"] - 1 if base["p50_ms"] else 0.0
+            delta = f"{change:+.0%}"
+            if change > tolerance:
+                delta += " !"
+                regressions.append(f"{name}: p50 {stats['p50_ms']:.3f}ms vs {base['p50_ms']:.3f}ms")
+        lines.append(
+            f"{name:<34}{stats['items_per_s']:>12.0f}{stats['p50_ms']:>9.3f}ms{stats['p90_ms']:>9.3f}ms"
+            f"{stats['p99_ms']:>9.3f}ms{stats['peak_kb']:>8.0f}kB{delta:>10}"
+        )
+    return lines, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="comma-separated store sizes")
+    parser.add_argument("--repeat", type=int, default=20, help="base repetition count per stage")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline JSON to compare against")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write this run's results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown before flagging (0.25 = 25%%)")
+    parser.add_argument("--strict", action="store_true", help="exit non-zero if any stage regressed")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in (int(size) for size in args.sizes.split(",")):
+            for stage, stats in store_stages(size, workdir, args.repeat).items():
+                results[f"{stage}@{size}"] = stats
+        results.update(parse_stages(args.repeat))
+        results.update(device_stages(workdir, args.repeat))
+
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)["stages"]
+    lines, regressions = compare(results, baseline, args.tolerance)
+    print("\n".join(lines))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump({
+                "python": sys.version.split()[0],
+                "platform": platform.platform(),
+                "stages": results,
+            }, f, indent=1, sort_keys=True)
+        print(f"Baseline written to {args.save_baseline}")
+    for regression in regressions:
+        print(f"! {regression}")
+    if args.strict and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Synthetic survey data for the benchmarks.
+
+Readings are generated from a seeded RNG so every run stores the same
+survey: a mix of NR/LTE/WCDMA/GSM cells across several carriers and
+devices, spread over ``floors`` floors with ``locations`` points each.
+"""
+import random
+
+from engine.signal import SignalReading
+
+CARRIERS = ("Jio 4G", "airtel", "Vi India", "BSNL")
+DEVICES = ("192.168.1.50:5555", "192.168.1.51:5555", "192.168.1.52:5555")
+# (rat, strength range, quality range, sinr range)
+_CELLS = (
+    ("NR", (-120, -70), (-15, -5), (-5, 25)),
+    ("LTE", (-125, -75), (-18, -6), (-5, 25)),
+    ("WCDMA", (-115, -70), (-20, -5), (None, None)),
+    ("GSM", (-110, -60), (None, None), (None, None)),
+)
+_WEIGHTS = (3, 6, 1, 1)
+
+
+def floors_for(size):
+    """Floor count used for a survey of ``size`` readings (1 up to 200)."""
+    return max(1, min(200, size // 500))
+
+
+def _pick(rng, bounds):
+    low, high = bounds
+    return None if low is None else rng.randint(low, high)
+
+
+def make_readings(size, floors=None, locations=10, seed=0, start=1_700_000_000.0):
+    """``size`` tuples of ``(floor, location, SignalReading, download, upload, device)``."""
+    rng = random.Random(seed)
+    floors = floors or floors_for(size)
+    readings = []
+    for i in range(size):
+        rat, rsrp, rsrq, sinr = rng.choices(_CELLS, weights=_WEIGHTS)[0]
+        strength, quality, sinr = _pick(rng, rsrp), _pick(rng, rsrq), _pick(rng, sinr)
+        # WCDMA and GSM report RSCP/EcNo and RSSI instead of RSRP/RSRQ
+        metrics = {
+            "WCDMA": {"rscp": strength, "ecno": quality},
+            "GSM": {"rssi": strength},
+        }.get(rat, {"rsrp": strength, "rsrq": quality, "sinr": sinr})
+        signal = SignalReading(
+            rat=rat, level=rng.randint(0, 4), timestamp=start + i * 2.0, operator=rng.choice(CARRIERS), **metrics,
+        )
+        readings.append((
+            rng.randint(1, floors), f"Point {rng.randint(1, locations)}", signal,
+            round(rng.uniform(1, 300), 2), round(rng.uniform(0.5, 80), 2), rng.choice(DEVICES),
+        ))
+    return readings
+
+
+def populate(store, readings):
+    """Queue every reading at once (group commit) and wait for the last one."""
+    futures = [store.submit(*reading[:5], device=reading[5]) for reading in readings]
+    for future in futures:
+        future.result()
@@ -0,0 +1 @@
+"""Core building blocks for the Network Analyzer (storage, device and analysis helpers)."""
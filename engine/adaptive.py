@@ -0,0 +1,138 @@
+"""Adaptive speed tests that stop once the measured rate has settled.
+
+A backend given a :class:`RateMonitor` reports the rate of every
+``interval`` of its transfer. The monitor skips the first ``warmup``
+intervals (TCP slow start, socket buffers filling), keeps the last
+``window`` of the rest and their Student-t confidence interval; once the
+interval's half-width is within ``tolerance`` of the mean (or
+``max_seconds`` have passed) it tells the backend to stop, so a stable link
+is measured in a couple of seconds instead of a full fixed-size test. A
+converged rolling mean is the reported speed and the interval bounds are
+stored with the reading.
+"""
+from collections import deque
+from math import atan, cos, exp, fsum, lgamma, pi, sin, sqrt, tan
+from statistics import NormalDist
+
+
+# Above this many degrees of freedom the Cornish-Fisher expansion is within 0.01%
+EXACT_DF = 30
+
+
+def _t_cdf(t, df):
+    """``P(T <= t)`` for Student's t with an integer ``df``, in closed form."""
+    theta = atan(t / sqrt(df))
+    c2 = cos(theta) ** 2
+    term = total = 1.0
+    if df % 2:
+        for k in range(3, df - 1, 2):
+            term *= (k - 1) / k * c2
+            total += term
+        inside = 2 / pi * (theta + (sin(theta) * cos(theta) * total if df > 1 else 0.0))
+    else:
+        for k in range(2, df, 2):
+            term *= (k - 1) / k * c2
+            total += term
+        inside = sin(theta) * total
+    return (1 + inside) / 2
+
+
+def _t_pdf(t, df):
+    return exp(lgamma((df + 1) / 2) - lgamma(df / 2)) / sqrt(df * pi) * (1 + t * t / df) ** (-(df + 1) / 2)
+
+
+def t_quantile(p, df):
+    """``p`` quantile of Student's t with ``df`` degrees of freedom.
+
+    Exact for one and two degrees of freedom. Up to :data:`EXACT_DF` a
+    Cornish-Fisher expansion around the normal quantile is refined by
+    Newton steps on the exact distribution; above it the expansion alone
+    is used.
+    """
+    if df == 1:
+        return tan(pi * (p - 0.5))
+    if df == 2:
+        return (2 * p - 1) / sqrt(2 * p * (1 - p))
+    z = NormalDist().inv_cdf(p)
+    t = (
+        z
+        + (z ** 3 + z) / (4 * df)
+        + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * df ** 2)
+        + (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / (384 * df ** 3)
+    )
+    if df <= EXACT_DF:
+        for _ in range(20):
+            step = (_t_cdf(t, df) - p) / _t_pdf(t, df)
+            t -= step
+            if abs(step) < 1e-12 * max(1.0, abs(t)):
+                break
+    return t
+
+
+class RateMonitor:
+    """Rolling rate estimate of one transfer; :meth:`add` says when to stop."""
+
+    def __init__(self, confidence=0.95, tolerance=0.1, interval=0.25, window=8, min_samples=4, max_seconds=None, warmup=1):
+        self.confidence = confidence
+        self.tolerance = tolerance
+        self.interval = interval
+        self.min_samples = max(2, min_samples)
+        self.max_seconds = max_seconds
+        self.warmup = warmup
+        self.count = 0
+        self.elapsed = 0.0
+        self.converged = False
+        self._samples = deque(maxlen=max(window, self.min_samples))
+
+    def add(self, mbps, elapsed):
+        """Record the rate of the last interval, ``elapsed`` seconds into the transfer; ``True`` means stop."""
+        self.count += 1
+        self.elapsed = elapsed
+        if self.count > self.warmup:
+            self._samples.append(mbps)
+        if len(self._samples) >= self.min_samples:
+            mean, low, high = self.estimate()
+            self.converged = mean > 0 and (high - low) / 2 <= self.tolerance * mean
+        return self.converged or (self.max_seconds is not None and elapsed >= self.max_seconds)
+
+    def estimate(self):
+        """``(mean, low, high)`` over the window; the bounds are ``None`` below two samples."""
+        samples = list(self._samples)
+        if not samples:
+            return None, None, None
+        mean = fsum(samples) / len(samples)
+        if len(samples) < 2:
+            return mean, None, None
+        variance = fsum((sample - mean) ** 2 for sample in samples) / (len(samples) - 1)
+        half_width = t_quantile((1 + self.confidence) / 2, len(samples) - 1) * sqrt(variance / len(samples))
+        return mean, max(0.0, mean - half_width), mean + half_width
+
+
+class AdaptivePolicy:
+    """How adaptive speed tests stop, and whether they upload.
+
+    Uploads are skipped unless ``short_upload`` is set; then they stop on
+    convergence too, but after ``upload_seconds`` at the latest.
+    """
+
+    def __init__(self, confidence=0.95, tolerance=0.1, interval=0.25, window=8, min_samples=4, warmup=1,
+                 max_seconds=15.0, short_upload=False, upload_seconds=3.0):
+        self.confidence = confidence
+        self.tolerance = tolerance
+        self.interval = interval
+        self.window = window
+        self.min_samples = min_samples
+        self.warmup = warmup
+        self.max_seconds = max_seconds
+        self.short_upload = short_upload
+        self.upload_seconds = upload_seconds
+
+    def phases(self):
+        return ("download", "upload") if self.short_upload else ("download",)
+
+    def monitor(self, phase):
+        """A fresh :class:`RateMonitor` for ``phase`` (``"download"`` or ``"upload"``)."""
+        return RateMonitor(
+            self.confidence, self.tolerance, self.interval, self.window, self.min_samples,
+            self.upload_seconds if phase == "upload" else self.max_seconds, self.warmup,
+        )
@@ -0,0 +1,235 @@
+"""ADB server socket client with persistent per-device shell sessions.
+
+Instead of forking ``adb`` for every query, this module talks the ADB host
+protocol to the local server (``127.0.0.1:5037``) directly. Each device gets
+one :class:`AdbSession` that keeps a raw ``sh`` open over an ``exec:``
+stream and runs commands on it back to back, so a query costs one round trip
+to the phone instead of a process spawn plus a fresh transport handshake.
+"""
+import os
+import re
+import socket
+import subprocess
+import threading
+import time
+
+ADB_HOST = "127.0.0.1"
+ADB_PORT = int(os.environ.get("ANDROID_ADB_SERVER_PORT", 5037))
+DEFAULT_TIMEOUT = 30.0
+
+# Written after every session command; the fake server recognises it too.
+STATUS_COMMAND = "printf '\\n%s %d\\n' {marker} $?"
+STATUS_LINE = re.compile(r"^printf '\\n%s %d\\n' (?P<marker>\S+) \$\?$")
+
+
+class AdbError(Exception):
+    """The ADB server refused a request or the connection broke."""
+
+
+class AdbCommandError(AdbError):
+    """A shell command finished with a non-zero exit status."""
+
+    def __init__(self, command, status, output):
+        super().__init__(f"'{command}' exited with status {status}")
+        self.command = command
+        self.status = status
+        self.output = output
+
+
+def _recv_exact(sock, size):
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise AdbError("ADB server closed the connection")
+        data += chunk
+    return data
+
+
+def _recv_all(sock):
+    chunks = []
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            return b"".join(chunks)
+        chunks.append(chunk)
+
+
+def _send_request(sock, request):
+    payload = request.encode()
+    sock.sendall(b"%04x" % len(payload) + payload)
+    status = _recv_exact(sock, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        length = int(_recv_exact(sock, 4), 16)
+        raise AdbError(_recv_exact(sock, length).decode(errors="replace"))
+    raise AdbError(f"Unexpected ADB response {status!r}")
+
+
+def _recv_message(sock):
+    length = int(_recv_exact(sock, 4), 16)
+    return _recv_exact(sock, length).decode(errors="replace")
+
+
+class AdbClient:
+    """Speaks the ADB host protocol to the local server."""
+
+    def __init__(self, adb_path=None, host=ADB_HOST, port=ADB_PORT, timeout=DEFAULT_TIMEOUT):
+        self.adb_path = adb_path
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    @property
+    def key(self):
+        """Identifies the server this client talks to, for sharing sessions."""
+        return (self.host, self.port)
+
+    def _socket(self):
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        except ConnectionRefusedError:
+            if not self.adb_path:
+                raise
+            # The server is not running yet; let the adb binary start it once.
+            subprocess.run([self.adb_path, "start-server"], capture_output=True, check=True)
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        # Commands are small writes answered immediately; don't let Nagle hold them.
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    def open(self, service, serial=None):
+        """Return a socket on which ``service`` has been accepted."""
+        sock = self._socket()
+        try:
+            if serial is not None:
+                _send_request(sock, f"host:transport:{serial}")
+            _send_request(sock, service)
+            return sock
+        except BaseException:
+            sock.close()
+            raise
+
+    def query(self, service):
+        """Run a ``host:`` request that answers with one length-prefixed message."""
+        with self.open(service) as sock:
+            return _recv_message(sock)
+
+    def devices(self):
+        """List ``(serial, state)`` pairs known to the server."""
+        devices = []
+        for line in self.query("host:devices").splitlines():
+            parts = line.split()
+            if len(parts) >= 2:
+                devices.append((parts[0], parts[1]))
+        return devices
+
+    def connect(self, address):
+        """Equivalent of ``adb connect address``; returns the server's reply."""
+        return self.query(f"host:connect:{address}")
+
+    def tcpip(self, serial, port=5555):
+        """Restart adbd on ``serial`` listening on TCP ``port``."""
+        with self.open(f"tcpip:{port}", serial) as sock:
+            return _recv_all(sock).decode(errors="replace")
+
+    def settle(self, seconds):
+        """Give a device ``seconds`` to restart adbd (after :meth:`tcpip`)."""
+        time.sleep(seconds)
+
+    def shell(self, serial, command):
+        """One-shot ``adb shell command``; prefer :meth:`session` for repeated queries."""
+        with self.open(f"shell:{command}", serial) as sock:
+            return _recv_all(sock).decode(errors="replace")
+
+    def session(self, serial):
+        return AdbSession(self, serial)
+
+
+class AdbSession:
+    """A long-lived raw shell on one device.
+
+    Commands run one at a time on the same ``sh``; each is followed by a
+    status marker so the output can be split without closing the stream.
+    Commands must not read from stdin, which carries the next command.
+    """
+
+    def __init__(self, client, serial):
+        self.client = client
+        self.serial = serial
+        self._lock = threading.Lock()
+        self._sock = None
+        self._buffer = b""
+        self._counter = 0
+
+    def _ensure_open(self):
+        if self._sock is None:
+            self._sock = self.client.open("exec:sh", self.serial)
+            self._buffer = b""
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            finally:
+                self._sock = None
+
+    def _read_until(self, token, deadline):
+        while token not in self._buffer:
+            self._sock.settimeout(max(0.001, deadline - time.monotonic()))
+            chunk = self._sock.recv(65536)
+            if not chunk:
+                raise AdbError(f"Shell session to {self.serial} closed")
+            self._buffer += chunk
+        head, _, self._buffer = self._buffer.partition(token)
+        return head
+
+    def run(self, command, timeout=None, check=True):
+        """Run ``command`` on the device and return its output as text."""
+        timeout = self.client.timeout if timeout is None else timeout
+        with self._lock:
+            self._counter += 1
+            marker = f"__ADB_STATUS_{self._counter}__"
+            try:
+                self._ensure_open()
+                request = f"{command}\n{STATUS_COMMAND.format(marker=marker)}\n"
+                self._sock.sendall(request.encode())
+                deadline = time.monotonic() + timeout
+                output = self._read_until(f"\n{marker} ".encode(), deadline)
+                status = int(self._read_until(b"\n", deadline))
+            except (OSError, ValueError, AdbError) as e:
+                # Leave no half-read output behind; the next call reconnects.
+                self._close()
+                if isinstance(e, AdbError):
+                    raise
+                raise AdbError(f"Shell session to {self.serial} failed: {e}") from e
+        text = output.decode(errors="replace")
+        if check and status != 0:
+            raise AdbCommandError(command, status, text)
+        return text
+
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def get_session(client, serial):
+    """Shared :class:`AdbSession` for ``serial``, opened on first use."""
+    key = client.key + (serial,)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = client.session(serial)
+        return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
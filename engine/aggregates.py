@@ -0,0 +1,333 @@
+"""Running per-floor, per-location and per-device aggregates of the readings.
+
+:class:`RunningStats` keeps count, sum, sum of squares, min and max plus a
+:class:`P2Quantile` sketch per tracked quantile, so adding a value costs
+the same however many came before and the memory per group is fixed.
+:class:`ReadingAggregates` holds one set per metric for the whole building,
+every floor, every (floor, location), every device and every (floor,
+carrier). It subscribes to a :class:`engine.store.ReadingStore` and is
+updated by the writer as each reading is committed, so the averages and
+percentiles shown after a save never re-read or regroup the stored survey.
+"""
+import threading
+from math import isnan, sqrt
+
+DEFAULT_QUANTILES = (0.1, 0.5, 0.9)
+# Metrics tracked per group: display name -> store column
+METRICS = {
+    "Signal Strength (dBm)": "rsrp",
+    "Download Speed (Mbps)": "download_mbps",
+    "Upload Speed (Mbps)": "upload_mbps",
+}
+# Group key of each scope, from a stored row
+SCOPES = {
+    "building": lambda row: "All",
+    "floor": lambda row: int(row["floor"]),
+    "location": lambda row: (int(row["floor"]), row["location"]),
+    "device": lambda row: row["device"] or "Unknown",
+    "carrier": lambda row: (int(row["floor"]), row["carrier"] or "Unknown"),
+}
+# Column names a group key is split into for tables
+KEY_COLUMNS = {
+    "building": ("Building",),
+    "floor": ("Floor",),
+    "location": ("Floor", "Location"),
+    "device": ("Device",),
+    "carrier": ("Floor", "Carrier"),
+}
+_SEED_CHUNK = 10_000
+
+
+class P2Quantile:
+    """Streaming estimate of the ``p`` quantile with five markers (the P² algorithm).
+
+    The first five values are kept exactly; after that each value moves
+    the markers by at most one position and the middle marker tracks the
+    quantile, in constant time and space.
+    """
+
+    def __init__(self, p):
+        if not 0 < p < 1:
+            raise ValueError("p must be between 0 and 1")
+        self.p = p
+        self._initial = []
+        self._heights = None
+        self._positions = None
+        self._desired = None
+        self._increments = (0.0, p / 2, p, (1 + p) / 2, 1.0)
+
+    @classmethod
+    def from_sorted(cls, p, values):
+        """Sketch of ``values`` (sorted), with the markers placed at their exact ranks."""
+        sketch = cls(p)
+        if len(values) < 5:
+            sketch._initial = list(values)
+            return sketch
+        last = len(values) - 1
+        positions = [round(last * increment) for increment in sketch._increments]
+        # Markers must sit on distinct ranks, leaving room for the ones above
+        for i in (1, 2, 3):
+            positions[i] = min(max(positions[i], positions[i - 1] + 1), last - (4 - i))
+        sketch._positions = positions
+        sketch._heights = [float(values[position]) for position in positions]
+        sketch._desired = [last * increment for increment in sketch._increments]
+        return sketch
+
+    def add(self, x):
+        if self._heights is None:
+            self._initial.append(x)
+            if len(self._initial) == 5:
+                self._initial.sort()
+                self._heights = [float(value) for value in self._initial]
+                self._positions = [0, 1, 2, 3, 4]
+                self._desired = [4 * increment for increment in self._increments]
+            return
+        heights, positions, desired = self._heights, self._positions, self._desired
+        # Find the cell holding x, stretching the extremes if needed
+        if x < heights[0]:
+            heights[0] = x
+            cell = 0
+        elif x >= heights[4]:
+            heights[4] = x
+            cell = 3
+        elif x < heights[1]:
+            cell = 0
+        elif x < heights[2]:
+            cell = 1
+        elif x < heights[3]:
+            cell = 2
+        else:
+            cell = 3
+        for i in range(cell + 1, 5):
+            positions[i] += 1
+        increments = self._increments
+        desired[1] += increments[1]
+        desired[2] += increments[2]
+        desired[3] += increments[3]
+        desired[4] += 1.0
+        for i in (1, 2, 3):
+            offset = desired[i] - positions[i]
+            if offset >= 1 and positions[i + 1] - positions[i] > 1:
+                self._adjust(i, 1)
+            elif offset <= -1 and positions[i - 1] - positions[i] < -1:
+                self._adjust(i, -1)
+
+    def _adjust(self, i, step):
+        """Move marker ``i`` one position by ``step``, parabolically if that keeps the heights ordered."""
+        heights, positions = self._heights, self._positions
+        height = self._parabolic(i, step)
+        if not heights[i - 1] < height < heights[i + 1]:
+            height = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+        heights[i] = height
+        positions[i] += step
+
+    def _parabolic(self, i, step):
+        q, n = self._heights, self._positions
+        return q[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (q[i] - q[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def value(self):
+        """Current estimate, exact while fewer than five values were seen; ``None`` when empty."""
+        if self._heights is not None:
+            return self._heights[2]
+        if not self._initial:
+            return None
+        values = sorted(self._initial)
+        return values[min(len(values) - 1, round(self.p * (len(values) - 1)))]
+
+
+class RunningStats:
+    """Count, mean, standard deviation, min, max and quantile sketches of a stream."""
+
+    def __init__(self, quantiles=DEFAULT_QUANTILES):
+        self.count = 0
+        self.total = 0.0
+        self.total_squares = 0.0
+        self.min = None
+        self.max = None
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+    @classmethod
+    def from_values(cls, values, quantiles=DEFAULT_QUANTILES):
+        """Stats of a batch, with the sketches started from the exact quantiles."""
+        stats = cls(())
+        values = sorted(value for value in values if value is not None and not isnan(value))
+        stats.count = len(values)
+        stats.total = float(sum(values))
+        stats.total_squares = float(sum(value * value for value in values))
+        if values:
+            stats.min, stats.max = values[0], values[-1]
+        stats.quantiles = {p: P2Quantile.from_sorted(p, values) for p in quantiles}
+        return stats
+
+    def add(self, value):
+        """Fold in one value; ``None`` and NaN are skipped."""
+        if value is None or value != value:
+            return
+        self.count += 1
+        self.total += value
+        self.total_squares += value * value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        for sketch in self.quantiles.values():
+            sketch.add(value)
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else None
+
+    @property
+    def std(self):
+        """Population standard deviation."""
+        if not self.count:
+            return None
+        mean = self.total / self.count
+        return sqrt(max(0.0, self.total_squares / self.count - mean * mean))
+
+    def quantile(self, p):
+        return self.quantiles[p].value()
+
+    def summary(self):
+        """``count``, ``mean``, ``std``, ``min``, ``max`` and one ``pNN`` per quantile."""
+        summary = {"count": self.count, "mean": self.mean, "std": self.std, "min": self.min, "max": self.max}
+        for p, sketch in self.quantiles.items():
+            summary[f"p{round(p * 100)}"] = sketch.value()
+        return summary
+
+
+class ReadingAggregates:
+    """:class:`RunningStats` per scope, group and metric, fed by the store's writer."""
+
+    def __init__(self, quantiles=DEFAULT_QUANTILES):
+        self.quantiles = quantiles
+        self.last_id = 0
+        self._groups = {scope: {} for scope in SCOPES}
+        self._lock = threading.Lock()
+        # Events delivered while seeding (a row, or None for a clear); None when not seeding
+        self._pending = None
+
+    @classmethod
+    def attach(cls, store, quantiles=DEFAULT_QUANTILES):
+        """Aggregates of everything in ``store``, kept current as readings are saved."""
+        aggregates = cls(quantiles)
+        aggregates._pending = []
+        # Subscribe first so nothing committed during the seed is missed. The
+        # scan runs without the lock so the writer is never held up by it;
+        # what arrives meanwhile is queued and folded in once the seed is in.
+        store.subscribe(aggregates)
+        groups, last_id = aggregates._seed(store)
+        with aggregates._lock:
+            pending, aggregates._pending = aggregates._pending, None
+            if None in pending:
+                # The store was cleared mid-seed; only what came after counts
+                groups, last_id = {scope: {} for scope in SCOPES}, 0
+                pending = pending[len(pending) - pending[::-1].index(None):]
+            aggregates._groups, aggregates.last_id = groups, last_id
+            for row in pending:
+                aggregates._add(row)
+        return aggregates
+
+    def _seed(self, store):
+        """Groups and last row id built from a scan of ``store``, one chunk at a time.
+
+        A group's first chunk starts its sketches from the exact quantiles and
+        later chunks are streamed in, so the seed never holds more than one
+        chunk of values.
+        """
+        groups = {scope: {} for scope in SCOPES}
+        last_id = 0
+        for rows in store.scan(("floor", "location", "device", "carrier") + tuple(METRICS.values()), chunk=_SEED_CHUNK):
+            for scope, key_of in SCOPES.items():
+                chunk = {}
+                for row in rows:
+                    series = chunk.setdefault(key_of(row), {metric: [] for metric in METRICS})
+                    for metric, column in METRICS.items():
+                        series[metric].append(row[column])
+                for key, series in chunk.items():
+                    group = groups[scope].get(key)
+                    if group is None:
+                        groups[scope][key] = {metric: RunningStats.from_values(values, self.quantiles) for metric, values in series.items()}
+                        continue
+                    for metric, values in series.items():
+                        stats = group[metric]
+                        for value in values:
+                            stats.add(value)
+            last_id = rows[-1]["id"]
+        return groups, last_id
+
+    def reading(self, row):
+        """Fold in one committed reading (``row`` maps store columns to values)."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(row)
+            else:
+                self._add(row)
+
+    def _add(self, row):
+        # Rows the seed already covered are skipped by id
+        if row["id"] <= self.last_id:
+            return
+        self.last_id = row["id"]
+        for scope, key_of in SCOPES.items():
+            group = self._groups[scope].get(key_of(row))
+            if group is None:
+                group = self._groups[scope][key_of(row)] = {metric: RunningStats(self.quantiles) for metric in METRICS}
+            for metric, column in METRICS.items():
+                group[metric].add(row[column])
+
+    def cleared(self):
+        """The store was emptied; start again from nothing."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(None)
+            else:
+                self._groups = {scope: {} for scope in SCOPES}
+
+    def groups(self, scope):
+        """Group keys seen in ``scope``, sorted."""
+        with self._lock:
+            return sorted(self._groups[scope], key=str)
+
+    def stats(self, scope, key, metric):
+        """:class:`RunningStats` of ``metric`` for one group, or ``None``."""
+        with self._lock:
+            group = self._groups[scope].get(key)
+            return None if group is None else group[metric]
+
+    def table(self, scope, metric):
+        """One :meth:`RunningStats.summary` row per group of ``scope``, led by its :data:`KEY_COLUMNS`."""
+        columns = KEY_COLUMNS[scope]
+        with self._lock:
+            return [
+                {**dict(zip(columns, key if len(columns) > 1 else (key,))), **group[metric].summary()}
+                for key, group in sorted(self._groups[scope].items(), key=lambda item: str(item[0]))
+            ]
+
+    def building(self):
+        """Building-wide summary row per metric."""
+        with self._lock:
+            group = self._groups["building"].get("All")
+            if group is None:
+                return []
+            return [{"Metric": metric, **stats.summary()} for metric, stats in group.items()]
+
+    def floor_means(self):
+        """Per-floor means shaped like ``df.groupby("Floor").mean()``: ``Floor`` plus one column per metric."""
+        with self._lock:
+            return [
+                {"Floor": floor, **{metric: stats.mean for metric, stats in group.items()}}
+                for floor, group in sorted(self._groups["floor"].items())
+            ]
+
+    def carrier_means(self):
+        """``{floor: {carrier: mean signal}}`` for every floor and carrier seen."""
+        metric = "Signal Strength (dBm)"
+        means = {}
+        with self._lock:
+            for (floor, carrier), group in sorted(self._groups["carrier"].items()):
+                means.setdefault(floor, {})[carrier] = group[metric].mean
+        return means
@@ -0,0 +1,296 @@
+"""Chart layer with memoized rendering and two backends.
+
+Every chart is keyed on ``(chart, backend, data version, arguments)``, so a
+rerun that did not save a reading reuses the already rendered chart instead
+of rebuilding the figure. The ``matplotlib`` backend returns PNG bytes (the
+original seaborn/matplotlib look); the ``altair`` backend returns a
+lightweight interactive Vega-Lite chart. Plotting libraries are imported
+only when a chart is first built, so importing this module is cheap.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+from engine.timing import span
+
+MATPLOTLIB = "matplotlib"
+ALTAIR = "altair"
+BACKENDS = (MATPLOTLIB, ALTAIR)
+
+DEFAULT_MAX_POINTS = 2000
+
+WEAK_SIGNAL_DBM = -90
+GOOD_SIGNAL_DBM = -70
+
+_SPEED_COLUMNS = ["Download Speed (Mbps)", "Upload Speed (Mbps)"]
+_SPEED_COLORS = {"Download Speed (Mbps)": "blue", "Upload Speed (Mbps)": "green"}
+
+
+def downsample(x, y, max_points=DEFAULT_MAX_POINTS):
+    """Min/max decimation of a series to at most ``max_points`` points.
+
+    The series is cut into ``max_points // 2`` equal buckets and each keeps
+    its lowest and highest sample, so dips and peaks survive.
+    """
+    import numpy as np
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    n = y.size
+    if n <= max_points:
+        return x, y
+    buckets = max(1, max_points // 2)
+    size = -(-n // buckets)
+    padded = np.full(buckets * size, np.nan)
+    padded[:n] = y
+    grid = padded.reshape(buckets, size)
+    offsets = np.arange(buckets) * size
+    lows = offsets + np.argmin(np.where(np.isnan(grid), np.inf, grid), axis=1)
+    highs = offsets + np.argmax(np.where(np.isnan(grid), -np.inf, grid), axis=1)
+    keep = np.unique(np.concatenate([lows, highs]))
+    keep = keep[keep < n]
+    return x[keep], y[keep]
+
+
+class ChartCache:
+    """Small LRU of rendered charts."""
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+        with span(f"chart.{key[0]}", backend=key[1]):
+            chart = build()
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = chart
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return chart
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = ChartCache()
+
+
+def _figure():
+    # Figure objects (not pyplot) keep rendering thread-safe and leak-free.
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=(10, 5))
+    return fig, fig.subplots()
+
+
+def _png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight")
+    return buffer.getvalue()
+
+
+def _mpl_signal_by_floor(floor_means, title):
+    import seaborn as sns
+    fig, ax = _figure()
+    sns.lineplot(data=floor_means, x="Floor", y="Signal Strength (dBm)", marker="o", linewidth=2.5, color="red", label="Signal Strength", ax=ax)
+    sns.scatterplot(data=floor_means, x="Floor", y="Signal Strength (dBm)", s=100, color="black", ax=ax)
+    ax.set_xlabel("Floor")
+    ax.set_ylabel("Average Signal Strength (dBm)")
+    if title:
+        ax.set_title(title)
+    ax.grid(True, linestyle="--", alpha=0.7)
+    ax.axhline(y=WEAK_SIGNAL_DBM, color="gray", linestyle="dashed", label=f"Weak Signal ({WEAK_SIGNAL_DBM} dBm)")
+    ax.axhline(y=GOOD_SIGNAL_DBM, color="blue", linestyle="dashed", label=f"Good Signal ({GOOD_SIGNAL_DBM} dBm)")
+    ax.legend()
+    return _png(fig)
+
+
+def _alt_signal_by_floor(floor_means, title):
+    import altair as alt
+    import pandas as pd
+    base = alt.Chart(floor_means).encode(
+        x=alt.X("Floor:O", title="Floor"),
+        y=alt.Y("Signal Strength (dBm):Q", title="Average Signal Strength (dBm)", scale=alt.Scale(zero=False)),
+        tooltip=["Floor", "Signal Strength (dBm)"],
+    )
+    thresholds = alt.Chart(pd.DataFrame({
+        "dBm": [WEAK_SIGNAL_DBM, GOOD_SIGNAL_DBM],
+        "Threshold": [f"Weak Signal ({WEAK_SIGNAL_DBM} dBm)", f"Good Signal ({GOOD_SIGNAL_DBM} dBm)"],
+    })).mark_rule(strokeDash=[6, 4]).encode(y="dBm:Q", color=alt.Color("Threshold:N", scale=alt.Scale(range=["blue", "gray"])))
+    chart = base.mark_line(color="red", strokeWidth=2.5) + base.mark_circle(color="black", size=100) + thresholds
+    return chart.properties(title=title or "").interactive()
+
+
+def signal_by_floor(floor_means, version, backend=MATPLOTLIB, title=None):
+    """Average signal strength per floor with weak/good reference lines."""
+    build = _alt_signal_by_floor if backend == ALTAIR else _mpl_signal_by_floor
+    return _cache.get(("signal_by_floor", backend, version, title), lambda: build(floor_means, title))
+
+
+def _mpl_speed_by_floor(floor_means, title):
+    import seaborn as sns
+    fig, ax = _figure()
+    sns.barplot(data=floor_means.melt(id_vars=["Floor"], value_vars=_SPEED_COLUMNS),
+                x="Floor", y="value", hue="variable", palette=_SPEED_COLORS, ax=ax)
+    ax.set_xlabel("Floor")
+    ax.set_ylabel("Speed (Mbps)")
+    if title:
+        ax.set_title(title)
+    ax.grid(axis="y", linestyle="--", alpha=0.7)
+    ax.legend(title="Speed Type")
+    return _png(fig)
+
+
+def _alt_speed_by_floor(floor_means, title):
+    import altair as alt
+    melted = floor_means.melt(id_vars=["Floor"], value_vars=_SPEED_COLUMNS, var_name="Speed Type", value_name="Speed (Mbps)")
+    return alt.Chart(melted).mark_bar().encode(
+        x=alt.X("Floor:O", title="Floor"),
+        xOffset="Speed Type:N",
+        y=alt.Y("Speed (Mbps):Q"),
+        color=alt.Color("Speed Type:N", scale=alt.Scale(domain=_SPEED_COLUMNS, range=["blue", "green"])),
+        tooltip=["Floor", "Speed Type", "Speed (Mbps)"],
+    ).properties(title=title or "")
+
+
+def speed_by_floor(floor_means, version, backend=MATPLOTLIB, title=None):
+    """Average download and upload speed per floor as grouped bars."""
+    build = _alt_speed_by_floor if backend == ALTAIR else _mpl_speed_by_floor
+    return _cache.get(("speed_by_floor", backend, version, title), lambda: build(floor_means, title))
+
+
+def _mpl_location_lines(df, columns, colors, ylabel, title, max_points):
+    fig, ax = _figure()
+    for column, color in zip(columns, colors):
+        x, y = downsample(df["Location"].to_numpy(), df[column].to_numpy(), max_points)
+        label = column.replace(" (Mbps)", "") if len(columns) > 1 else None
+        ax.plot(x, y, marker="o", linestyle="-", color=color, label=label)
+    ax.set_xlabel("Location")
+    ax.set_ylabel(ylabel)
+    ax.set_title(title)
+    ax.tick_params(axis="x", labelrotation=45)
+    if len(columns) > 1:
+        ax.legend()
+    ax.grid(True)
+    return _png(fig)
+
+
+def _alt_location_lines(df, columns, colors, ylabel, title, max_points):
+    import altair as alt
+    import numpy as np
+    import pandas as pd
+    frames = []
+    for column in columns:
+        index, y = downsample(np.arange(len(df)), df[column].to_numpy(), max_points)
+        frames.append(pd.DataFrame({"Order": index, "Location": df["Location"].to_numpy()[index], "Series": column, ylabel: y}))
+    data = pd.concat(frames, ignore_index=True)
+    return alt.Chart(data).mark_line(point=True).encode(
+        x=alt.X("Location:N", sort=alt.EncodingSortField("Order"), axis=alt.Axis(labelAngle=-45)),
+        y=alt.Y(f"{ylabel}:Q", scale=alt.Scale(zero=False)),
+        color=alt.Color("Series:N", scale=alt.Scale(domain=columns, range=colors), legend=alt.Legend(title=None) if len(columns) > 1 else None),
+        tooltip=["Location", "Series", ylabel],
+    ).properties(title=title).interactive()
+
+
+def floor_signal(df, floor, version, backend=MATPLOTLIB, max_points=DEFAULT_MAX_POINTS):
+    """Signal strength along the locations of one floor."""
+    build = _alt_location_lines if backend == ALTAIR else _mpl_location_lines
+    return _cache.get(
+        ("floor_signal", backend, version, floor, max_points),
+        lambda: build(df, ["Signal Strength (dBm)"], ["red"], "Signal Strength (dBm)", f"Signal Strength - Floor {floor}", max_points)
+    )
+
+
+def floor_speed(df, floor, version, backend=MATPLOTLIB, max_points=DEFAULT_MAX_POINTS):
+    """Download and upload speed along the locations of one floor."""
+    build = _alt_location_lines if backend == ALTAIR else _mpl_location_lines
+    return _cache.get(
+        ("floor_speed", backend, version, floor, max_points),
+        lambda: build(df, _SPEED_COLUMNS, ["blue", "green"], "Speed (Mbps)", f"Internet Speed - Floor {floor}", max_points)
+    )
+
+
+def _signal_scale(metric, heatmap):
+    if metric == "Signal Strength (dBm)":
+        return "RdYlGn", -120, GOOD_SIGNAL_DBM
+    return "viridis", heatmap.low, heatmap.high
+
+
+def _mpl_coverage_map(heatmap, metric, plan_path, max_gap, title):
+    import numpy as np
+    fig, ax = _figure()
+    extent = (0, 1, heatmap.aspect, 0)
+    if plan_path is not None:
+        import matplotlib.image as mpimg
+        ax.imshow(mpimg.imread(plan_path), extent=extent, aspect="equal")
+    cmap, low, high = _signal_scale(metric, heatmap)
+    surface = np.ma.masked_invalid(heatmap.surface(max_gap))
+    image = ax.imshow(surface, extent=extent, cmap=cmap, vmin=low, vmax=high, alpha=0.55 if plan_path else 0.9,
+                      interpolation="bilinear", aspect="equal")
+    fig.colorbar(image, ax=ax, label=metric)
+    points = heatmap.index.points()
+    if points:
+        ax.scatter([p[0] for p in points], [p[1] * heatmap.aspect for p in points], s=18, c="black", marker="x")
+    ax.set_xlim(0, 1)
+    ax.set_ylim(heatmap.aspect, 0)
+    ax.set_axis_off()
+    ax.set_title(title)
+    return _png(fig)
+
+
+def _alt_coverage_map(heatmap, metric, plan_path, max_gap, title):
+    import altair as alt
+    import numpy as np
+    import pandas as pd
+    surface = heatmap.surface(max_gap)
+    # A few thousand rectangles keep the Vega view responsive.
+    step = max(1, heatmap.columns // 60)
+    grid = surface[::step, ::step]
+    ys, xs = np.nonzero(~np.isnan(grid))
+    cells = pd.DataFrame({
+        "x": heatmap.xs[::step][xs], "y": heatmap.ys[::step][ys] * heatmap.aspect,
+        "x2": heatmap.xs[::step][xs] + step / heatmap.columns, "y2": (heatmap.ys[::step][ys] + step / heatmap.rows) * heatmap.aspect,
+        metric: grid[ys, xs].round(1),
+    })
+    cmap, low, high = _signal_scale(metric, heatmap)
+    scheme = "redyellowgreen" if cmap == "RdYlGn" else "viridis"
+    x_scale = alt.Scale(domain=[0, 1])
+    y_scale = alt.Scale(domain=[heatmap.aspect, 0])
+    heat = alt.Chart(cells).mark_rect(opacity=0.85).encode(
+        x=alt.X("x:Q", scale=x_scale, axis=None), x2="x2", y=alt.Y("y:Q", scale=y_scale, axis=None), y2="y2",
+        color=alt.Color(f"{metric}:Q", scale=alt.Scale(scheme=scheme, domain=[low, high])),
+        tooltip=[alt.Tooltip(f"{metric}:Q")],
+    )
+    points = pd.DataFrame(
+        [{"x": p[0], "y": p[1] * heatmap.aspect} for p in heatmap.index.points()]
+    )
+    layers = heat
+    if not points.empty:
+        layers += alt.Chart(points).mark_point(shape="cross", color="black").encode(
+            x=alt.X("x:Q", scale=x_scale), y=alt.Y("y:Q", scale=y_scale)
+        )
+    return layers.properties(title=title, width=600, height=round(600 * heatmap.aspect))
+
+
+def coverage_map(heatmap, metric, floor, plan_path=None, max_gap=None, backend=MATPLOTLIB, version=None):
+    """Interpolated coverage of one floor, over its plan when one was uploaded.
+
+    The cache key includes the newest reading folded into ``heatmap``, so
+    the map is redrawn exactly when a new positioned reading arrives;
+    ``version`` tells apart heatmaps of different stores.
+    """
+    build = _alt_coverage_map if backend == ALTAIR else _mpl_coverage_map
+    plan_version = os.path.getmtime(plan_path) if plan_path else None
+    return _cache.get(
+        ("coverage_map", backend, version, heatmap.last_id, heatmap.count, floor, metric, plan_path, plan_version, max_gap, heatmap.aspect),
+        lambda: build(heatmap, metric, plan_path, max_gap, f"{metric} - Floor {floor}")
+    )
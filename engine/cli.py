@@ -0,0 +1,333 @@
+"""Headless survey runner: ``python -m engine``.
+
+Runs the same per-point test as the Streamlit app (signal sampled on every
+device while one speed test runs, one stored reading per device) over a
+fixed point plan, starting a point every ``--interval`` seconds. Only the
+engine modules are imported, so the runner starts without Streamlit,
+matplotlib or seaborn and suits unattended overnight soak runs.
+
+With ``--adaptive`` each speed test stops once its rate has settled within
+``--tolerance`` at ``--confidence``, and uploads only run (briefly) with
+``--short-upload``.
+
+A plan is either generated (``--floors 3 --points 5``) or read from a JSON
+file listing the points in order::
+
+    {"interval": 60, "rounds": 2, "points": [{"floor": 1, "location": "Lobby"}]}
+
+With ``--session NAME`` readings go to that survey session (shared with the
+app) and every completed point is checkpointed, so rerunning the same
+command after an interruption skips the points already measured.
+``python -m engine sessions list|merge`` lists and merges sessions.
+
+``--record TRACE`` logs every ADB answer and speed test result of a survey;
+``--replay TRACE`` runs a survey from such a trace with no phone or network,
+as fast as possible or, with ``--realtime``, at the recorded pace.
+"""
+import argparse
+import json
+import sys
+import time
+
+from engine.adaptive import AdaptivePolicy
+from engine.adb import AdbClient, close_sessions
+from engine.aggregates import ReadingAggregates
+from engine.export import ExportError, export_readings, format_for
+from engine.replay import Recorder, RecordingBackend, RecordingClient, ReplayBackend, ReplayClient, Trace, TraceError
+from engine.runner import TestJob, DONE, CANCELLED
+from engine.sessions import SessionError, create_session, find_session, list_sessions, merge_sessions
+from engine.signal import format_signal
+from engine.store import ReadingStore
+from engine.survey import (
+    establish_wifi_adb_connection, format_speed, get_adb_devices, get_internet_speed,
+    make_signal_reader, plain_text, save_reading,
+)
+from engine.throughput import BACKENDS, make_backend
+from engine.timing import tracer
+
+DEFAULT_DB_PATH = "Data/network_readings.db"
+DEFAULT_SESSIONS_DIR = "Data/sessions"
+
+
+def build_plan(floors, points_per_floor):
+    """Points ``Point 1..N`` on every floor, floor by floor."""
+    return [
+        {"floor": floor, "location": f"Point {point}"}
+        for floor in range(1, floors + 1)
+        for point in range(1, points_per_floor + 1)
+    ]
+
+
+def load_plan(path):
+    """Read a JSON plan; returns ``(points, settings)``."""
+    with open(path, encoding="utf-8") as f:
+        plan = json.load(f)
+    points = [{"floor": int(point["floor"]), "location": str(point["location"])} for point in plan["points"]]
+    if not points:
+        raise ValueError(f"Plan {path} has no points")
+    settings = {key: plan[key] for key in ("interval", "rounds") if key in plan}
+    return points, settings
+
+
+def run_point(point, devices, client, backend, store, sample_rate_hz, log=print, policy=None):
+    """Run one survey point to completion; returns the finished :class:`TestJob`.
+
+    ``policy`` is an optional :class:`engine.adaptive.AdaptivePolicy`.
+    """
+    floor, location = point["floor"], point["location"]
+    job = TestJob(
+        floor, location,
+        readers={device: make_signal_reader(client, device) for device in devices},
+        measure_speed=lambda progress, cancel_event: get_internet_speed(backend, store, floor, location, progress, cancel_event, policy),
+        save=lambda *args, **kwargs: save_reading(store, *args, **kwargs),
+        sample_rate_hz=sample_rate_hz,
+    ).start()
+    try:
+        job.join()
+    except KeyboardInterrupt:
+        job.cancel()
+        job.join()
+        raise
+    if job.state != DONE:
+        log(f"Floor {floor} · {location}: {'cancelled' if job.state == CANCELLED else f'failed: {job.error}'}")
+        return job
+    result = job.result
+    bounds = result["bounds"]
+    speeds = f"{format_speed(result['download'], bounds.get('download'))} / {format_speed(result['upload'], bounds.get('upload'))}"
+    log(f"Floor {floor} · {location}: {speeds} in {job.elapsed:.1f}s")
+    log("  " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in job.timings.items()))
+    if result["speed_error"]:
+        log(f"  {plain_text(result['speed_error'])}")
+    for device in job.devices:
+        signal = job.signals.get(device)
+        error = result["signal_errors"][device]
+        text = format_signal(signal) if signal is not None else f"no signal ({error})" if error else "no signal"
+        log(f"  {device}: {text} | {plain_text(result['save_messages'][device])}")
+    return job
+
+
+def run_survey(points, devices, client, backend, store, interval=0.0, rounds=1, sample_rate_hz=2.0, log=print, session=None, policy=None):
+    """Run ``points`` ``rounds`` times (0 = until interrupted), one point every ``interval`` seconds.
+
+    With a :class:`engine.sessions.SurveySession`, points it already has
+    for the current round are skipped and each completed point is
+    checkpointed. Returns the number of points that completed and were saved.
+    """
+    completed = 0
+    next_start = time.monotonic()
+    round_number = 0
+    while rounds == 0 or round_number < rounds:
+        round_number += 1
+        for point in points:
+            if session is not None and session.location_tests(point["floor"], point["location"]) >= round_number:
+                continue
+            delay = next_start - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            next_start = max(next_start + interval, time.monotonic())
+            job = run_point(point, devices, client, backend, store, sample_rate_hz, log, policy)
+            if job.state == DONE and any(job.result["saved"].values()):
+                completed += 1
+                if session is not None:
+                    session.record(point["floor"], point["location"], store.last_id())
+                    session.save()
+    return completed
+
+
+def print_summary(aggregates, log=print):
+    """Building-wide count, mean and percentiles of every metric."""
+    for row in aggregates.building():
+        if not row["count"]:
+            continue
+        log(
+            f"{row['Metric']}: n={row['count']} mean {row['mean']:.1f} "
+            f"p10 {row['p10']:.1f} p50 {row['p50']:.1f} p90 {row['p90']:.1f} (min {row['min']:.1f}, max {row['max']:.1f})"
+        )
+
+
+def _connect_devices(client, serials, wifi, log):
+    devices = []
+    for serial in serials:
+        if not wifi:
+            devices.append(serial)
+            continue
+        device_id, message, hint = establish_wifi_adb_connection(client, serial)
+        log(plain_text(f"{message} {hint}").strip())
+        if device_id:
+            devices.append(device_id)
+    return devices
+
+
+def open_session(directory, key, points, devices):
+    """Resume the session called ``key`` (id or name), or start it for ``points``."""
+    session = find_session(directory, key)
+    if session is None:
+        floors = max(point["floor"] for point in points)
+        per_floor = max(sum(1 for point in points if point["floor"] == floor) for floor in range(1, floors + 1))
+        session = create_session(directory, key, floors, per_floor)
+    store = ReadingStore(session.db_path)
+    session.catch_up(store)
+    for device in devices:
+        session.bind_device(device)
+    return session.save(), store
+
+
+def sessions_command(args):
+    if args.action == "list":
+        for session in list_sessions(args.dir):
+            print(f"{session.id}  {session.label()}")
+        return 0
+    try:
+        sources = []
+        for key in args.sessions:
+            session = find_session(args.dir, key)
+            if session is None:
+                raise SessionError(f"No session {key!r} in {args.dir}")
+            sources.append(session)
+        merged = merge_sessions(args.dir, sources, args.name)
+    except SessionError as e:
+        print(e, file=sys.stderr)
+        return 1
+    print(f"Merged into {merged.id}  {merged.label()}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m engine", description="Headless network survey runner.")
+    parser.add_argument("--adb-path", default="app/adb.exe", help="adb binary used to start the ADB server if needed")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("devices", help="list connected ADB devices")
+
+    sessions = commands.add_parser("sessions", help="list or merge saved survey sessions")
+    sessions.add_argument("action", choices=["list", "merge"])
+    sessions.add_argument("sessions", nargs="*", help="sessions to merge (id or name)")
+    sessions.add_argument("--name", default="Merged survey", help="name of the merged session")
+    sessions.add_argument("--dir", default=DEFAULT_SESSIONS_DIR)
+
+    survey = commands.add_parser("survey", help="run a survey over a point plan")
+    survey.add_argument("--plan", help="JSON plan file (overrides --floors/--points)")
+    survey.add_argument("--floors", type=int, default=1)
+    survey.add_argument("--points", type=int, default=1, help="points per floor")
+    survey.add_argument("--interval", type=float, help="seconds between point starts (default 0)")
+    survey.add_argument("--rounds", type=int, help="passes over the plan, 0 = until interrupted (default 1)")
+    survey.add_argument("--device", action="append", default=[], help="device serial (repeatable; default: all connected)")
+    survey.add_argument("--wifi", action="store_true", help="switch USB devices to Wi-Fi ADB first")
+    survey.add_argument("--backend", choices=list(BACKENDS), default="speedtest.net")
+    survey.add_argument("--target", help="iperf3 host or HTTP test server URL")
+    survey.add_argument("--server-ttl", type=float, help="seconds to keep the speedtest.net server")
+    survey.add_argument("--adaptive", action="store_true", help="stop each speed test once its rate has converged")
+    survey.add_argument("--confidence", type=float, default=0.95, help="confidence level of the adaptive stop (default 0.95)")
+    survey.add_argument("--tolerance", type=float, default=0.1, help="stop when the interval is within this fraction of the rate (default 0.1)")
+    survey.add_argument("--short-upload", action="store_true", help="with --adaptive, also run a short upload test")
+    survey.add_argument("--sample-rate", type=float, default=2.0, help="signal samples per second during a test")
+    survey.add_argument("--db", default=DEFAULT_DB_PATH)
+    survey.add_argument("--session", help="resume (or start) this survey session instead of writing to --db")
+    survey.add_argument("--sessions-dir", default=DEFAULT_SESSIONS_DIR)
+    survey.add_argument("--export", help="write the readings here when the survey ends (.csv, .parquet or .xlsx)")
+    survey.add_argument("--trace", help="write a Chrome trace of every stage here when the survey ends")
+    survey.add_argument("--record", metavar="TRACE", help="record every ADB answer and speed test result to this .jsonl.gz trace")
+    survey.add_argument("--replay", metavar="TRACE", help="answer ADB and speed tests from a recorded trace instead of phones and the network")
+    survey.add_argument("--realtime", action="store_true", help="with --replay, take as long as the recorded calls did")
+    args = parser.parse_args(argv)
+    if args.command == "sessions":
+        return sessions_command(args)
+    if args.command == "devices":
+        devices, error = get_adb_devices(AdbClient(args.adb_path))
+        if error:
+            print(plain_text(error), file=sys.stderr)
+            return 1
+        for device in devices:
+            print(device)
+        return 0
+    if args.record and args.replay:
+        print("--record and --replay cannot be combined", file=sys.stderr)
+        return 2
+    trace = recorder = None
+    speed = 1.0 if args.realtime else None
+    if args.replay:
+        try:
+            trace = Trace.load(args.replay)
+        except TraceError as e:
+            print(e, file=sys.stderr)
+            return 2
+        client = ReplayClient(trace, speed)
+    else:
+        client = AdbClient(args.adb_path)
+    if args.record:
+        recorder = Recorder(args.record)
+        client = RecordingClient(client, recorder)
+    try:
+        return survey_command(args, client, trace, recorder, speed)
+    finally:
+        if recorder is not None:
+            recorder.close()
+            print(f"ADB and speed test trace written to {args.record}")
+
+
+def survey_command(args, client, trace=None, recorder=None, speed=None):
+    """The ``survey`` command on ``client``, which may be recording or replaying a trace."""
+    devices, error = get_adb_devices(client)
+    if error:
+        print(plain_text(error), file=sys.stderr)
+        return 1
+
+    serials = args.device or devices
+    if not serials:
+        print("No ADB devices found. Connect a device via USB.", file=sys.stderr)
+        return 1
+    wifi = args.wifi
+    if trace is not None and not wifi and trace.wifi_serials() & set(serials):
+        # The recorded signal reads are on the network serials the switch produced
+        print("The trace was recorded with --wifi; replaying the switch to Wi-Fi ADB too")
+        wifi = True
+    devices = _connect_devices(client, serials, wifi, print)
+    if not devices:
+        return 1
+
+    if args.plan:
+        points, settings = load_plan(args.plan)
+    else:
+        points, settings = build_plan(args.floors, args.points), {}
+    interval = args.interval if args.interval is not None else settings.get("interval", 0.0)
+    rounds = args.rounds if args.rounds is not None else settings.get("rounds", 1)
+
+    try:
+        backend = ReplayBackend(trace, speed) if trace is not None else make_backend(args.backend, args.target, args.server_ttl)
+        if recorder is not None:
+            backend = RecordingBackend(backend, recorder)
+        if args.export:
+            format_for(args.export)
+        if not 0 < args.confidence < 1 or args.tolerance <= 0:
+            raise ValueError("--confidence must be between 0 and 1 and --tolerance above 0")
+    except (ValueError, ExportError) as e:
+        print(e, file=sys.stderr)
+        return 2
+    policy = AdaptivePolicy(args.confidence, args.tolerance, short_upload=args.short_upload) if args.adaptive else None
+    session = None
+    if args.session:
+        session, store = open_session(args.sessions_dir, args.session, points, devices)
+        print(f"Session {session.id}: {session.tests()} point(s) already measured")
+    else:
+        store = ReadingStore(args.db)
+    aggregates = ReadingAggregates.attach(store)
+    print(f"Surveying {len(points)} point(s) with {', '.join(devices)} using {backend.name}{' (adaptive)' if policy else ''}")
+    try:
+        completed = run_survey(points, devices, client, backend, store, interval, rounds, args.sample_rate, session=session, policy=policy)
+        print(f"Done: {completed} point(s) saved to {store.db_path}")
+    except KeyboardInterrupt:
+        print("Interrupted; readings taken so far are saved.")
+    finally:
+        print_summary(aggregates)
+        if args.export:
+            try:
+                export_readings(store, args.export)
+                print(f"Exported {args.export}")
+            except ExportError as e:
+                print(e, file=sys.stderr)
+        if args.trace:
+            tracer.export(args.trace)
+            print(f"Trace written to {args.trace}")
+        store.close()
+        close_sessions()
+    return 0
@@ -0,0 +1,55 @@
+"""In-process cache of the analysis DataFrames, keyed on the store generation.
+
+Averages and percentiles are not computed here; they are kept up to date
+as readings are saved by :class:`engine.aggregates.ReadingAggregates`.
+"""
+import threading
+
+from engine.timing import span
+
+
+class Dataset:
+    """Immutable snapshot of the store plus the frames derived from it."""
+
+    def __init__(self, generation, frame, floors):
+        self.generation = generation
+        self.frame = frame
+        self.floors = floors
+
+    @property
+    def empty(self):
+        return self.frame.empty
+
+    def floor(self, floor):
+        """Readings for ``floor``, or ``None`` if nothing was recorded there."""
+        return self.floors.get(int(floor))
+
+
+def build_dataset(store, generation):
+    """Read the store once and split it into per-floor frames."""
+    with span("dataset.build"):
+        return _build_dataset(store, generation)
+
+
+def _build_dataset(store, generation):
+    df = store.read_frame()
+    floors = {int(floor): floor_df.reset_index(drop=True) for floor, floor_df in df.groupby("Floor", sort=True)}
+    return Dataset(generation, df, floors)
+
+
+class DatasetCache:
+    """Rebuilds the :class:`Dataset` only when the store generation moves on."""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._dataset = None
+
+    def get(self):
+        with self._lock:
+            # Read the generation before the data so a concurrent insert
+            # simply causes one extra rebuild on the next call.
+            generation = self.store.generation
+            if self._dataset is None or self._dataset.generation != generation:
+                self._dataset = build_dataset(self.store, generation)
+            return self._dataset
@@ -0,0 +1,165 @@
+"""Single-pass parser for ``dumpsys telephony.registry`` output.
+
+The registry dump repeats a block per SIM (``Phone Id=N``) holding the
+service state and a ``SignalStrength`` with one ``CellSignalStrength*``
+entry per radio technology, followed by a long ``local logs:`` history.
+:func:`parse_dumpsys` only looks at the lines it needs, found with plain
+substring searches that stop at the log history, so its cost does not
+grow with how chatty the device has been.
+"""
+import re
+import time
+from dataclasses import dataclass, replace
+
+from engine.signal import SignalReading
+
+FULL_COMMAND = "dumpsys telephony.registry"
+# Lines the parser reads; everything else can stay on the device.
+NARROW_MARKERS = ("Phone Id=", "mServiceState=", "mSignalStrength=", "local logs:")
+# Filters the dump on the device so only those lines cross the (often
+# Wi-Fi) ADB link; ``|| true`` keeps an empty match from failing.
+NARROW_COMMAND = f"{FULL_COMMAND} | grep -E '{'|'.join(NARROW_MARKERS)}' || true"
+SIGNAL_COMMAND = NARROW_COMMAND
+
+# Preference order when picking the serving cell of a SIM.
+RAT_PRIORITY = ("NR", "LTE", "WCDMA", "GSM")
+
+# Line prefixes read by the parser, in the order they appear in a block
+_LINE_MARKERS = ("Phone Id=", "mServiceState=", "mSignalStrength=")
+_LOGS_MARKER = "local logs:"
+_PHONE_ID = re.compile(r"\d+")
+_CELLS = re.compile(r"m(?P<rat>Gsm|Wcdma|Lte|Nr)=CellSignalStrength\w*:\s*(?:\{(?P<braced>[^}\n]*)\}|(?P<body>[^,\n]*))")
+_FIELDS = re.compile(r"(\w+)\s*=\s*(-?\d+)")
+_REG_STATE = re.compile(r"m(Voice|Data)RegState=(\d+)")
+_OPERATOR = re.compile(r"mOperatorAlphaLong=([^,}]*)")
+
+_RAT_NAMES = {"Gsm": "GSM", "Wcdma": "WCDMA", "Lte": "LTE", "Nr": "NR"}
+# SignalReading field -> dumpsys key per RAT, and the key of its level.
+# WCDMA and GSM report RSCP/EcNo and RSSI, which are not comparable with
+# RSRP/RSRQ and so get fields of their own.
+_FIELD_MAP = {
+    "NR": ({"rsrp": "ssRsrp", "rsrq": "ssRsrq", "sinr": "ssSinr"}, "level"),
+    "LTE": ({"rsrp": "rsrp", "rsrq": "rsrq", "sinr": "rssnr"}, "level"),
+    "WCDMA": ({"rscp": "rscp", "ecno": "ecno"}, "mLevel"),
+    "GSM": ({"rssi": "rssi"}, "mLevel"),
+}
+
+# Android reports unavailable measurements as Integer.MAX_VALUE.
+_UNAVAILABLE = 2147483647
+IN_SERVICE = 0
+
+
+@dataclass(frozen=True)
+class SimState:
+    """Registration state and every reported cell signal for one SIM slot."""
+    phone_id: int
+    voice_reg_state: int = None
+    data_reg_state: int = None
+    operator: str = None
+    signals: tuple = ()
+
+    @property
+    def in_service(self):
+        return IN_SERVICE in (self.voice_reg_state, self.data_reg_state)
+
+    def serving_signal(self):
+        """Best available cell for this SIM, following :data:`RAT_PRIORITY`.
+
+        The returned reading carries the SIM's operator name.
+        """
+        by_rat = {signal.rat: signal for signal in self.signals if signal.strength is not None}
+        for rat in RAT_PRIORITY:
+            if rat in by_rat:
+                return replace(by_rat[rat], operator=self.operator)
+        return None
+
+
+def _value(raw):
+    if raw is None:
+        return None
+    value = int(raw)
+    return None if abs(value) == _UNAVAILABLE else value
+
+
+def _cell(rat, body, timestamp):
+    fields = dict(_FIELDS.findall(body))
+    keys, level_key = _FIELD_MAP[rat]
+    values = {field: _value(fields.get(key)) for field, key in keys.items()}
+    return SignalReading(rat=rat, level=_value(fields.get(level_key)) or 0, timestamp=timestamp, **values)
+
+
+def _lines(output):
+    """``(marker, rest of line)`` for every line parsed, in order, up to the log history."""
+    end = output.find(_LOGS_MARKER)
+    if end == -1:
+        end = len(output)
+    found = []
+    for marker in _LINE_MARKERS:
+        start = output.find(marker, 0, end)
+        while start != -1:
+            found.append((start, marker))
+            start = output.find(marker, start + len(marker), end)
+    found.sort()
+    for start, marker in found:
+        value_start = start + len(marker)
+        value_end = output.find("\n", value_start, end)
+        yield marker, output[value_start:end if value_end == -1 else value_end]
+
+
+def parse_dumpsys(output, timestamp=None):
+    """Return a :class:`SimState` per ``Phone Id`` block in ``output``.
+
+    Output without ``Phone Id`` headers (older releases) is reported as
+    phone 0.
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    sims = []
+    phone_id, service, signals = None, None, []
+
+    def flush():
+        if phone_id is None and service is None and not signals:
+            return
+        voice = data = operator = None
+        if service is not None:
+            states = dict(_REG_STATE.findall(service))
+            voice = _value(states.get("Voice"))
+            data = _value(states.get("Data"))
+            match = _OPERATOR.search(service)
+            operator = (match.group(1).strip() or None) if match else None
+        sims.append(SimState(phone_id or 0, voice, data, operator, tuple(signals)))
+
+    for marker, value in _lines(output):
+        if marker == "Phone Id=":
+            digits = _PHONE_ID.match(value)
+            if digits is None:
+                continue
+            flush()
+            phone_id, service, signals = int(digits.group()), None, []
+        elif marker == "mServiceState=":
+            service = value
+        else:
+            for match in _CELLS.finditer(value):
+                kind = "braced" if match["braced"] is not None else "body"
+                signals.append(_cell(_RAT_NAMES[match["rat"]], match[kind], timestamp))
+    flush()
+    return sims
+
+
+def serving_signal(sims):
+    """Pick the serving cell, preferring SIMs that are registered in service."""
+    ordered = sorted(sims, key=lambda sim: not sim.in_service)
+    for sim in ordered:
+        signal = sim.serving_signal()
+        if signal is not None:
+            return signal
+    return None
+
+
+def narrow_output(output):
+    """Apply the :data:`NARROW_COMMAND` filter to a full dump locally."""
+    return "\n".join(line for line in output.splitlines() if any(m in line for m in NARROW_MARKERS))
+
+
+def parse_signal(output, timestamp=None):
+    """Serving-cell :class:`SignalReading` from registry output, or ``None``."""
+    return serving_signal(parse_dumpsys(output, timestamp))
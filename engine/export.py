@@ -0,0 +1,175 @@
+"""On-demand exports of the readings store as CSV, Parquet or Excel.
+
+Exports are written chunk by chunk from :meth:`ReadingStore.iter_frames`,
+so producing one never holds more than a chunk of the survey in memory,
+and land in a temporary file that is moved into place only once complete.
+:class:`ExportCache` keeps the last artifact per format and floor and
+reuses it until the store generation moves on.
+"""
+import csv
+import os
+import threading
+
+from engine.store import COLUMNS, TIMINGS_COLUMN
+from engine.timing import span
+
+EXPORT_COLUMNS = COLUMNS + [TIMINGS_COLUMN]
+# format -> (file extension, MIME type)
+FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+    "xlsx": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+CHUNK_ROWS = 20_000
+_TEXT_COLUMNS = {"Location", "Device", "Carrier", "Network", TIMINGS_COLUMN}
+_INTEGER_COLUMNS = {"Floor", "Signal Strength (dBm)", "RSRQ (dB)", "SINR (dB)", "RSCP (dBm)", "EcNo (dB)", "RSSI (dBm)", "Level"}
+
+
+class ExportError(Exception):
+    """An export could not be produced."""
+
+
+def format_for(path):
+    """Export format implied by the extension of ``path``."""
+    extension = os.path.splitext(path)[1].lower()
+    for fmt, (fmt_extension, _) in FORMATS.items():
+        if extension == fmt_extension:
+            return fmt
+    raise ExportError(f"Unknown export type {extension or path!r}; use one of {', '.join(ext for ext, _ in FORMATS.values())}")
+
+
+def export_name(fmt, floor=None, stem="network_readings"):
+    """File name of an export, e.g. ``network_readings_floor_2.csv``."""
+    suffix = "" if floor is None else f"_floor_{int(floor)}"
+    return f"{stem}{suffix}{FORMATS[fmt][0]}"
+
+
+def export_readings(store, path, fmt=None, floor=None, chunk=CHUNK_ROWS):
+    """Write the readings (all floors, or just ``floor``) to ``path`` and return the path.
+
+    ``fmt`` defaults to the one implied by the file extension. Only readings
+    stored when the export starts are included.
+    """
+    fmt = fmt or format_for(path)
+    if fmt not in FORMATS:
+        raise ExportError(f"Unknown export format {fmt!r}; use one of {', '.join(FORMATS)}")
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+    with span(f"export.{fmt}", floor=floor) as args:
+        frames = store.iter_frames(floor, chunk, max_id=store.last_id())
+        try:
+            args["rows"] = _WRITERS[fmt](store, frames, tmp_path, floor)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        os.replace(tmp_path, path)
+    return path
+
+
+def _typed(df):
+    """Export columns in order, with whole-number columns as nullable integers rather than floats."""
+    df = df[EXPORT_COLUMNS]
+    return df.astype({column: "Int64" for column in _INTEGER_COLUMNS})
+
+
+def _write_csv(store, frames, path, floor):
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        csv.writer(f).writerow(EXPORT_COLUMNS)
+        for df in frames:
+            _typed(df).to_csv(f, header=False, index=False)
+            rows += len(df)
+    return rows
+
+
+def _parquet_schema():
+    import pyarrow as pa
+    fields = []
+    for column in EXPORT_COLUMNS:
+        if column == "Timestamp":
+            kind = pa.timestamp("ns")
+        elif column in _TEXT_COLUMNS:
+            kind = pa.string()
+        elif column in _INTEGER_COLUMNS:
+            kind = pa.int64()
+        else:
+            kind = pa.float64()
+        fields.append((column, kind))
+    return pa.schema(fields)
+
+
+def _write_parquet(store, frames, path, floor):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportError("Parquet export needs pyarrow (pip install pyarrow)")
+    schema = _parquet_schema()
+    rows = 0
+    # One row group per chunk keeps the writer's buffer at a single chunk
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for df in frames:
+            writer.write_table(pa.Table.from_pandas(df[EXPORT_COLUMNS], schema=schema, preserve_index=False))
+            rows += len(df)
+    return rows
+
+
+def _write_xlsx(store, frames, path, floor):
+    from openpyxl import Workbook
+    # Write-only sheets stream their rows to disk instead of keeping cells in memory
+    workbook = Workbook(write_only=True)
+    floors = [int(floor)] if floor is not None else store.floors() or [1]
+    sheets = {}
+    for number in floors:
+        sheets[number] = workbook.create_sheet(f"Floor_{number}")
+        sheets[number].append(EXPORT_COLUMNS)
+    rows = 0
+    for df in frames:
+        df = _typed(df).astype(object)
+        df = df.where(df.notna(), None)
+        for number, floor_df in df.groupby("Floor", sort=False):
+            sheet = sheets[int(number)]
+            for row in floor_df.itertuples(index=False, name=None):
+                sheet.append(row)
+        rows += len(df)
+    workbook.save(path)
+    return rows
+
+
+_WRITERS = {"csv": _write_csv, "parquet": _write_parquet, "xlsx": _write_xlsx}
+
+
+class ExportCache:
+    """Last export per (format, floor) in ``directory``, rebuilt only after the store changes."""
+
+    def __init__(self, store, directory):
+        self.store = store
+        self.directory = directory
+        self._exports = {}
+        self._lock = threading.Lock()
+
+    def get(self, fmt, floor=None):
+        """Path of an up-to-date export, writing it first if the data changed since the last one."""
+        with self._lock:
+            # Read the generation before exporting; a save during the export
+            # only means the next request exports again.
+            generation = self.store.generation
+            key = (fmt, floor)
+            cached = self._exports.get(key)
+            if cached is not None and cached[0] == generation and os.path.exists(cached[1]):
+                return cached[1]
+            path = export_readings(self.store, os.path.join(self.directory, export_name(fmt, floor)), fmt, floor)
+            self._exports[key] = (generation, path)
+            return path
+
+    def clear(self):
+        """Forget and delete every cached export."""
+        with self._lock:
+            for _, path in self._exports.values():
+                if os.path.exists(path):
+                    os.remove(path)
+            self._exports.clear()
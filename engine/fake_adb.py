@@ -0,0 +1,216 @@
+"""A local stand-in for the ADB server, for running the app without a phone.
+
+It answers the subset of the host protocol :mod:`engine.adb` uses
+(``host:version``, ``host:devices``, ``host:connect``, ``host:transport``,
+``tcpip:``, ``shell:`` and the ``exec:sh`` session stream) from canned
+command outputs. Start one from the command line and point the app at it::
+
+    python -m engine.fake_adb --port 5037 --dumpsys benchmarks/fixtures/dumpsys/single_sim_lte.txt
+"""
+import argparse
+import socket
+import socketserver
+import threading
+
+from engine.adb import STATUS_LINE
+from engine.dumpsys import FULL_COMMAND, NARROW_COMMAND, narrow_output
+
+DEFAULT_WIFI_IP = "192.168.1.50"
+
+_IP_ADDR_TEMPLATE = """1: lo: <LOOPBACK,UP,LOWER_UP> mtu 65536 qdisc noqueue state UNKNOWN group default qlen 1000
+    inet 127.0.0.1/8 scope host lo
+       valid_lft forever preferred_lft forever
+30: wlan0: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 qdisc mq state UP group default qlen 3000
+    inet {ip}/24 brd 192.168.1.255 scope global wlan0
+       valid_lft forever preferred_lft forever
+"""
+
+
+class FakeDevice:
+    """Canned shell responses for one device.
+
+    ``responses`` maps a command line to its output, or to a callable that
+    takes the command and returns ``(output, status)``.
+    """
+
+    def __init__(self, responses=None, wifi_ip=DEFAULT_WIFI_IP):
+        self.responses = dict(responses or {})
+        self.wifi_ip = wifi_ip
+        self.responses.setdefault("ip -f inet addr show", _IP_ADDR_TEMPLATE.format(ip=wifi_ip))
+        self.commands = []
+
+    @classmethod
+    def from_dumpsys(cls, output, **kwargs):
+        """Device whose telephony registry dump is ``output`` (full or narrowed)."""
+        device = cls(**kwargs)
+        device.responses[FULL_COMMAND] = output
+        device.responses[NARROW_COMMAND] = narrow_output(output) + "\n"
+        return device
+
+    def execute(self, command):
+        self.commands.append(command)
+        response = self.responses.get(command)
+        if response is None:
+            return f"sh: {command.split(' ')[0]}: not found\n", 127
+        if callable(response):
+            return response(command)
+        return response, 0
+
+
+class _Handler(socketserver.BaseRequestHandler):
+
+    def _read_request(self):
+        length = self._recv_exact(4)
+        if not length:
+            return None
+        return self._recv_exact(int(length, 16)).decode()
+
+    def _recv_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return data
+            data += chunk
+        return data
+
+    def _okay(self, message=None):
+        self.request.sendall(b"OKAY")
+        if message is not None:
+            payload = message.encode()
+            self.request.sendall(b"%04x" % len(payload) + payload)
+
+    def _fail(self, message):
+        payload = message.encode()
+        self.request.sendall(b"FAIL" + b"%04x" % len(payload) + payload)
+
+    def handle(self):
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        server = self.server
+        device = None
+        while True:
+            request = self._read_request()
+            if request is None:
+                return
+            if request == "host:version":
+                return self._okay("0029")
+            if request == "host:devices":
+                listing = "".join(f"{serial}\tdevice\n" for serial in server.device_serials())
+                return self._okay(listing)
+            if request.startswith("host:connect:"):
+                return self._okay(server.connect(request[len("host:connect:"):]))
+            if request.startswith("host:transport:"):
+                device = server.device(request[len("host:transport:"):])
+                if device is None:
+                    return self._fail(f"device '{request[len('host:transport:'):]}' not found")
+                self._okay()
+                continue
+            if device is None:
+                return self._fail(f"unknown host service '{request}'")
+            if request.startswith("tcpip:"):
+                self._okay()
+                self.request.sendall(f"restarting in TCP mode port: {request[len('tcpip:'):]}\n".encode())
+                return
+            if request.startswith("shell:"):
+                self._okay()
+                output, _ = device.execute(request[len("shell:"):])
+                self.request.sendall(output.encode())
+                return
+            if request == "exec:sh":
+                self._okay()
+                return self._interactive_shell(device)
+            return self._fail(f"unsupported service '{request}'")
+
+    def _interactive_shell(self, device):
+        buffer = b""
+        status = 0
+        while True:
+            chunk = self.request.recv(65536)
+            if not chunk:
+                return
+            buffer += chunk
+            while b"\n" in buffer:
+                line, _, buffer = buffer.partition(b"\n")
+                command = line.decode()
+                match = STATUS_LINE.match(command)
+                if match:
+                    self.request.sendall(f"\n{match['marker']} {status}\n".encode())
+                elif command:
+                    output, status = device.execute(command)
+                    self.request.sendall(output.encode())
+
+
+class FakeAdbServer(socketserver.ThreadingTCPServer):
+    """Threaded fake ADB server; use as a context manager or call :meth:`start`."""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, devices, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.devices = dict(devices)
+        self._aliases = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def address(self):
+        return self.server_address[:2]
+
+    def device_serials(self):
+        with self._lock:
+            return list(self.devices) + list(self._aliases)
+
+    def device(self, serial):
+        with self._lock:
+            return self.devices.get(serial) or self.devices.get(self._aliases.get(serial))
+
+    def connect(self, address):
+        """Pair ``ip:port`` with the device whose Wi-Fi IP matches, like ``adb connect``."""
+        ip = address.split(":")[0]
+        with self._lock:
+            for serial, device in self.devices.items():
+                if device.wifi_ip == ip:
+                    if address in self._aliases:
+                        return f"already connected to {address}"
+                    self._aliases[address] = serial
+                    return f"connected to {address}"
+        return f"failed to connect to '{address}': Connection refused"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-adb", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a fake ADB server backed by a captured dumpsys file.")
+    parser.add_argument("--port", type=int, default=5037)
+    parser.add_argument("--serial", default="emulator-5554")
+    parser.add_argument("--dumpsys", required=True, help="telephony.registry dump to serve")
+    args = parser.parse_args(argv)
+
+    with open(args.dumpsys, encoding="utf-8") as f:
+        device = FakeDevice.from_dumpsys(f.read())
+    server = FakeAdbServer({args.serial: device}, port=args.port)
+    print(f"Fake ADB server for {args.serial} listening on {server.address[0]}:{server.address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""A local HTTP stand-in for speed tests, used with :class:`engine.throughput.HttpBackend`.
+
+Serves ``GET /download?bytes=N`` and ``POST /upload`` (plain or chunked, as
+adaptive uploads send it), optionally throttled to a fixed rate so results
+are predictable offline::
+
+    python -m engine.fake_throughput --port 8090 --rate-mbps 80
+
+:class:`FixedRateBackend` skips the network entirely for benchmarks.
+"""
+import argparse
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from engine.throughput import ThroughputBackend, ThroughputError
+
+_CHUNK = 64 * 1024
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def _throttle(self, sent, start):
+        rate = self.server.rate_bytes_per_second
+        if rate:
+            ahead = sent / rate - (time.perf_counter() - start)
+            if ahead > 0:
+                time.sleep(ahead)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != "/download":
+            self.send_error(404)
+            return
+        size = int(parse_qs(url.query).get("bytes", ["0"])[0])
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Length", str(size))
+        self.end_headers()
+        payload = b"\0" * _CHUNK
+        sent = 0
+        start = time.perf_counter()
+        try:
+            while sent < size:
+                chunk = payload[:size - sent]
+                self.wfile.write(chunk)
+                sent += len(chunk)
+                self._throttle(sent, start)
+        except (BrokenPipeError, ConnectionResetError):
+            # Adaptive downloads hang up once their estimate has settled
+            pass
+
+    def _read_body(self):
+        """Yield the request body in pieces, whether sized or chunked."""
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if not size:
+                    self.rfile.readline()
+                    return
+                remaining = size
+                while remaining > 0:
+                    chunk = self.rfile.read(min(_CHUNK, remaining))
+                    if not chunk:
+                        return
+                    remaining -= len(chunk)
+                    yield chunk
+                self.rfile.readline()
+        remaining = int(self.headers.get("Content-Length", 0))
+        while remaining > 0:
+            chunk = self.rfile.read(min(_CHUNK, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/upload":
+            self.send_error(404)
+            return
+        received = 0
+        start = time.perf_counter()
+        for chunk in self._read_body():
+            received += len(chunk)
+            self._throttle(received, start)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+
+class LocalThroughputServer(ThreadingHTTPServer):
+    """Threaded throughput server; use as a context manager or call :meth:`start`."""
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, rate_mbps=None):
+        super().__init__((host, port), _Handler)
+        self.rate_bytes_per_second = rate_mbps * 1_000_000 / 8 if rate_mbps else None
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-throughput", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class FixedRateBackend(ThroughputBackend):
+    """In-process speed test stand-in: reports fixed rates after ``delay`` seconds.
+
+    With a monitor the transfer is simulated one monitor interval at a
+    time, each rate varied by up to ``jitter`` (a fraction, seeded), and
+    ends early once the monitor has converged.
+    """
+
+    name = "fixed"
+
+    def __init__(self, download_mbps=100.0, upload_mbps=20.0, delay=0.0, jitter=0.0, seed=0):
+        self.download_mbps = download_mbps
+        self.upload_mbps = upload_mbps
+        self.delay = delay
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+    def _wait(self, cancel_event, seconds):
+        if cancel_event is not None and cancel_event.wait(seconds):
+            raise ThroughputError("Transfer cancelled")
+        if cancel_event is None and seconds:
+            time.sleep(seconds)
+
+    def _transfer(self, mbps, cancel_event, monitor):
+        if monitor is None:
+            self._wait(cancel_event, self.delay)
+            return mbps
+        elapsed = 0.0
+        while True:
+            step = min(monitor.interval, max(self.delay - elapsed, 0.0))
+            self._wait(cancel_event, step)
+            elapsed += step
+            rate = mbps * (1 + self.jitter * self._random.uniform(-1, 1))
+            if monitor.add(rate, elapsed) or elapsed >= self.delay:
+                return rate
+
+    def download(self, cancel_event=None, monitor=None):
+        return self._transfer(self.download_mbps, cancel_event, monitor)
+
+    def upload(self, cancel_event=None, monitor=None):
+        return self._transfer(self.upload_mbps, cancel_event, monitor)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local HTTP throughput server.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--rate-mbps", type=float, default=None, help="throttle transfers to this rate")
+    args = parser.parse_args(argv)
+
+    server = LocalThroughputServer(port=args.port, rate_mbps=args.rate_mbps)
+    print(f"Throughput server listening on {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
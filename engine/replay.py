@@ -0,0 +1,417 @@
+"""Record ADB and speed test traffic to a compact trace and replay it offline.
+
+:class:`RecordingClient` and :class:`RecordingBackend` wrap a real
+:class:`engine.adb.AdbClient` and throughput backend and log every device
+list, ``adb connect``/``tcpip``, shell and session command (``ip addr``,
+dumpsys) with its output, and every speed test phase with its result and,
+for adaptive tests, its per-interval rates. Each event carries its start
+time and duration. A :class:`Recorder` writes them as gzip-compressed JSON
+lines with every distinct text stored once, so a dumpsys that repeats on
+every read costs a few bytes.
+
+:class:`ReplayClient` and :class:`ReplayBackend` take their place on top of
+a loaded :class:`Trace`. ``get_signal_strength``, ``get_internet_speed``
+and the rest of the survey run on them unchanged. Each call returns the
+next recorded result for the same operation, device and command, starting
+over when those run out, so a short recording can drive an arbitrarily
+long run. With ``speed=None`` results come back at once; with ``speed=1.0``
+each call takes its recorded duration (``2.0`` halves it).
+"""
+import gzip
+import json
+import threading
+import time
+
+from engine.adb import DEFAULT_TIMEOUT, AdbCommandError, AdbError
+from engine.throughput import ThroughputBackend, ThroughputError
+
+TRACE_VERSION = 1
+
+
+class TraceError(Exception):
+    """A trace file could not be read."""
+
+
+class Recorder:
+    """Appends events to a gzip-compressed JSON lines trace at ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time()
+        self._strings = {}
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self._write({"version": TRACE_VERSION, "started": self.started})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+    def _ref(self, text):
+        """Index of ``text`` in the string table, defining it on first use."""
+        index = self._strings.get(text)
+        if index is None:
+            index = self._strings[text] = len(self._strings)
+            self._write({"s": text})
+        return index
+
+    def event(self, op, device=None, arg=None, output=None, started=None, duration=0.0, **fields):
+        """Log one call: ``arg`` and ``output`` are interned text, ``fields`` stored as given."""
+        with self._lock:
+            if self._file is None:
+                return
+            record = {"t": round((started or time.time()) - self.started, 4), "d": round(duration, 5), "op": op}
+            if device is not None:
+                record["dev"] = device
+            if arg is not None:
+                record["arg"] = self._ref(str(arg))
+            if output is not None:
+                record["out"] = self._ref(output)
+            record.update(fields)
+            self._write(record)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _Call:
+    """Times one recorded call; ``done``/``failed`` log it."""
+
+    def __init__(self, recorder, op, device=None, arg=None):
+        self.recorder = recorder
+        self.op = op
+        self.device = device
+        self.arg = arg
+        self.started = time.time()
+        self._start = time.perf_counter()
+
+    def done(self, output=None, **fields):
+        self.recorder.event(self.op, self.device, self.arg, output, self.started, time.perf_counter() - self._start, **fields)
+
+    def failed(self, error, **fields):
+        self.done(error=str(error), **fields)
+
+
+class RecordingClient:
+    """An :class:`engine.adb.AdbClient` stand-in that logs every answer of ``client``."""
+
+    def __init__(self, client, recorder):
+        self.client = client
+        self.recorder = recorder
+        self.timeout = client.timeout
+
+    @property
+    def key(self):
+        return ("record",) + self.client.key
+
+    def _run(self, op, device, arg, call):
+        record = _Call(self.recorder, op, device, arg)
+        try:
+            output = call()
+        except AdbError as e:
+            record.failed(e)
+            raise
+        record.done(output)
+        return output
+
+    def devices(self):
+        record = _Call(self.recorder, "devices")
+        try:
+            devices = self.client.devices()
+        except AdbError as e:
+            record.failed(e)
+            raise
+        record.done(devices=[list(device) for device in devices])
+        return devices
+
+    def connect(self, address):
+        return self._run("connect", None, address, lambda: self.client.connect(address))
+
+    def tcpip(self, serial, port=5555):
+        return self._run("tcpip", serial, port, lambda: self.client.tcpip(serial, port))
+
+    def settle(self, seconds):
+        self.client.settle(seconds)
+
+    def shell(self, serial, command):
+        return self._run("shell", serial, command, lambda: self.client.shell(serial, command))
+
+    def session(self, serial):
+        return _RecordingSession(self.client.session(serial), self.recorder)
+
+
+class _RecordingSession:
+
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+        self.serial = session.serial
+
+    def run(self, command, timeout=None, check=True):
+        record = _Call(self.recorder, "run", self.serial, command)
+        try:
+            output = self.session.run(command, timeout, check)
+        except AdbCommandError as e:
+            record.done(e.output, status=e.status)
+            raise
+        except AdbError as e:
+            record.failed(e)
+            raise
+        record.done(output)
+        return output
+
+    def close(self):
+        self.session.close()
+
+
+class _SampleLog:
+    """Passes a rate monitor through to the backend, keeping every rate it is given."""
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self.samples = []
+
+    def __getattr__(self, name):
+        return getattr(self.monitor, name)
+
+    def add(self, mbps, elapsed):
+        self.samples.append([round(mbps, 3), round(elapsed, 3)])
+        return self.monitor.add(mbps, elapsed)
+
+
+class RecordingBackend(ThroughputBackend):
+    """A throughput backend that logs every phase ``backend`` runs."""
+
+    def __init__(self, backend, recorder):
+        self.backend = backend
+        self.recorder = recorder
+        self.name = backend.name
+
+    def prepare(self, cancel_event=None):
+        record = _Call(self.recorder, "prepare")
+        try:
+            result = self.backend.prepare(cancel_event)
+        except Exception as e:
+            record.failed(e)
+            raise
+        record.done()
+        return result
+
+    def invalidate(self):
+        self.backend.invalidate()
+
+    def _transfer(self, phase, cancel_event, monitor):
+        record = _Call(self.recorder, phase)
+        log = _SampleLog(monitor) if monitor is not None else None
+        samples = {"samples": log.samples} if log is not None else {}
+        try:
+            mbps = getattr(self.backend, phase)(cancel_event, log)
+        except Exception as e:
+            record.failed(e, **samples)
+            raise
+        record.done(mbps=round(mbps, 3), **samples)
+        return mbps
+
+    def download(self, cancel_event=None, monitor=None):
+        return self._transfer("download", cancel_event, monitor)
+
+    def upload(self, cancel_event=None, monitor=None):
+        return self._transfer("upload", cancel_event, monitor)
+
+
+class Trace:
+    """Recorded events, replayed in order per (operation, device, argument)."""
+
+    def __init__(self, events, started=None):
+        self.events = events
+        self.started = started
+        self._queues = {}
+        for event in events:
+            self._queues.setdefault((event["op"], event.get("dev"), event.get("arg")), []).append(event)
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path):
+        """Read a trace written by :class:`Recorder`; a recording cut short keeps what was written."""
+        strings, events, header = [], [], None
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if header is None:
+                        header = record
+                        if header.get("version") != TRACE_VERSION:
+                            raise TraceError(f"Unsupported trace version {header.get('version')!r} in {path}")
+                    elif "s" in record:
+                        strings.append(record["s"])
+                    else:
+                        for key in ("arg", "out"):
+                            if key in record:
+                                record[key] = strings[record[key]]
+                        events.append(record)
+        except (EOFError, ValueError) as e:
+            # A truncated gzip stream or a half-written last line
+            if header is None:
+                raise TraceError(f"Unreadable trace {path}: {e}")
+        except OSError as e:
+            raise TraceError(f"Unreadable trace {path}: {e}")
+        if header is None:
+            raise TraceError(f"Empty trace {path}")
+        return cls(events, header.get("started"))
+
+    def __len__(self):
+        return len(self.events)
+
+    def devices(self):
+        """Serials seen in the trace's device lists, in order of appearance."""
+        serials = []
+        for event in self.events:
+            for serial, _ in event.get("devices", ()):
+                if serial not in serials:
+                    serials.append(serial)
+        return serials
+
+    def wifi_serials(self):
+        """USB serials the recording switched to Wi-Fi ADB."""
+        return {event["dev"] for event in self.events if event["op"] == "tcpip"}
+
+    def next(self, op, device=None, arg=None):
+        """The next recorded event for this call, wrapping around; ``None`` if it was never recorded."""
+        key = (op, device, None if arg is None else str(arg))
+        queue = self._queues.get(key)
+        if not queue:
+            return None
+        with self._lock:
+            position = self._positions.get(key, 0)
+            self._positions[key] = position + 1
+        return queue[position % len(queue)]
+
+    def rewind(self):
+        with self._lock:
+            self._positions.clear()
+
+
+def _pause(seconds, speed, cancel_event=None):
+    """Wait ``seconds`` scaled by ``speed`` (not at all when ``speed`` is ``None``); ``True`` if cancelled."""
+    if speed is None or seconds <= 0:
+        return cancel_event is not None and cancel_event.is_set()
+    if cancel_event is not None:
+        return cancel_event.wait(seconds / speed)
+    time.sleep(seconds / speed)
+    return False
+
+
+class ReplayClient:
+    """An :class:`engine.adb.AdbClient` stand-in answering from a :class:`Trace`."""
+
+    def __init__(self, trace, speed=None):
+        self.trace = trace
+        self.speed = speed
+        self.timeout = DEFAULT_TIMEOUT
+
+    @property
+    def key(self):
+        return ("replay", id(self.trace))
+
+    def _next(self, op, device=None, arg=None):
+        event = self.trace.next(op, device, arg)
+        if event is None:
+            target = f" on {device}" if device else ""
+            raise AdbError(f"No recorded {op}{target}{f' for {arg!r}' if arg is not None else ''} in the trace")
+        _pause(event["d"], self.speed)
+        if "error" in event:
+            raise AdbError(event["error"])
+        return event
+
+    def devices(self):
+        return [tuple(device) for device in self._next("devices")["devices"]]
+
+    def connect(self, address):
+        return self._next("connect", None, address)["out"]
+
+    def tcpip(self, serial, port=5555):
+        return self._next("tcpip", serial, port)["out"]
+
+    def settle(self, seconds):
+        _pause(seconds, self.speed)
+
+    def shell(self, serial, command):
+        return self._next("shell", serial, command)["out"]
+
+    def session(self, serial):
+        return _ReplaySession(self, serial)
+
+
+class _ReplaySession:
+
+    def __init__(self, client, serial):
+        self.client = client
+        self.serial = serial
+
+    def run(self, command, timeout=None, check=True):
+        event = self.client._next("run", self.serial, command)
+        if check and event.get("status"):
+            raise AdbCommandError(command, event["status"], event["out"])
+        return event["out"]
+
+    def close(self):
+        pass
+
+
+class ReplayBackend(ThroughputBackend):
+    """A throughput backend answering from a :class:`Trace`.
+
+    An adaptive test is fed the recorded per-interval rates until its own
+    monitor stops, so a different policy than the recorded one still
+    converges (or not) on real data.
+    """
+
+    name = "replay"
+
+    def __init__(self, trace, speed=None):
+        self.trace = trace
+        self.speed = speed
+
+    def _wait(self, seconds, cancel_event):
+        if _pause(seconds, self.speed, cancel_event):
+            raise ThroughputError("Transfer cancelled")
+
+    def prepare(self, cancel_event=None):
+        event = self.trace.next("prepare")
+        if event is not None:
+            self._wait(event["d"], cancel_event)
+            if "error" in event:
+                raise ThroughputError(event["error"])
+
+    def _transfer(self, phase, cancel_event, monitor):
+        event = self.trace.next(phase)
+        if event is None:
+            raise ThroughputError(f"No recorded {phase} in the trace")
+        samples = event.get("samples") if monitor is not None else None
+        if samples:
+            previous = 0.0
+            for mbps, elapsed in samples:
+                self._wait(elapsed - previous, cancel_event)
+                previous = elapsed
+                if monitor.add(mbps, elapsed):
+                    break
+        else:
+            self._wait(event["d"], cancel_event)
+        if "error" in event:
+            raise ThroughputError(event["error"])
+        return event["mbps"]
+
+    def download(self, cancel_event=None, monitor=None):
+        return self._transfer("download", cancel_event, monitor)
+
+    def upload(self, cancel_event=None, monitor=None):
+        return self._transfer("upload", cancel_event, monitor)
@@ -0,0 +1,206 @@
+"""Runs one survey point off the Streamlit script thread.
+
+A :class:`TestJob` samples the signal on every selected device in parallel
+while a single speed test runs, so each stored dBm reflects the link under
+load, and exposes its phase, partial results and a cancel switch for the UI
+to poll. The speed test runs on this machine, so every device's reading for
+the point shares the same throughput figures.
+"""
+import threading
+import time
+
+from engine.sampler import SignalSampler
+from engine.signal import combine_readings
+from engine.timing import tracer
+
+PHASES = ("Selecting server", "Download", "Upload", "Saving")
+
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+
+class _DeviceCapture:
+    """Signal sampler and collected readings for one device."""
+
+    def __init__(self, read_signal, sample_rate_hz):
+        self.read_signal = read_signal
+        self.readings = []
+        self.read_times = []
+        self.lock = threading.Lock()
+        self.sampler = SignalSampler(self._record, rate_hz=sample_rate_hz, capacity=1024)
+
+    def _record(self):
+        start = time.perf_counter()
+        reading = self.read_signal()
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.read_times.append(elapsed)
+            if reading is not None:
+                self.readings.append(reading)
+        return reading
+
+    def latest(self):
+        with self.lock:
+            return (self.readings[-1] if self.readings else None), len(self.readings)
+
+    def combined(self):
+        with self.lock:
+            return combine_readings(self.readings)
+
+    def timings(self):
+        """Signal read round trips: count, mean and max in milliseconds."""
+        with self.lock:
+            times = list(self.read_times)
+        if not times:
+            return {"signal_reads": 0}
+        return {
+            "signal_reads": len(times),
+            "signal_mean_ms": round(sum(times) / len(times) * 1000, 2),
+            "signal_max_ms": round(max(times) * 1000, 2),
+        }
+
+
+class TestJob:
+    """Signal capture on one or more devices plus a speed test for one floor/location.
+
+    ``readers`` maps a device id to a callable returning its current
+    :class:`engine.signal.SignalReading`. ``measure_speed(progress,
+    cancel_event)`` returns ``(download, upload, error, bounds)`` and reports
+    phases through ``progress(phase, **partial)``. ``save(floor, location,
+    signal, download, upload, device=..., timings=..., position=...,
+    bounds=...)`` returns ``(success, message)`` and is called once per
+    device unless the job was cancelled; ``position`` is the point's
+    optional ``(x, y)`` on the plan and ``bounds`` the speeds' confidence
+    bounds.
+
+    :attr:`timings` collects the seconds spent in each phase (a retried
+    speed test adds to the same phases); each device's saved timings add
+    its signal read round trips.
+    """
+
+    def __init__(self, floor, location, readers, measure_speed, save, sample_rate_hz=2.0, position=None):
+        self.floor = floor
+        self.location = location
+        self.position = position
+        self.state = RUNNING
+        self.phase = PHASES[0]
+        self.error = None
+        self.signals = {}
+        self.timings = {}
+        self.result = None
+        self.started_at = None
+        self.finished_at = None
+        self._captures = {device: _DeviceCapture(reader, sample_rate_hz) for device, reader in readers.items()}
+        self._measure_speed = measure_speed
+        self._save = save
+        self._partial = {}
+        self._lock = threading.Lock()
+        self._cancel = threading.Event()
+        self._thread = None
+        self._phase_started = None
+
+    @property
+    def devices(self):
+        return list(self._captures)
+
+    @property
+    def running(self):
+        return self.state == RUNNING
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    @property
+    def progress(self):
+        """Fraction of :data:`PHASES` completed."""
+        if not self.running:
+            return 1.0
+        index = PHASES.index(self.phase) if self.phase in PHASES else 0
+        return index / len(PHASES)
+
+    @property
+    def partial(self):
+        """Results known so far: latest signal and sample count per device, download/upload."""
+        with self._lock:
+            partial = dict(self._partial)
+        partial["signals"] = {device: capture.latest() for device, capture in self._captures.items()}
+        return partial
+
+    def start(self):
+        self.started_at = time.time()
+        self._started_perf = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name=f"test-job-{self.floor}-{self.location}", daemon=True)
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def join(self, timeout=None):
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _progress(self, phase, **partial):
+        with self._lock:
+            self._end_phase()
+            self.phase = phase
+            self._phase_started = time.perf_counter()
+            self._partial.update(partial)
+
+    def _end_phase(self):
+        if self._phase_started is None:
+            return
+        now = time.perf_counter()
+        tracer.add(f"test.{self.phase}", self._phase_started, now, floor=self.floor, location=self.location)
+        self.timings[self.phase] = round(self.timings.get(self.phase, 0.0) + now - self._phase_started, 3)
+        self._phase_started = None
+
+    def _run(self):
+        state = FAILED
+        try:
+            for capture in self._captures.values():
+                capture.sampler.start()
+            try:
+                download, upload, speed_error, bounds = self._measure_speed(self._progress, self._cancel)
+            finally:
+                for capture in self._captures.values():
+                    capture.sampler.stop()
+            if self._cancel.is_set():
+                state = CANCELLED
+                return
+            self._progress("Saving", download=download, upload=upload)
+            saved, messages, signal_errors = {}, {}, {}
+            for device, capture in self._captures.items():
+                if not capture.readings:
+                    # Short tests may finish before the first scheduled sample.
+                    capture.sampler.sample_once()
+                signal = self.signals[device] = capture.combined()
+                signal_errors[device] = capture.sampler.last_error
+                saved[device], messages[device] = self._save(
+                    self.floor, self.location, signal, download, upload,
+                    device=device, timings={**self.timings, **capture.timings()}, position=self.position, bounds=bounds
+                )
+            self.result = {
+                "download": download,
+                "upload": upload,
+                "speed_error": speed_error,
+                "bounds": bounds,
+                "signal_errors": signal_errors,
+                "saved": saved,
+                "save_messages": messages,
+            }
+            state = DONE
+        except Exception as e:
+            self.error = str(e)
+        finally:
+            with self._lock:
+                self._end_phase()
+            self.finished_at = time.time()
+            tracer.add("test.total", self._started_perf, time.perf_counter(), floor=self.floor, location=self.location)
+            # Last, so whoever sees the job finish also sees its final timings
+            self.state = state
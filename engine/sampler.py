@@ -0,0 +1,170 @@
+"""Background signal sampling into a fixed-size ring buffer.
+
+A :class:`SignalSampler` polls the device from its own thread at a fixed
+rate and appends ``(timestamp, dBm, location)`` rows to a
+:class:`RingBuffer` of preallocated NumPy arrays, so memory stays constant
+however long a floor walk takes and readers never block the poller for
+more than an array copy. Per-location summaries are kept as
+:class:`engine.aggregates.RunningStats`, so they cover every sample taken
+there, not only the ones still in the buffer.
+"""
+import threading
+import time
+
+from engine.aggregates import RunningStats
+
+SUMMARY_FIELDS = ("count", "min", "max", "mean", "p10", "p90")
+SUMMARY_QUANTILES = (0.1, 0.9)
+
+
+class RingBuffer:
+    """Array-backed ring of timestamps, dBm values and location ids."""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        import numpy as np
+        self.capacity = capacity
+        self._timestamps = np.empty(capacity, dtype=np.float64)
+        self._dbm = np.empty(capacity, dtype=np.float64)
+        self._locations = np.empty(capacity, dtype=np.int32)
+        self._written = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self._written, self.capacity)
+
+    @property
+    def written(self):
+        """Total samples appended, including ones since overwritten."""
+        return self._written
+
+    def append(self, timestamp, dbm, location_id=-1):
+        with self._lock:
+            index = self._written % self.capacity
+            self._timestamps[index] = timestamp
+            self._dbm[index] = float("nan") if dbm is None else dbm
+            self._locations[index] = location_id
+            self._written += 1
+
+    def snapshot(self):
+        """Copies of ``(timestamps, dbm, location_ids)``, oldest first."""
+        import numpy as np
+        with self._lock:
+            size = len(self)
+            start = self._written % self.capacity if self._written > self.capacity else 0
+            order = (np.arange(size) + start) % self.capacity
+            return self._timestamps[order], self._dbm[order], self._locations[order]
+
+    def clear(self):
+        with self._lock:
+            self._written = 0
+
+
+def summarize(stats):
+    """Count, min, max, mean, p10 and p90 of a location's :class:`RunningStats`."""
+    summary = stats.summary()
+    return {field: summary[field] for field in SUMMARY_FIELDS}
+
+
+class SignalSampler:
+    """Polls ``read_signal`` at ``rate_hz`` on a daemon thread.
+
+    ``read_signal`` returns a :class:`engine.signal.SignalReading` or
+    ``None``; exceptions are counted and the last one kept in
+    :attr:`last_error` so a flaky link does not stop the walk.
+    """
+
+    def __init__(self, read_signal, rate_hz=2.0, capacity=4096):
+        if rate_hz <= 0:
+            raise ValueError("rate_hz must be positive")
+        self.read_signal = read_signal
+        self.interval = 1.0 / rate_hz
+        self.buffer = RingBuffer(capacity)
+        self.errors = 0
+        self.last_error = None
+        self._locations = []
+        self._location_ids = {}
+        self._stats = []
+        self._stats_lock = threading.Lock()
+        self._current_location = -1
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def set_location(self, name):
+        """Tag samples taken from now on with location ``name`` (``None`` to untag)."""
+        if not name:
+            self._current_location = -1
+            return
+        if name not in self._location_ids:
+            with self._stats_lock:
+                self._location_ids[name] = len(self._locations)
+                self._locations.append(name)
+                self._stats.append(RunningStats(SUMMARY_QUANTILES))
+        self._current_location = self._location_ids[name]
+
+    @property
+    def location(self):
+        return self._locations[self._current_location] if self._current_location >= 0 else None
+
+    def start(self):
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="signal-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self.sample_once()
+            # Schedule from the previous tick so slow reads don't drift the rate.
+            next_tick += self.interval
+            delay = next_tick - time.monotonic()
+            if delay < 0:
+                next_tick = time.monotonic()
+                delay = 0
+            self._stop.wait(delay)
+
+    def sample_once(self):
+        """Take one reading now and append it to the buffer."""
+        location_id = self._current_location
+        try:
+            reading = self.read_signal()
+        except Exception as e:
+            self.errors += 1
+            self.last_error = str(e)
+            return None
+        timestamp = time.time() if reading is None or reading.timestamp is None else reading.timestamp
+        dbm = None if reading is None else reading.strength
+        self.buffer.append(timestamp, dbm, location_id)
+        if location_id >= 0:
+            with self._stats_lock:
+                self._stats[location_id].add(dbm)
+        return reading
+
+    def series(self):
+        """``(timestamps, dbm)`` arrays for every buffered sample, oldest first."""
+        timestamps, dbm, _ = self.buffer.snapshot()
+        return timestamps, dbm
+
+    def summary(self, location):
+        """Summary of every sample taken at ``location``."""
+        with self._stats_lock:
+            location_id = self._location_ids.get(location)
+            return summarize(RunningStats(SUMMARY_QUANTILES) if location_id is None else self._stats[location_id])
+
+    def summaries(self):
+        """:func:`summarize` result for every location seen so far."""
+        with self._stats_lock:
+            return {name: summarize(self._stats[location_id]) for name, location_id in self._location_ids.items()}
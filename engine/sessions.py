@@ -0,0 +1,228 @@
+"""Resumable survey sessions kept as small JSON checkpoints.
+
+Each session owns a readings database ``<id>.db`` and a checkpoint
+``<id>.json`` in the sessions directory. The checkpoint holds the plan
+(floors and points per floor), per-floor progress, which phones were
+used (network serial -> USB serial) and the store offset: the newest
+row id the progress accounts for. It is rewritten atomically after every
+completed point, so a browser refresh, an app restart or a crash loses at
+most the point in flight. Resuming reads the checkpoint and only the
+readings saved after its offset, never the whole survey.
+"""
+import json
+import os
+import re
+import time
+
+from engine.timing import span
+
+CHECKPOINT_VERSION = 1
+
+
+class SessionError(Exception):
+    """A session could not be found, read or merged."""
+
+
+def _slug(name):
+    return re.sub(r"[^a-z0-9]+", "-", name.lower()).strip("-")[:40] or "survey"
+
+
+class SurveySession:
+    """Plan, progress and device bindings of one survey, saved in ``directory``."""
+
+    def __init__(self, directory, session_id, name, floors=1, points_per_floor=1):
+        self.directory = directory
+        self.id = session_id
+        self.name = name
+        self.floors = floors
+        self.points_per_floor = points_per_floor
+        self.created = time.time()
+        self.updated = self.created
+        # floor (as a string, like JSON keys) -> {location: completed tests}
+        self.progress = {}
+        self.completed_floors = set()
+        self.devices = {}
+        self.last_id = 0
+        self.merged_from = []
+
+    @property
+    def db_path(self):
+        return os.path.join(self.directory, f"{self.id}.db")
+
+    @property
+    def checkpoint_path(self):
+        return os.path.join(self.directory, f"{self.id}.json")
+
+    def tests(self, floor=None):
+        """Completed tests on ``floor``, or in the whole session."""
+        floors = self.progress.values() if floor is None else [self.progress.get(str(floor), {})]
+        return sum(sum(locations.values()) for locations in floors)
+
+    def location_tests(self, floor, location):
+        return self.progress.get(str(floor), {}).get(location, 0)
+
+    def record(self, floor, location, last_id=None):
+        """Count one completed test at ``location`` (``last_id``: newest stored row after it)."""
+        locations = self.progress.setdefault(str(floor), {})
+        locations[location] = locations.get(location, 0) + 1
+        if last_id is not None:
+            self.last_id = max(self.last_id, last_id)
+
+    def complete_floor(self, floor):
+        self.completed_floors.add(int(floor))
+
+    def bind_device(self, device_id, usb_serial=None):
+        """Remember that ``device_id`` (usually ``ip:port``) was used, and which USB serial it came from."""
+        self.devices[device_id] = usb_serial or self.devices.get(device_id)
+
+    def reset(self):
+        """Forget all progress (after the session's readings were deleted)."""
+        self.progress.clear()
+        self.completed_floors.clear()
+        self.last_id = 0
+
+    def catch_up(self, store):
+        """Count readings saved after the checkpoint (e.g. just before a crash); returns how many.
+
+        Every device of a point saves its own row, so rows of the same point
+        share one floor/location and only count once.
+        """
+        found = 0
+        for rows in store.scan(("floor", "location"), after_id=self.last_id):
+            previous = None
+            for row in rows:
+                point = (row["floor"], row["location"])
+                if point != previous:
+                    self.record(row["floor"], row["location"])
+                    found += 1
+                previous = point
+            self.last_id = rows[-1]["id"]
+        return found
+
+    def to_dict(self):
+        return {
+            "version": CHECKPOINT_VERSION,
+            "id": self.id,
+            "name": self.name,
+            "created": self.created,
+            "updated": self.updated,
+            "plan": {"floors": self.floors, "points_per_floor": self.points_per_floor},
+            "progress": self.progress,
+            "completed_floors": sorted(self.completed_floors),
+            "devices": self.devices,
+            "last_id": self.last_id,
+            "merged_from": self.merged_from,
+        }
+
+    @classmethod
+    def from_dict(cls, directory, data):
+        if data.get("version") != CHECKPOINT_VERSION:
+            raise SessionError(f"Unsupported checkpoint version {data.get('version')!r}")
+        session = cls(directory, data["id"], data["name"], data["plan"]["floors"], data["plan"]["points_per_floor"])
+        session.created = data["created"]
+        session.updated = data["updated"]
+        session.progress = {floor: dict(locations) for floor, locations in data["progress"].items()}
+        session.completed_floors = set(data["completed_floors"])
+        session.devices = dict(data["devices"])
+        session.last_id = data["last_id"]
+        session.merged_from = list(data.get("merged_from", []))
+        return session
+
+    def save(self):
+        """Write the checkpoint to a temporary file and move it into place."""
+        self.updated = time.time()
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, separators=(",", ":"))
+        os.replace(tmp_path, self.checkpoint_path)
+        return self
+
+    def title(self):
+        """Name and start time; unlike :meth:`label` it never changes."""
+        return f"{self.name} ({time.strftime('%Y-%m-%d %H:%M', time.localtime(self.created))})"
+
+    def label(self):
+        """One-line description with progress, for listings."""
+        updated = time.strftime("%Y-%m-%d %H:%M", time.localtime(self.updated))
+        return f"{self.name} · {self.tests()} point(s) on {len(self.progress)} floor(s) · updated {updated}"
+
+
+def create_session(directory, name, floors=1, points_per_floor=1):
+    """Start a new session and write its first checkpoint."""
+    session_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{_slug(name)}"
+    if os.path.exists(os.path.join(directory, f"{session_id}.json")):
+        raise SessionError(f"Session {session_id} already exists")
+    return SurveySession(directory, session_id, name, floors, points_per_floor).save()
+
+
+def load_session(directory, session_id):
+    """Read the checkpoint of ``session_id``."""
+    path = os.path.join(directory, f"{session_id}.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            return SurveySession.from_dict(directory, json.load(f))
+    except FileNotFoundError:
+        raise SessionError(f"No session {session_id!r} in {directory}")
+    except (ValueError, KeyError, TypeError) as e:
+        raise SessionError(f"Unreadable checkpoint {path}: {e}")
+
+
+def list_sessions(directory):
+    """Every readable session in ``directory``, most recently updated first."""
+    if not os.path.isdir(directory):
+        return []
+    sessions = []
+    for name in os.listdir(directory):
+        if not name.endswith(".json"):
+            continue
+        try:
+            sessions.append(load_session(directory, name[:-5]))
+        except SessionError:
+            continue
+    return sorted(sessions, key=lambda session: session.updated, reverse=True)
+
+
+def find_session(directory, key):
+    """The session whose id or name is ``key`` (most recent on a name clash), or ``None``."""
+    for session in list_sessions(directory):
+        if key in (session.id, session.name):
+            return session
+    return None
+
+
+def merge_sessions(directory, sources, name):
+    """Combine ``sources`` into a new session; the sources are left untouched.
+
+    Readings are copied in source order, progress and device bindings are
+    added up and the plan grows to cover every source.
+    """
+    from engine.store import ReadingStore
+    if len(sources) < 2:
+        raise SessionError("Pick at least two sessions to merge")
+    merged = create_session(
+        directory, name,
+        floors=max(source.floors for source in sources),
+        points_per_floor=max(source.points_per_floor for source in sources),
+    )
+    target = ReadingStore(merged.db_path)
+    try:
+        with span("session.merge", sources=len(sources)):
+            for source in sources:
+                store = ReadingStore(source.db_path)
+                try:
+                    target.copy_from(store)
+                finally:
+                    store.close()
+                for floor, locations in source.progress.items():
+                    for location, tests in locations.items():
+                        merged_locations = merged.progress.setdefault(floor, {})
+                        merged_locations[location] = merged_locations.get(location, 0) + tests
+                merged.completed_floors |= source.completed_floors
+                for device_id, usb_serial in source.devices.items():
+                    merged.bind_device(device_id, usb_serial)
+                merged.merged_from.append(source.id)
+            merged.last_id = target.last_id()
+    finally:
+        target.close()
+    return merged.save()
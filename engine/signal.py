@@ -0,0 +1,104 @@
+"""Typed signal readings and their display formatting."""
+from collections import Counter
+from dataclasses import dataclass
+from statistics import median_low
+
+RAT_LABELS = {
+    "NR": "5G NR",
+    "LTE": "4G LTE",
+    "WCDMA": "3G WCDMA",
+    "GSM": "2G GSM",
+}
+
+
+# How each RAT's primary strength is shown, and the SignalReading field holding it
+STRENGTH_FIELDS = {
+    "NR": ("Signal Strength", "rsrp"),
+    "LTE": ("Signal Strength", "rsrp"),
+    "WCDMA": ("RSCP", "rscp"),
+    "GSM": ("RSSI", "rssi"),
+}
+_DEFAULT_STRENGTH = ("Signal Strength", "rsrp")
+
+
+@dataclass(frozen=True)
+class SignalReading:
+    """One cell signal measurement.
+
+    ``rsrp``, ``rsrq`` and ``sinr`` are only set for LTE and NR; WCDMA
+    reports ``rscp`` and ``ecno`` and GSM ``rssi`` instead, which are not
+    on the same scale and are kept apart. ``operator`` is the carrier name
+    the SIM is registered with, if known.
+    """
+    rat: str
+    rsrp: int = None
+    rsrq: int = None
+    sinr: int = None
+    level: int = 0
+    timestamp: float = None
+    operator: str = None
+    rscp: int = None
+    ecno: int = None
+    rssi: int = None
+
+    @property
+    def strength(self):
+        """The RAT's primary strength in dBm (see :data:`STRENGTH_FIELDS`), or ``None``."""
+        _, field = STRENGTH_FIELDS.get(self.rat, _DEFAULT_STRENGTH)
+        return getattr(self, field)
+
+
+def level_bars(level):
+    """Returns a visual representation of signal strength using bars."""
+    bars = [
+        "🔴 ▁ |",
+        "🟠 ▃ ||",
+        "🟡 ▆ |||",
+        "🟢 █ ||||"
+    ]
+    try:
+        level = int(level)
+    except (ValueError, TypeError):
+        level = 0
+    return bars[max(0, min(level, len(bars)-1))]
+
+
+def format_signal(reading):
+    """Render a reading the way the result box shows it."""
+    label = RAT_LABELS.get(reading.rat, reading.rat)
+    name, _ = STRENGTH_FIELDS.get(reading.rat, _DEFAULT_STRENGTH)
+    strength = "N/A" if reading.strength is None else reading.strength
+    text = f"{label} | {name}: {strength} dBm | Level: {level_bars(reading.level)}"
+    if reading.operator:
+        text = f"{reading.operator} | {text}"
+    return text
+
+
+def combine_readings(readings):
+    """Collapse a burst of readings into one, using the most common RAT.
+
+    Each metric is the (low) median of the samples that reported it, so a
+    single outlier during a load test does not skew the stored value.
+    """
+    if not readings:
+        return None
+    rats = Counter(reading.rat for reading in readings)
+    rat = rats.most_common(1)[0][0]
+    same_rat = [reading for reading in readings if reading.rat == rat]
+
+    def median(field):
+        values = [getattr(reading, field) for reading in same_rat if getattr(reading, field) is not None]
+        return median_low(values) if values else None
+
+    return SignalReading(
+        rat=rat,
+        rsrp=median("rsrp"),
+        rsrq=median("rsrq"),
+        sinr=median("sinr"),
+        level=median("level") or 0,
+        timestamp=same_rat[0].timestamp,
+        operator=same_rat[0].operator,
+        rscp=median("rscp"),
+        ecno=median("ecno"),
+        rssi=median("rssi"),
+    )
@@ -0,0 +1,270 @@
+"""Floor-plan positions, a grid spatial index and incremental IDW coverage maps.
+
+Positions are fractions of the floor plan (``x`` left to right, ``y`` top
+to bottom, both 0..1), so they stay valid whatever resolution the plan
+image is uploaded at.
+
+:class:`IdwHeatmap` keeps the inverse-distance-weighting numerator and
+denominator over a NumPy grid. Because IDW is a ratio of two sums over the
+samples, adding a reading only adds its weighted contribution to both
+grids. A new point costs one vectorized pass over the grid (or over the
+cells inside ``radius``), not a full recompute. :class:`HeatmapCache` feeds
+each floor's map the readings saved since it was last asked.
+"""
+import os
+import threading
+from math import floor, hypot
+
+from engine.timing import span
+
+DEFAULT_COLUMNS = 160
+DEFAULT_POWER = 2.0
+PLAN_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+
+class GridIndex:
+    """Uniform-grid spatial hash of ``(x, y, item)`` points."""
+
+    def __init__(self, cell_size=0.05):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _cell(self, x, y):
+        return floor(x / self.cell_size), floor(y / self.cell_size)
+
+    def insert(self, x, y, item=None):
+        self._cells.setdefault(self._cell(x, y), []).append((x, y, item))
+        self._count += 1
+
+    def points(self):
+        """Every stored ``(x, y, item)``."""
+        return [point for cell in self._cells.values() for point in cell]
+
+    def query(self, x, y, radius):
+        """Points within ``radius`` of ``(x, y)``, nearest first, as ``(distance, (x, y, item))``."""
+        reach = int(radius // self.cell_size) + 1
+        cx, cy = self._cell(x, y)
+        found = []
+        for i in range(cx - reach, cx + reach + 1):
+            for j in range(cy - reach, cy + reach + 1):
+                for point in self._cells.get((i, j), ()):
+                    distance = hypot(point[0] - x, point[1] - y)
+                    if distance <= radius:
+                        found.append((distance, point))
+        found.sort(key=lambda hit: hit[0])
+        return found
+
+    def nearest(self, x, y):
+        """Closest point as ``(distance, (x, y, item))``, or ``None`` when empty."""
+        if not self._count:
+            return None
+        cx, cy = self._cell(x, y)
+        best = None
+        ring = 0
+        while True:
+            for i in range(cx - ring, cx + ring + 1):
+                for j in range(cy - ring, cy + ring + 1):
+                    if max(abs(i - cx), abs(j - cy)) != ring:
+                        continue
+                    for point in self._cells.get((i, j), ()):
+                        distance = hypot(point[0] - x, point[1] - y)
+                        if best is None or distance < best[0]:
+                            best = (distance, point)
+            # Anything in a farther ring is at least ``ring * cell_size`` away.
+            if best is not None and best[0] <= ring * self.cell_size:
+                return best
+            ring += 1
+            if best is not None and ring * self.cell_size > 2 + self.cell_size:
+                return best
+
+
+class IdwHeatmap:
+    """Inverse-distance-weighted surface over a ``rows`` x ``columns`` grid.
+
+    ``aspect`` is the plan's height / width, so grid cells stay square.
+    With ``radius`` set, a reading only influences cells within that
+    distance (and only those cells are touched when it is added).
+    """
+
+    def __init__(self, columns=DEFAULT_COLUMNS, aspect=1.0, power=DEFAULT_POWER, radius=None):
+        import numpy as np
+        self.columns = columns
+        self.rows = max(1, round(columns * aspect))
+        self.aspect = aspect
+        self.power = power
+        self.radius = radius
+        self.xs = (np.arange(self.columns) + 0.5) / self.columns
+        self.ys = (np.arange(self.rows) + 0.5) / self.rows
+        self._numerator = np.zeros((self.rows, self.columns))
+        self._denominator = np.zeros((self.rows, self.columns))
+        self._nearest = np.full((self.rows, self.columns), np.inf)
+        # A reading sits inside a cell, never on its centre; this keeps its weight finite.
+        self._min_distance = 0.5 / self.columns
+        self.index = GridIndex(cell_size=radius or 0.05)
+        self.count = 0
+        self.last_id = 0
+        self.low = None
+        self.high = None
+
+    def _window(self, x0, y0, x1, y1):
+        """Grid slices a reading box ``(x0, y0)``-``(x1, y1)`` can influence."""
+        if self.radius is None:
+            return slice(None), slice(None)
+        return (
+            slice(max(0, int((y0 - self.radius) * self.rows)), min(self.rows, int((y1 + self.radius) * self.rows) + 1)),
+            slice(max(0, int((x0 - self.radius) * self.columns)), min(self.columns, int((x1 + self.radius) * self.columns) + 1)),
+        )
+
+    def _fold(self, xs, ys, values):
+        """Add the contribution of readings at ``xs``/``ys`` (arrays) to every cell."""
+        import numpy as np
+        rows, columns = self._window(xs.min(), ys.min(), xs.max(), ys.max())
+        # (points, rows, columns) squared distances; weights follow without a sqrt for p = 2
+        squared = (self.ys[None, rows, None] - ys[:, None, None]) ** 2 + (self.xs[None, None, columns] - xs[:, None, None]) ** 2
+        np.maximum(squared, self._min_distance ** 2, out=squared)
+        weight = 1.0 / squared if self.power == 2 else squared ** (-self.power / 2)
+        if self.radius is not None:
+            weight[squared > self.radius ** 2] = 0.0
+        self._numerator[rows, columns] += np.einsum("p,prc->rc", values, weight)
+        self._denominator[rows, columns] += weight.sum(axis=0)
+        np.minimum(self._nearest[rows, columns], np.sqrt(squared.min(axis=0)), out=self._nearest[rows, columns])
+
+    def add(self, x, y, value, item=None):
+        """Fold one reading into the surface."""
+        self.add_many([x], [y], [value], [item])
+
+    def add_many(self, xs, ys, values, items=None, chunk=32):
+        """Fold several readings in, ``chunk`` at a time to bound the scratch arrays."""
+        import numpy as np
+        xs, ys, values = (np.asarray(a, dtype=np.float64) for a in (xs, ys, values))
+        if not len(values):
+            return
+        for start in range(0, len(values), chunk):
+            part = slice(start, start + chunk)
+            self._fold(xs[part], ys[part], values[part])
+        items = items if items is not None else values.tolist()
+        for x, y, item in zip(xs.tolist(), ys.tolist(), items):
+            self.index.insert(x, y, item)
+        self.count += len(values)
+        self.low = min(values.min(), self.low if self.low is not None else np.inf)
+        self.high = max(values.max(), self.high if self.high is not None else -np.inf)
+
+    def add_rows(self, rows):
+        """Add ``(id, x, y, value)`` rows, as returned by ``ReadingStore.read_points``."""
+        if not rows:
+            return
+        ids, xs, ys, values = zip(*rows)
+        self.add_many(xs, ys, values, items=list(ids))
+        self.last_id = max(self.last_id, max(ids))
+
+    def surface(self, max_gap=None):
+        """Interpolated grid (``rows`` x ``columns``); cells with no estimate are NaN.
+
+        Cells farther than ``max_gap`` from every reading are also NaN, so
+        unmeasured parts of the floor show up as coverage gaps.
+        """
+        import numpy as np
+        with np.errstate(invalid="ignore", divide="ignore"):
+            grid = self._numerator / self._denominator
+        if max_gap is not None:
+            grid[self._nearest > max_gap] = np.nan
+        return grid
+
+    def gap_fraction(self, max_gap):
+        """Share of the floor farther than ``max_gap`` from every reading."""
+        return float((self._nearest > max_gap).mean())
+
+
+class HeatmapCache:
+    """One :class:`IdwHeatmap` per (floor, metric), topped up from the store on demand.
+
+    Maps and point counts remember the store generation they were read at,
+    so asking again before anything new is saved does not query the store.
+    """
+
+    def __init__(self, store, columns=DEFAULT_COLUMNS, power=DEFAULT_POWER, radius=None):
+        self.store = store
+        self.columns = columns
+        self.power = power
+        self.radius = radius
+        self._maps = {}
+        self._synced = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def count(self, floor, metric):
+        """Number of positioned readings of ``floor`` that have ``metric``."""
+        with self._lock:
+            key = (int(floor), metric)
+            # Read the generation first; a save in between only costs one more query
+            generation = self.store.generation
+            cached = self._counts.get(key)
+            if cached is None or cached[0] != generation:
+                cached = self._counts[key] = (generation, self.store.count_points(floor, metric))
+            return cached[1]
+
+    def get(self, floor, metric, aspect=1.0):
+        """The heatmap for ``floor`` including every reading saved so far."""
+        with self._lock:
+            key = (int(floor), metric)
+            generation = self.store.generation
+            heatmap = self._maps.get(key)
+            if heatmap is not None and heatmap.aspect == aspect and self._synced.get(key) == generation:
+                return heatmap
+            if heatmap is not None and (
+                heatmap.aspect != aspect or self.store.count_points(floor, metric, heatmap.last_id) != heatmap.count
+            ):
+                # A new plan shape or a data reset invalidates the sums.
+                heatmap = None
+            if heatmap is None:
+                heatmap = self._maps[key] = IdwHeatmap(self.columns, aspect, self.power, self.radius)
+            rows = self.store.read_points(floor, metric, heatmap.last_id)
+            if rows:
+                with span("heatmap.update", floor=floor, points=len(rows)):
+                    heatmap.add_rows(rows)
+            self._synced[key] = generation
+            return heatmap
+
+    def clear(self):
+        with self._lock:
+            self._maps.clear()
+            self._synced.clear()
+            self._counts.clear()
+
+
+def floor_plan_path(directory, floor):
+    """Path of the uploaded plan for ``floor``, or ``None``."""
+    for extension in PLAN_EXTENSIONS:
+        path = os.path.join(directory, f"floor_{int(floor)}{extension}")
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def save_floor_plan(directory, floor, data, filename):
+    """Store an uploaded plan image for ``floor``, replacing any previous one."""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in PLAN_EXTENSIONS:
+        raise ValueError(f"Floor plans must be one of {', '.join(PLAN_EXTENSIONS)}")
+    os.makedirs(directory, exist_ok=True)
+    previous = floor_plan_path(directory, floor)
+    if previous is not None:
+        os.remove(previous)
+    path = os.path.join(directory, f"floor_{int(floor)}{extension}")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def plan_aspect(path):
+    """Height / width of a plan image (1.0 without a plan)."""
+    if path is None:
+        return 1.0
+    from PIL import Image
+    with Image.open(path) as image:
+        width, height = image.size
+    return round(height / width, 3)
@@ -0,0 +1,440 @@
+"""Append-only SQLite store for network readings.
+
+Every reading is a single INSERT into a WAL-journaled database, so saving a
+point costs the same no matter how many readings already exist and a crash
+mid-write can never take earlier readings with it. Spreadsheets and other
+exports are produced from the store on demand by :mod:`engine.export`.
+
+All writes go through one writer thread that commits whatever is queued in
+a single transaction, so several device workers saving at once share a
+commit instead of queueing on a lock. Reads use their own connection and,
+thanks to WAL, never wait for the writer. Rows another process appends
+(the CLI adding to a session the app has open) are picked up by the
+writer before its next commit, or as soon as :attr:`ReadingStore.generation`
+is read, and handed to subscribers like this handle's own.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+# Display names used by the UI and the exports, in column order.
+COLUMNS = [
+    "Timestamp", "Floor", "Location", "X", "Y", "Device", "Carrier", "Network",
+    "Signal Strength (dBm)", "RSRQ (dB)", "SINR (dB)", "RSCP (dBm)", "EcNo (dB)", "RSSI (dBm)", "Level",
+    "Download Speed (Mbps)", "Upload Speed (Mbps)",
+    "Download CI Low (Mbps)", "Download CI High (Mbps)", "Upload CI Low (Mbps)", "Upload CI High (Mbps)"
+]
+# Per-stage timings of the test that produced a reading, as JSON text.
+TIMINGS_COLUMN = "Timings"
+# Columns a coverage map can be drawn from, by display name.
+POINT_METRICS = {
+    "Signal Strength (dBm)": "rsrp",
+    "Download Speed (Mbps)": "download_mbps",
+    "Upload Speed (Mbps)": "upload_mbps",
+}
+
+SCHEMA_VERSION = 7
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    recorded_at REAL NOT NULL,
+    floor INTEGER NOT NULL,
+    location TEXT NOT NULL,
+    rat TEXT,
+    rsrp INTEGER,
+    rsrq INTEGER,
+    sinr INTEGER,
+    level INTEGER,
+    download_mbps REAL,
+    upload_mbps REAL,
+    device TEXT,
+    carrier TEXT,
+    timings TEXT,
+    x REAL,
+    y REAL,
+    download_low REAL,
+    download_high REAL,
+    upload_low REAL,
+    upload_high REAL,
+    rscp INTEGER,
+    ecno INTEGER,
+    rssi INTEGER
+)
+"""
+
+# Statements that bring an older layout up to the next version.
+_MIGRATIONS = {
+    2: ["ALTER TABLE readings ADD COLUMN device TEXT", "ALTER TABLE readings ADD COLUMN carrier TEXT"],
+    3: ["ALTER TABLE readings ADD COLUMN timings TEXT"],
+    4: ["ALTER TABLE readings ADD COLUMN x REAL", "ALTER TABLE readings ADD COLUMN y REAL"],
+    5: [f"ALTER TABLE readings ADD COLUMN {column} REAL" for column in ("download_low", "download_high", "upload_low", "upload_high")],
+    # WCDMA RSCP/EcNo and GSM RSSI used to be stored as RSRP/RSRQ
+    6: [f"ALTER TABLE readings ADD COLUMN {column} INTEGER" for column in ("rscp", "ecno", "rssi")] + [
+        "UPDATE readings SET rscp = rsrp, ecno = rsrq, rsrp = NULL, rsrq = NULL WHERE rat = 'WCDMA'",
+        "UPDATE readings SET rssi = rsrp, rsrp = NULL, rsrq = NULL WHERE rat = 'GSM'",
+    ],
+}
+
+_SELECT_COLUMNS = """
+       recorded_at AS "Timestamp", floor AS "Floor", location AS "Location", x AS "X", y AS "Y",
+       device AS "Device", carrier AS "Carrier",
+       rat AS "Network", rsrp AS "Signal Strength (dBm)", rsrq AS "RSRQ (dB)",
+       sinr AS "SINR (dB)", rscp AS "RSCP (dBm)", ecno AS "EcNo (dB)", rssi AS "RSSI (dBm)", level AS "Level",
+       download_mbps AS "Download Speed (Mbps)", upload_mbps AS "Upload Speed (Mbps)",
+       download_low AS "Download CI Low (Mbps)", download_high AS "Download CI High (Mbps)",
+       upload_low AS "Upload CI Low (Mbps)", upload_high AS "Upload CI High (Mbps)",
+       timings AS "Timings"
+"""
+_SELECT = f"SELECT {_SELECT_COLUMNS} FROM readings"
+
+_INSERT_FIELDS = (
+    "recorded_at", "rat", "rsrp", "rsrq", "sinr", "level", "carrier",
+    "floor", "location", "download_mbps", "upload_mbps", "device", "timings", "x", "y",
+    "download_low", "download_high", "upload_low", "upload_high", "rscp", "ecno", "rssi",
+)
+_INSERT = (
+    f"INSERT INTO readings ({', '.join(_INSERT_FIELDS)}) "
+    f"VALUES ({', '.join('?' * len(_INSERT_FIELDS))})"
+)
+_CLEAR = "DELETE FROM readings"
+_MAX_ID = "SELECT COALESCE(MAX(id), 0) FROM readings"
+# Queued to make the writer pick up rows appended by other processes
+_SYNC = "SYNC"
+
+_STOP = object()
+
+
+class ReadingStore:
+    """Thread-safe handle on the readings database."""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._read_lock = threading.Lock()
+        self._read_conn = None
+        self._writer_lock = threading.Lock()
+        self._writer = None
+        self._queue = queue.Queue()
+        # Bumped on every change so readers can tell, without reading the
+        # readings, whether anything changed since they last looked.
+        self._generation = 0
+        # Highest row id this handle has told its subscribers about
+        self._known_id = 0
+        self._data_version = None
+        self._listeners = []
+        self.listener_error = None
+
+    def _connect(self):
+        directory = os.path.dirname(self.db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        # WAL keeps committed readings intact if the process dies mid-insert.
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    def _migrate(self, conn):
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version < SCHEMA_VERSION and _has_table(conn, "readings"):
+            steps = range(version, SCHEMA_VERSION)
+            if all(step in _MIGRATIONS for step in steps):
+                for step in steps:
+                    for statement in _MIGRATIONS[step]:
+                        conn.execute(statement)
+            else:
+                # Older layouts cannot be typed reliably, so they are set
+                # aside rather than converted.
+                conn.execute(f"ALTER TABLE readings RENAME TO readings_v{version}")
+        conn.execute(_SCHEMA)
+        conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None or not self._writer.is_alive():
+                conn = self._connect()
+                self._migrate(conn)
+                self._known_id = max(self._known_id, conn.execute(_MAX_ID).fetchone()[0])
+                self._writer = threading.Thread(target=self._write_loop, args=(conn,), name="reading-store-writer", daemon=True)
+                self._writer.start()
+
+    def _write_loop(self, conn):
+        while True:
+            batch = [self._queue.get()]
+            # Everything already waiting goes into the same transaction.
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(item is _STOP for item in batch)
+            batch = [item for item in batch if item is not _STOP]
+            if batch:
+                self._commit(conn, batch)
+            if stop:
+                conn.close()
+                return
+
+    def _commit(self, conn, batch):
+        results = []
+        try:
+            # IMMEDIATE takes the write lock up front, so rows other processes
+            # appended are read, and come before ours, with nothing in between.
+            conn.execute("BEGIN IMMEDIATE")
+            events = [
+                dict(zip(("id",) + _INSERT_FIELDS, row)) for row in conn.execute(
+                    f"SELECT id, {', '.join(_INSERT_FIELDS)} FROM readings WHERE id > ? ORDER BY id", (self._known_id,)
+                )
+            ]
+            for sql, params, _ in batch:
+                if sql is _SYNC:
+                    results.append(None)
+                    continue
+                results.append(conn.execute(sql, params).lastrowid)
+                events.append({"id": results[-1], **dict(zip(_INSERT_FIELDS, params))} if sql is _INSERT else None)
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+        self._known_id = max([self._known_id] + [event["id"] for event in events if event is not None])
+        # Subscribers see the rows before the generation moves, so anyone who
+        # sees the new generation also sees them reflected in derived state.
+        if events:
+            self._notify(events)
+            self._generation += 1
+        for (_, _, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _notify(self, events):
+        """Tell subscribers about committed rows (``None`` for a clear) before anyone waiting on them wakes up."""
+        for listener in list(self._listeners):
+            try:
+                for row in events:
+                    if row is None:
+                        listener.cleared()
+                    else:
+                        listener.reading(row)
+            except Exception as e:
+                # A broken subscriber must not stop readings being saved.
+                self.listener_error = e
+
+    @property
+    def generation(self):
+        """Counter that moves on whenever the readings change.
+
+        Writes through this handle bump it as they commit. Rows appended by
+        another process are noticed through ``PRAGMA data_version``, which
+        only consults the WAL index, and handed to subscribers by the writer
+        before the new value is returned.
+        """
+        with self._read_lock:
+            conn = self._reader()
+            version = conn.execute("PRAGMA data_version").fetchone()[0]
+            appended = False
+            if version != self._data_version:
+                self._data_version = version
+                appended = conn.execute(_MAX_ID).fetchone()[0] > self._known_id
+        # Subscribers reading the generation run on the writer, which catches up before every commit anyway
+        if appended and threading.current_thread() is not self._writer:
+            self._submit(_SYNC).result()
+        return self._generation
+
+    def subscribe(self, listener):
+        """Call ``listener.reading(row)`` for every committed reading and ``listener.cleared()`` after :meth:`clear`.
+
+        ``row`` maps store column names (plus ``id``) to the inserted values.
+        Listeners run on the writer thread, so they must be quick.
+        """
+        self._listeners.append(listener)
+
+    def unsubscribe(self, listener):
+        self._listeners.remove(listener)
+
+    def _submit(self, sql, params=()):
+        self._ensure_writer()
+        future = Future()
+        self._queue.put((sql, params, future))
+        return future
+
+    def _reader(self):
+        if self._read_conn is None:
+            self._ensure_writer()
+            self._read_conn = self._connect()
+        return self._read_conn
+
+    def submit(self, floor, location, signal, download_mbps, upload_mbps, device=None, timings=None, position=None, bounds=None):
+        """Queue one reading and return a ``Future`` resolving to its row id.
+
+        ``timings`` is an optional dict of stage durations stored as JSON,
+        ``position`` an optional ``(x, y)`` on the floor plan, each 0..1, and
+        ``bounds`` optional confidence bounds ``{"download": (low, high),
+        "upload": (low, high)}`` of the speeds.
+        """
+        if signal is None:
+            values = (time.time(), None, None, None, None, None, None)
+            extra = (None, None, None)
+        else:
+            recorded_at = time.time() if signal.timestamp is None else signal.timestamp
+            values = (recorded_at, signal.rat, signal.rsrp, signal.rsrq, signal.sinr, signal.level, signal.operator)
+            extra = (signal.rscp, signal.ecno, signal.rssi)
+        timings = json.dumps(timings) if timings else None
+        x, y = position if position is not None else (None, None)
+        bounds = bounds or {}
+        download_low, download_high = bounds.get("download") or (None, None)
+        upload_low, upload_high = bounds.get("upload") or (None, None)
+        return self._submit(_INSERT, values + (
+            int(floor), location, download_mbps, upload_mbps, device, timings, x, y,
+            download_low, download_high, upload_low, upload_high,
+        ) + extra)
+
+    def append(self, floor, location, signal, download_mbps, upload_mbps, device=None, timings=None, position=None, bounds=None):
+        """Insert one reading, wait for it to be committed and return its row id.
+
+        ``signal`` is an :class:`engine.signal.SignalReading` or ``None`` when
+        no serving cell could be read; its timestamp becomes the reading's.
+        """
+        return self.submit(floor, location, signal, download_mbps, upload_mbps, device, timings, position, bounds).result()
+
+    def count(self, floor=None):
+        """Number of stored readings, optionally for a single floor."""
+        with self._read_lock:
+            if floor is None:
+                row = self._reader().execute("SELECT COUNT(*) FROM readings").fetchone()
+            else:
+                row = self._reader().execute(
+                    "SELECT COUNT(*) FROM readings WHERE floor = ?", (int(floor),)
+                ).fetchone()
+        return row[0]
+
+    def read_points(self, floor, metric, after_id=0):
+        """Positioned readings of ``floor`` as ``(id, x, y, value)`` rows, oldest first.
+
+        ``metric`` is a key of :data:`POINT_METRICS`; only rows newer than
+        ``after_id`` are returned so callers can pick up where they left off.
+        """
+        column = POINT_METRICS[metric]
+        with self._read_lock:
+            return self._reader().execute(
+                f"SELECT id, x, y, {column} FROM readings "
+                f"WHERE floor = ? AND id > ? AND x IS NOT NULL AND y IS NOT NULL AND {column} IS NOT NULL ORDER BY id",
+                (int(floor), int(after_id))
+            ).fetchall()
+
+    def count_points(self, floor, metric, max_id=None):
+        """Number of positioned readings of ``floor`` that have ``metric`` (up to row ``max_id``)."""
+        column = POINT_METRICS[metric]
+        query = f"SELECT COUNT(*) FROM readings WHERE floor = ? AND x IS NOT NULL AND y IS NOT NULL AND {column} IS NOT NULL"
+        params = (int(floor),)
+        if max_id is not None:
+            query += " AND id <= ?"
+            params += (int(max_id),)
+        with self._read_lock:
+            return self._reader().execute(query, params).fetchone()[0]
+
+    def scan(self, columns, after_id=0, chunk=10_000):
+        """Yield lists of row dicts (``id`` plus ``columns``), ``chunk`` rows at a time, oldest first.
+
+        The read lock is only held per chunk, so a long scan does not stall
+        other readers.
+        """
+        query = f"SELECT id, {', '.join(columns)} FROM readings WHERE id > ? ORDER BY id LIMIT ?"
+        keys = ("id",) + tuple(columns)
+        while True:
+            with self._read_lock:
+                rows = self._reader().execute(query, (int(after_id), chunk)).fetchall()
+            if not rows:
+                return
+            yield [dict(zip(keys, row)) for row in rows]
+            after_id = rows[-1][0]
+
+    def floors(self):
+        """Floors that have readings, ascending."""
+        with self._read_lock:
+            return [row[0] for row in self._reader().execute("SELECT DISTINCT floor FROM readings ORDER BY floor")]
+
+    def last_id(self):
+        """Row id of the newest reading (0 when empty)."""
+        with self._read_lock:
+            return self._reader().execute(_MAX_ID).fetchone()[0]
+
+    def iter_frames(self, floor=None, chunk=20_000, max_id=None):
+        """Yield the readings as DataFrames of up to ``chunk`` rows, oldest first.
+
+        Like :meth:`read_frame` but never holds more than one chunk, and the
+        read lock only while a chunk is fetched. Rows newer than ``max_id``
+        are left out so a long export sees a fixed set of readings.
+        """
+        import pandas as pd
+        query = f'SELECT id AS "_id", {_SELECT_COLUMNS} FROM readings WHERE id > ?'
+        params = ()
+        if floor is not None:
+            query += " AND floor = ?"
+            params += (int(floor),)
+        if max_id is not None:
+            query += " AND id <= ?"
+            params += (int(max_id),)
+        query += " ORDER BY id LIMIT ?"
+        after_id = 0
+        while True:
+            with self._read_lock:
+                df = pd.read_sql_query(query, self._reader(), params=(after_id,) + params + (chunk,))
+            if df.empty:
+                return
+            after_id = int(df["_id"].iloc[-1])
+            df = df.drop(columns="_id")
+            df["Timestamp"] = pd.to_datetime(df["Timestamp"], unit="s")
+            yield df
+
+    def read_frame(self, floor=None):
+        """Return readings as a DataFrame with the display column names."""
+        import pandas as pd
+        query = _SELECT
+        params = ()
+        if floor is not None:
+            query += " WHERE floor = ?"
+            params = (int(floor),)
+        query += " ORDER BY id"
+        with self._read_lock:
+            df = pd.read_sql_query(query, self._reader(), params=params)
+        df["Timestamp"] = pd.to_datetime(df["Timestamp"], unit="s")
+        return df
+
+    def copy_from(self, other, chunk=10_000):
+        """Append every reading of store ``other`` (in its order); returns the number copied."""
+        copied = 0
+        future = None
+        for rows in other.scan(_INSERT_FIELDS, chunk=chunk):
+            for row in rows:
+                future = self._submit(_INSERT, tuple(row[field] for field in _INSERT_FIELDS))
+            copied += len(rows)
+        if future is not None:
+            future.result()
+        return copied
+
+    def clear(self):
+        """Delete every stored reading."""
+        self._submit(_CLEAR).result()
+
+    def close(self):
+        with self._writer_lock:
+            if self._writer is not None and self._writer.is_alive():
+                self._queue.put(_STOP)
+                self._writer.join()
+            self._writer = None
+        with self._read_lock:
+            if self._read_conn is not None:
+                self._read_conn.close()
+                self._read_conn = None
+
+
+def _has_table(conn, name):
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone()
+    return row is not None
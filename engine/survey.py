@@ -0,0 +1,240 @@
+"""Survey steps shared by the Streamlit app and the headless CLI.
+
+These are the device, signal, speed and save operations the app used to
+define inline, taking the ADB client, throughput backend and reading store
+as arguments instead of module globals. Results keep the app's
+``(value, message)`` shape; messages carry the same inline HTML the app
+renders, which :func:`plain_text` strips for terminal output.
+"""
+import re
+import threading
+import time
+
+from engine.adb import AdbError, get_session
+from engine.dumpsys import SIGNAL_COMMAND, parse_signal
+from engine.timing import span
+
+WIFI_ADB_PORT = 5555
+
+_TAGS = re.compile(r"<[^>]+>")
+
+
+def plain_text(message):
+    """Drop the HTML markup from a status message."""
+    return _TAGS.sub("", message or "")
+
+
+def get_adb_devices(client):
+    """Retrieve a list of connected ADB devices."""
+    try:
+        devices = [serial for serial, state in client.devices() if state == "device"]
+        return devices, None
+    except AdbError as e:
+        return [], f"❌ ADB command failed: {str(e)}"
+    except Exception as e:
+        return [], f"❌ Exception: {str(e)}"
+
+
+class DeviceWatcher:
+    """Polls ``adb devices`` on a background thread and caches the result.
+
+    Callers read :attr:`devices` / :attr:`error` without touching the ADB
+    server, so a slow or missing server never delays page rendering.
+    """
+
+    def __init__(self, client, interval=5.0):
+        self.client = client
+        self.interval = interval
+        self.devices = []
+        self.error = None
+        self.updated_at = None
+        self._wake = threading.Event()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="adb-device-watcher", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def refresh(self, timeout=None):
+        """Poll now; optionally wait up to ``timeout`` seconds for the new result."""
+        self._ready.clear()
+        self._wake.set()
+        if timeout:
+            self._ready.wait(timeout)
+
+    def wait(self, timeout=None):
+        """Block until the first poll has finished (or ``timeout`` passes)."""
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        while True:
+            self.devices, self.error = get_adb_devices(self.client)
+            self.updated_at = time.time()
+            self._ready.set()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+
+def find_wifi_ip(ip_output):
+    """IPv4 address of the Wi-Fi interface in ``ip -f inet addr show`` output."""
+    current_interface = ""
+    for line in ip_output.strip().splitlines():
+        if re.match(r"\d+:\s+\w+", line):
+            current_interface = line.split(":")[1].strip()
+        elif "inet " in line and ("wlan" in current_interface or "wifi" in current_interface):
+            match = re.search(r'inet (\d+\.\d+\.\d+\.\d+)/', line)
+            if match:
+                return match.group(1)
+    return None
+
+
+def establish_wifi_adb_connection(client, usb_device):
+    """Switch ``usb_device`` to Wi-Fi ADB.
+
+    Returns ``(device_id, message, hint)`` where ``device_id`` is the
+    network serial to test with, or ``None`` if the connection failed.
+    """
+    try:
+        if not usb_device:
+            return None, "No device selected.", "Please choose a device from the dropdown.</span>"
+
+        if ":" in usb_device:
+            # Already reachable over the network; nothing to switch
+            return usb_device, f"✅ <span style='color:green'>Using {usb_device} 📡</span>", ""
+
+        client.tcpip(usb_device, WIFI_ADB_PORT)
+        client.settle(2)
+
+        device_ip = find_wifi_ip(client.shell(usb_device, "ip -f inet addr show"))
+        if not device_ip:
+            return None, "❌ <span style='color:red'>Could not find valid Wi-Fi IP address.", "Ensure device is connected to Wi-Fi.</span>"
+
+        wireless_device_id = f"{device_ip}:{WIFI_ADB_PORT}"
+        connect_message = client.connect(wireless_device_id)
+        if "connected" in connect_message.lower():
+            return wireless_device_id, f"✅ <span style='color:green'>Connected to {wireless_device_id} 📡</span>", f"<span style='color:green'>You can detach your mobile phone 📱</span>"
+        return None, f"❌ <span style='color:red'>Failed to connect: {connect_message.strip()}", "Check ADB setup and firewall settings.</span>"
+    except AdbError as e:
+        return None, f"❌ <span style='color:red'>ADB command failed: {str(e)}", "ADB error occurred during connection attempt.</span>"
+    except Exception as e:
+        return None, f"❌ <span style='color:red'>Exception: {str(e)}", "Unexpected error during connection.</span>"
+
+
+def reconnect_wifi_device(client, device_id):
+    """``adb connect`` a Wi-Fi device used earlier (e.g. after the ADB server restarted).
+
+    Returns ``(connected, message)``.
+    """
+    try:
+        reply = client.connect(device_id)
+    except AdbError as e:
+        return False, f"❌ <span style='color:red'>Could not reconnect {device_id}: {str(e)}</span>"
+    if "connected" in reply.lower():
+        return True, f"✅ <span style='color:green'>Reconnected to {device_id} 📡</span>"
+    return False, f"❌ <span style='color:red'>Could not reconnect {device_id}: {reply.strip()}</span>"
+
+
+def get_signal_strength(client, device_id):
+    """Read the serving-cell signal of ``device_id`` as a ``SignalReading`` (or ``None``)."""
+    with span("adb.dumpsys", device=device_id):
+        output = get_session(client, device_id).run(SIGNAL_COMMAND)
+    with span("signal.parse", device=device_id):
+        return parse_signal(output)
+
+
+def make_signal_reader(client, device_id):
+    """Signal reader bound to ``device_id``, safe to call off the calling thread."""
+    return lambda: get_signal_strength(client, device_id)
+
+
+_SPEED_COLUMNS = {"download": "Download Speed (Mbps)", "upload": "Upload Speed (Mbps)"}
+
+
+def _saved_speed(store, floor, location, phase):
+    """Mean stored ``phase`` speed at ``location``, or ``None`` if it was never measured there."""
+    try:
+        df = store.read_frame(floor)
+        speeds = df.loc[df["Location"] == location, _SPEED_COLUMNS[phase]].dropna()
+        return round(float(speeds.mean()), 2) if not speeds.empty else None
+    except Exception:
+        return None
+
+
+def get_internet_speed(backend, store, floor, location, progress=None, cancel_event=None, policy=None):
+    """Measure internet speed, retrying a failed phase once before falling back to saved data.
+
+    ``progress(phase, **partial)`` is told about each phase as it starts and
+    setting ``cancel_event`` aborts the transfer in progress. With an
+    :class:`engine.adaptive.AdaptivePolicy` each transfer stops once its
+    rate has converged and the upload only runs when the policy asks for a
+    short one (otherwise it is ``None``).
+
+    Returns ``(download, upload, error, bounds)``; ``bounds`` maps each
+    adaptively measured phase to its ``(low, high)`` confidence bounds.
+    """
+    progress = progress or (lambda phase, **partial: None)
+    phases = policy.phases() if policy is not None else ("download", "upload")
+    speeds, bounds, errors = {}, {}, []
+    prepared = False
+    for phase in phases:
+        for attempt in range(2):
+            try:
+                if not prepared:
+                    progress("Selecting server")
+                    with span("speed.select_server", backend=backend.name, attempt=attempt):
+                        backend.prepare(cancel_event)
+                    prepared = True
+                progress(phase.capitalize(), **speeds)
+                monitor = policy.monitor(phase) if policy is not None else None
+                with span(f"speed.{phase}", backend=backend.name, attempt=attempt) as args:
+                    speed = getattr(backend, phase)(cancel_event, monitor)
+                    if monitor is not None and monitor.count:
+                        mean, low, high = monitor.estimate()
+                        args.update(samples=monitor.count, converged=monitor.converged)
+                        # A transfer that ended before settling is better summed up by its overall rate
+                        if monitor.converged:
+                            speed = mean
+                        if low is not None:
+                            bounds[phase] = (round(low, 2), round(high, 2))
+                speeds[phase] = round(speed, 2)
+                break
+            except Exception as e:
+                if cancel_event is not None and cancel_event.is_set():
+                    return None, None, None, {}
+                # The cached server may be the problem; pick a fresh one on retry
+                backend.invalidate()
+                prepared = False
+                if attempt == 1:
+                    speeds[phase] = _saved_speed(store, floor, location, phase)
+                    if speeds[phase] is not None:
+                        errors.append(f"⚠️ <span style='color:yellow'>{phase.capitalize()} failed: {str(e)}. Using saved data.</span>")
+                    else:
+                        speeds[phase] = 0
+                        errors.append(f"⚠️ <span style='color:yellow'>{phase.capitalize()} failed: {str(e)}. Using placeholder (0 Mbps).</span>")
+    return speeds.get("download"), speeds.get("upload"), "<br>".join(errors) or None, bounds
+
+
+def format_speed(speed, bounds=None):
+    """``95.2 Mbps (90.1–99.8)``, or ``N/A`` when the phase was not measured."""
+    if speed is None:
+        return "N/A"
+    if bounds:
+        return f"{speed} Mbps ({bounds[0]}–{bounds[1]})"
+    return f"{speed} Mbps"
+
+
+def save_reading(store, floor, location, signal, download_speed, upload_speed, device=None, timings=None, position=None, bounds=None):
+    """Append a single reading (and the timings of the test behind it) to the data store.
+
+    A ``None`` speed (a skipped upload) is stored as missing, not as 0 Mbps.
+    """
+    try:
+        with span("store.save", device=device):
+            store.append(
+                floor, location, signal, download_speed, upload_speed,
+                device=device, timings=timings, position=position, bounds=bounds
+            )
+        return True, f"✅ <span style='color:green'>Data saved for Floor {floor}{f' ({device})' if device else ''}.</span>"
+    except Exception as e:
+        return False, f"❌ <span style='color:red'>Error saving reading: {str(e)}</span>"
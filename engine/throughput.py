@@ -0,0 +1,377 @@
+"""Pluggable throughput backends for the per-point speed test.
+
+Every backend exposes the same three steps, ``prepare`` (pick a server),
+``download`` and ``upload`` (each returning Mbps), and honours a
+``threading.Event`` to abort. :class:`SpeedtestBackend` keeps the
+speedtest.net configuration and chosen server for a configurable TTL so
+points in the same building skip the config download and latency probing.
+
+``download`` and ``upload`` also take an optional
+:class:`engine.adaptive.RateMonitor`. The HTTP backend feeds it the rate of
+every interval and stops as soon as it has converged, and so does
+speedtest.net, whose bytes are counted as speedtest-cli's threads move
+them; iperf3 reports its per-interval rates after the run.
+"""
+import math
+import json
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+
+DEFAULT_SERVER_TTL = 30 * 60
+
+
+class ThroughputError(Exception):
+    """A backend could not complete a measurement."""
+
+
+class ThroughputBackend:
+    """Base class; subclasses implement :meth:`download` and :meth:`upload`."""
+
+    name = "base"
+
+    def prepare(self, cancel_event=None):
+        """Select or warm up the server before measuring."""
+
+    def invalidate(self):
+        """Forget any cached server so the next :meth:`prepare` selects again."""
+
+    def download(self, cancel_event=None, monitor=None):
+        raise NotImplementedError
+
+    def upload(self, cancel_event=None, monitor=None):
+        raise NotImplementedError
+
+
+class _RateTicker:
+    """Turns a running byte count into per-interval rates for a monitor."""
+
+    def __init__(self, monitor):
+        self.monitor = monitor
+        self.start = self._tick = time.perf_counter()
+        self._tick_bytes = 0
+
+    def update(self, total_bytes):
+        """Report progress; ``True`` once the monitor wants the transfer stopped."""
+        if self.monitor is None:
+            return False
+        now = time.perf_counter()
+        if now - self._tick < self.monitor.interval:
+            return False
+        mbps = (total_bytes - self._tick_bytes) * 8 / (now - self._tick) / 1_000_000
+        self._tick, self._tick_bytes = now, total_bytes
+        return self.monitor.add(mbps, now - self.start)
+
+
+class _ServerCache:
+    """speedtest.net config and best server, shared by every SpeedtestBackend."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def get(self, ttl):
+        with self._lock:
+            if self._entry is not None and time.monotonic() - self._entry[2] < ttl:
+                return self._entry[:2]
+            return None
+
+    def put(self, config, best):
+        with self._lock:
+            self._entry = (config, best, time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._entry = None
+
+
+_server_cache = _ServerCache()
+
+
+class _TransferProbe:
+    """Counts one speedtest-cli transfer's bytes and lets a monitor stop it.
+
+    Stands in for the client's opener and shutdown event: downloads are
+    counted as their chunks are read, uploads by the request bodies handed
+    out so far, and once :meth:`stop` is called (or ``cancel_event`` is set)
+    speedtest-cli's threads wind down and no further request is opened.
+    """
+
+    def __init__(self, opener, phase, cancel_event):
+        self._opener = opener
+        self._phase = phase
+        self._cancel_event = cancel_event
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._received = 0
+        self._bodies = []
+
+    def isSet(self):
+        return self._stopped.is_set() or (self._cancel_event is not None and self._cancel_event.is_set())
+
+    def stop(self):
+        self._stopped.set()
+
+    def open(self, request, *args, **kwargs):
+        if self.isSet():
+            # speedtest-cli's threads treat an IOError as the end of their request
+            raise urllib.error.URLError("transfer stopped")
+        if request.data is not None:
+            self._bodies.append(request.data)
+        return _CountedResponse(self._opener.open(request, *args, **kwargs), self)
+
+    def count(self, size):
+        with self._lock:
+            self._received += size
+
+    def total(self):
+        """Bytes moved so far in this transfer's direction."""
+        if self._phase == "upload":
+            return sum(sum(body.total) for body in list(self._bodies))
+        with self._lock:
+            return self._received
+
+
+class _CountedResponse:
+    def __init__(self, response, probe):
+        self._response = response
+        self._probe = probe
+
+    def read(self, *args):
+        chunk = self._response.read(*args)
+        self._probe.count(len(chunk))
+        return chunk
+
+    def close(self):
+        self._response.close()
+
+
+class SpeedtestBackend(ThroughputBackend):
+    """speedtest.net via speedtest-cli, with the server choice cached for ``ttl`` seconds."""
+
+    name = "speedtest.net"
+
+    def __init__(self, ttl=DEFAULT_SERVER_TTL, timeout=10):
+        self.ttl = ttl
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _client(self, cancel_event):
+        cached = _server_cache.get(self.ttl)
+        client = _speedtest_class()(cached, timeout=self.timeout, shutdown_event=cancel_event)
+        if cached is None:
+            best = client.get_best_server()
+            _server_cache.put(_copy_config(client.config), best)
+        return client
+
+    def prepare(self, cancel_event=None):
+        # One client per thread so concurrent tests don't share results.
+        self._local.client = self._client(cancel_event)
+        return self._local.client.best
+
+    def invalidate(self):
+        _server_cache.clear()
+
+    def _prepared(self, cancel_event):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self._client(cancel_event)
+        return client
+
+    def _transfer(self, phase, cancel_event, monitor):
+        client = self._prepared(cancel_event)
+        if monitor is None:
+            return getattr(client, phase)() / 1_000_000
+        length, opener, shutdown_event = client.config["length"], client._opener, client._shutdown_event
+        # speedtest-cli stops each transfer after config["length"] seconds; the
+        # cap, and the probe standing in for its opener and shutdown event,
+        # apply to this transfer only.
+        if monitor.max_seconds:
+            client.config["length"] = {**length, phase: min(length[phase], math.ceil(monitor.max_seconds))}
+        probe = _TransferProbe(opener, phase, cancel_event)
+        client._opener = client._shutdown_event = probe
+        done = threading.Event()
+        watcher = threading.Thread(target=_watch_transfer, args=(probe, monitor, done), name="speedtest-monitor", daemon=True)
+        watcher.start()
+        try:
+            return getattr(client, phase)() / 1_000_000
+        finally:
+            done.set()
+            watcher.join()
+            client.config["length"], client._opener, client._shutdown_event = length, opener, shutdown_event
+
+    def download(self, cancel_event=None, monitor=None):
+        return self._transfer("download", cancel_event, monitor)
+
+    def upload(self, cancel_event=None, monitor=None):
+        return self._transfer("upload", cancel_event, monitor)
+
+
+def _watch_transfer(probe, monitor, done):
+    """Feed ``monitor`` the probe's rate every interval until it says stop or ``done`` is set."""
+    ticker = _RateTicker(monitor)
+    while not done.wait(monitor.interval):
+        if ticker.update(probe.total()):
+            probe.stop()
+            return
+
+
+def _copy_config(config):
+    """Copy of a speedtest-cli config whose nested settings can be changed without touching ``config``."""
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in config.items()}
+
+
+_CachedSpeedtest = None
+
+
+def _speedtest_class():
+    """speedtest-cli client that reuses the cached config; speedtest is only imported on first use."""
+    global _CachedSpeedtest
+    if _CachedSpeedtest is None:
+        import speedtest
+
+        class CachedSpeedtest(speedtest.Speedtest):
+            # speedtest-cli always fetches its config in __init__; serve the
+            # cached copy instead when one is available.
+            def __init__(self, cached, **kwargs):
+                self._cached = cached
+                super().__init__(**kwargs)
+                if cached is not None:
+                    self._best = dict(cached[1])
+
+            def get_config(self):
+                if self._cached is None:
+                    return super().get_config()
+                self.config = _copy_config(self._cached[0])
+                client = self.config["client"]
+                self.lat_lon = (float(client["lat"]), float(client["lon"]))
+                return self.config
+
+        _CachedSpeedtest = CachedSpeedtest
+    return _CachedSpeedtest
+
+
+class Iperf3Backend(ThroughputBackend):
+    """iperf3 client against a server on the local network (``iperf3 -s``)."""
+
+    name = "iperf3"
+
+    def __init__(self, host, port=5201, duration=5, iperf_path="iperf3"):
+        self.host = host
+        self.port = port
+        self.duration = duration
+        self.iperf_path = iperf_path
+
+    def _run(self, reverse, cancel_event, monitor=None):
+        duration = self.duration
+        command = [self.iperf_path, "-c", self.host, "-p", str(self.port), "-J"]
+        if monitor is not None:
+            if monitor.max_seconds:
+                duration = min(duration, math.ceil(monitor.max_seconds))
+            command += ["-i", str(max(0.1, monitor.interval))]
+        command += ["-t", str(duration)]
+        if reverse:
+            command.append("-R")
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+        deadline = time.monotonic() + duration + 30
+        while process.poll() is None:
+            if (cancel_event is not None and cancel_event.is_set()) or time.monotonic() > deadline:
+                process.terminate()
+                process.wait()
+                raise ThroughputError("iperf3 run aborted")
+            time.sleep(0.05)
+        stdout, stderr = process.communicate()
+        try:
+            report = json.loads(stdout)
+        except ValueError:
+            raise ThroughputError(f"iperf3 failed: {stderr.strip() or stdout.strip()}")
+        if "error" in report:
+            raise ThroughputError(f"iperf3 failed: {report['error']}")
+        if monitor is not None:
+            # iperf3 only prints its JSON at the end, so the intervals give bounds but cannot stop the run early
+            for interval in report.get("intervals", []):
+                monitor.add(interval["sum"]["bits_per_second"] / 1_000_000, interval["sum"]["end"])
+        return report["end"]["sum_received"]["bits_per_second"] / 1_000_000
+
+    def download(self, cancel_event=None, monitor=None):
+        return self._run(True, cancel_event, monitor)
+
+    def upload(self, cancel_event=None, monitor=None):
+        return self._run(False, cancel_event, monitor)
+
+
+class HttpBackend(ThroughputBackend):
+    """Plain HTTP transfers against ``base_url`` (see :mod:`engine.fake_throughput`).
+
+    ``GET {base_url}/download?bytes=N`` must return N bytes and
+    ``POST {base_url}/upload`` must accept the request body. With a monitor
+    the download is closed and the (then chunked) upload ended once the
+    monitor has converged.
+    """
+
+    name = "http"
+    chunk_size = 64 * 1024
+
+    def __init__(self, base_url, download_bytes=25_000_000, upload_bytes=10_000_000, timeout=10):
+        self.base_url = base_url.rstrip("/")
+        self.download_bytes = download_bytes
+        self.upload_bytes = upload_bytes
+        self.timeout = timeout
+
+    def download(self, cancel_event=None, monitor=None):
+        url = f"{self.base_url}/download?bytes={self.download_bytes}"
+        received = 0
+        ticker = _RateTicker(monitor)
+        with urllib.request.urlopen(url, timeout=self.timeout) as response:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ThroughputError("Download cancelled")
+                chunk = response.read(self.chunk_size)
+                if not chunk:
+                    break
+                received += len(chunk)
+                if ticker.update(received):
+                    break
+        return received * 8 / (time.perf_counter() - ticker.start) / 1_000_000
+
+    def upload(self, cancel_event=None, monitor=None):
+        payload = b"\0" * self.chunk_size
+        sent = 0
+
+        def body():
+            nonlocal sent
+            while sent < self.upload_bytes:
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ThroughputError("Upload cancelled")
+                chunk = payload[:self.upload_bytes - sent]
+                yield chunk
+                sent += len(chunk)
+                if ticker.update(sent):
+                    return
+
+        headers = {"Content-Type": "application/octet-stream"}
+        if monitor is None:
+            headers["Content-Length"] = str(self.upload_bytes)
+        # Without a Content-Length urllib sends the body chunked, so it can end early
+        request = urllib.request.Request(f"{self.base_url}/upload", data=body(), method="POST", headers=headers)
+        ticker = _RateTicker(monitor)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+        return sent * 8 / (time.perf_counter() - ticker.start) / 1_000_000
+
+
+BACKENDS = {backend.name: backend for backend in (SpeedtestBackend, Iperf3Backend, HttpBackend)}
+
+
+def make_backend(name, target=None, server_ttl=None):
+    """Build a backend by its ``name``; ``target`` is the iperf3 host or HTTP base URL."""
+    name = name.lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown throughput backend {name!r}; choose from {', '.join(BACKENDS)}")
+    if name == SpeedtestBackend.name:
+        return SpeedtestBackend(ttl=server_ttl if server_ttl is not None else DEFAULT_SERVER_TTL)
+    if not target:
+        raise ValueError(f"The {name} backend needs a target")
+    return BACKENDS[name](target)
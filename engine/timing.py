@@ -0,0 +1,101 @@
+"""Lightweight timing spans for the test flow and page render.
+
+Stages wrap themselves in :func:`span`; each finished span is appended to a
+bounded in-memory buffer on the process-wide :data:`tracer`, which costs a
+couple of ``perf_counter`` calls and a lock. The buffer can be summarized
+per stage for the UI or exported as a Chrome trace (``chrome://tracing`` /
+Perfetto) to profile a slow site or phone after the fact.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+DEFAULT_CAPACITY = 20_000
+
+
+class Tracer:
+    """Thread-safe ring of finished spans ``(name, start, end, thread, args)``."""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._spans = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._threads = {}
+        # perf_counter has no fixed origin; remember where it was at a known wall time.
+        self.epoch = time.perf_counter()
+        self.epoch_wall = time.time()
+
+    def add(self, name, start, end, **args):
+        """Record a span measured with ``time.perf_counter`` timestamps."""
+        thread = threading.current_thread()
+        with self._lock:
+            self._threads[thread.ident] = thread.name
+            self._spans.append((name, start, end, thread.ident, args))
+
+    @contextmanager
+    def span(self, name, **args):
+        """Time the enclosed block as ``name``; ``args`` are kept with the span."""
+        start = time.perf_counter()
+        try:
+            yield args
+        finally:
+            self.add(name, start, time.perf_counter(), **args)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+
+    def summary(self):
+        """Per-stage ``count``, ``mean_ms``, ``p50_ms``, ``max_ms`` and ``total_s``, slowest first."""
+        durations = {}
+        for name, start, end, _, _ in self.spans():
+            durations.setdefault(name, []).append(end - start)
+        rows = []
+        for name, values in durations.items():
+            values.sort()
+            rows.append({
+                "Stage": name,
+                "count": len(values),
+                "mean_ms": round(sum(values) / len(values) * 1000, 2),
+                "p50_ms": round(values[len(values) // 2] * 1000, 2),
+                "max_ms": round(values[-1] * 1000, 2),
+                "total_s": round(sum(values), 3),
+            })
+        return sorted(rows, key=lambda row: row["total_s"], reverse=True)
+
+    def chrome_trace(self):
+        """The spans as a Chrome trace event document."""
+        pid = os.getpid()
+        spans = self.spans()
+        with self._lock:
+            threads = dict(self._threads)
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+            for tid, name in threads.items()
+        ]
+        for name, start, end, tid, args in spans:
+            events.append({
+                "name": name, "ph": "X", "pid": pid, "tid": tid,
+                "ts": round((start - self.epoch) * 1e6, 1), "dur": round((end - start) * 1e6, 1),
+                "args": {key: str(value) for key, value in args.items()},
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"epoch": self.epoch_wall}}
+
+    def export(self, path):
+        """Write :meth:`chrome_trace` to ``path`` and return the path."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+        return path
+
+
+tracer = Tracer()
+span = tracer.span
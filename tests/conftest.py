@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from engine.store import ReadingStore  # noqa: E402
+
+DUMPSYS_DIR = os.path.join(ROOT, "benchmarks", "fixtures", "dumpsys")
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ReadingStore(str(tmp_path / "readings.db"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def dumpsys():
+    """Captured registry dumps by fixture name."""
+    def load(name):
+        with open(os.path.join(DUMPSYS_DIR, f"{name}.txt"), encoding="utf-8") as f:
+            return f.read()
+    return load
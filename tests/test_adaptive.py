@@ -0,0 +1,32 @@
+import pytest
+
+from engine.adaptive import EXACT_DF, RateMonitor, t_quantile
+
+
+@pytest.mark.parametrize("p, df, expected", [
+    (0.975, 1, 12.706205),
+    (0.975, 2, 4.302653),
+    (0.975, 3, 3.182446),
+    (0.995, 3, 5.840909),
+    (0.95, 4, 2.131847),
+    (0.995, 7, 3.499483),
+    (0.9, 12, 1.356217),
+    (0.975, 30, 2.042272),
+    (0.995, 60, 2.660283),
+])
+def test_t_quantile_matches_the_tables(p, df, expected):
+    assert t_quantile(p, df) == pytest.approx(expected, rel=1e-5)
+    assert t_quantile(1 - p, df) == pytest.approx(-expected, rel=1e-5)
+
+
+def test_expansion_takes_over_where_it_is_accurate():
+    assert t_quantile(0.995, EXACT_DF + 1) == pytest.approx(2.744042, rel=1e-4)
+
+
+def test_monitor_converges_on_a_steady_rate():
+    monitor = RateMonitor(confidence=0.99, tolerance=0.05, min_samples=4)
+    rates = [50.0, 100.0, 101.0, 99.0, 100.5]
+    assert [monitor.add(rate, 0.25 * (i + 1)) for i, rate in enumerate(rates)] == [False] * 4 + [True]
+    mean, low, high = monitor.estimate()
+    assert mean == pytest.approx(100.125)
+    assert low < mean < high and (high - low) / 2 <= 0.05 * mean
@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from engine.adb import AdbClient, AdbCommandError, AdbError, get_session, close_sessions
+from engine.dumpsys import SIGNAL_COMMAND, parse_signal
+from engine.fake_adb import FakeAdbServer, FakeDevice
+
+
+@pytest.fixture
+def server(dumpsys):
+    devices = {
+        "emu1": FakeDevice.from_dumpsys(dumpsys("single_sim_lte")),
+        "emu2": FakeDevice.from_dumpsys(dumpsys("dual_sim_nr_nsa"), wifi_ip="192.168.1.51"),
+    }
+    with FakeAdbServer(devices) as server:
+        yield server
+    close_sessions()
+
+
+@pytest.fixture
+def client(server):
+    host, port = server.address
+    return AdbClient(host=host, port=port, timeout=5)
+
+
+def test_devices_and_shell(client):
+    assert client.devices() == [("emu1", "device"), ("emu2", "device")]
+    assert "inet 192.168.1.50/24" in client.shell("emu1", "ip -f inet addr show")
+
+
+def test_unknown_device_fails(client):
+    with pytest.raises(AdbError, match="not found"):
+        client.shell("nope", "true")
+
+
+def test_session_runs_commands_back_to_back(client, server):
+    session = client.session("emu1")
+    try:
+        for _ in range(3):
+            assert parse_signal(session.run(SIGNAL_COMMAND)).rsrp == -97
+        assert parse_signal(session.run(SIGNAL_COMMAND)).rat == "LTE"
+    finally:
+        session.close()
+    assert server.device("emu1").commands == [SIGNAL_COMMAND] * 4
+
+
+def test_session_reports_exit_status_and_stays_usable(client):
+    session = client.session("emu1")
+    try:
+        with pytest.raises(AdbCommandError) as info:
+            session.run("missing-tool --flag")
+        assert info.value.status == 127
+        assert info.value.output == "sh: missing-tool: not found\n"
+        assert session.run("missing-tool", check=False) == "sh: missing-tool: not found\n"
+        assert "wlan0" in session.run("ip -f inet addr show")
+    finally:
+        session.close()
+
+
+def test_session_output_with_marker_like_text(server, client):
+    server.device("emu1").responses["echo"] = "line\n__ADB_STATUS_9__ 0\nmore\n"
+    session = client.session("emu1")
+    try:
+        assert session.run("echo") == "line\n__ADB_STATUS_9__ 0\nmore\n"
+    finally:
+        session.close()
+
+
+def test_session_reconnects_after_server_drop(client):
+    session = client.session("emu1")
+    try:
+        session.run("ip -f inet addr show")
+        session._sock.close()
+        with pytest.raises(AdbError):
+            session.run("ip -f inet addr show")
+        assert "wlan0" in session.run("ip -f inet addr show")
+    finally:
+        session.close()
+
+
+def test_shared_sessions_are_per_server_and_serial(client, server):
+    assert get_session(client, "emu1") is get_session(client, "emu1")
+    assert get_session(client, "emu1") is not get_session(client, "emu2")
+    other = AdbClient(host=client.host, port=client.port + 1)
+    assert get_session(other, "emu1") is not get_session(client, "emu1")
+
+
+def test_concurrent_runs_are_serialised(client):
+    session = get_session(client, "emu2")
+    results = []
+
+    def poll():
+        for _ in range(10):
+            results.append(parse_signal(session.run(SIGNAL_COMMAND)).rsrp)
+
+    threads = [threading.Thread(target=poll) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [-88] * 40
+
+
+def test_connect_pairs_wifi_address(client):
+    assert client.connect("192.168.1.51:5555") == "connected to 192.168.1.51:5555"
+    assert ("192.168.1.51:5555", "device") in client.devices()
+    assert client.shell("192.168.1.51:5555", "ip -f inet addr show").count("192.168.1.51") == 1
+    assert "failed to connect" in client.connect("10.0.0.9:5555")
@@ -0,0 +1,189 @@
+import random
+import statistics
+import threading
+
+import pytest
+
+from engine import aggregates as aggregates_module
+from engine.aggregates import P2Quantile, ReadingAggregates, RunningStats
+from engine.signal import SignalReading
+
+
+def _exact(values, p):
+    values = sorted(values)
+    return values[round(p * (len(values) - 1))]
+
+
+@pytest.mark.parametrize("distribution", ["uniform", "normal", "exponential"])
+@pytest.mark.parametrize("p", [0.1, 0.5, 0.9])
+def test_p2_tracks_exact_quantile(distribution, p):
+    rng = random.Random(7)
+    draw = {
+        "uniform": lambda: rng.uniform(-120, -60),
+        "normal": lambda: rng.gauss(-90, 8),
+        "exponential": lambda: rng.expovariate(1 / 50),
+    }[distribution]
+    values = [draw() for _ in range(20_000)]
+    sketch = P2Quantile(p)
+    for value in values:
+        sketch.add(value)
+    spread = _exact(values, 0.95) - _exact(values, 0.05)
+    assert abs(sketch.value() - _exact(values, p)) < 0.02 * spread
+
+
+def test_p2_is_exact_below_five_values():
+    sketch = P2Quantile(0.5)
+    assert sketch.value() is None
+    for value in (3, 1, 2):
+        sketch.add(value)
+    assert sketch.value() == 2
+
+
+def test_p2_seeded_from_sorted_keeps_tracking():
+    rng = random.Random(3)
+    head = sorted(rng.gauss(50, 10) for _ in range(1_000))
+    tail = [rng.gauss(50, 10) for _ in range(5_000)]
+    sketch = P2Quantile.from_sorted(0.9, head)
+    assert sketch.value() == pytest.approx(_exact(head, 0.9), abs=0.5)
+    for value in tail:
+        sketch.add(value)
+    assert sketch.value() == pytest.approx(_exact(head + tail, 0.9), abs=1.0)
+
+
+def test_p2_rejects_bad_p():
+    with pytest.raises(ValueError):
+        P2Quantile(1.0)
+
+
+def test_running_stats_matches_batch():
+    values = [float(v) for v in range(-110, -60, 3)] + [None, float("nan")]
+    running = RunningStats()
+    for value in values:
+        running.add(value)
+    batch = RunningStats.from_values(values)
+    clean = [v for v in values if v is not None and v == v]
+    for stats in (running, batch):
+        assert stats.count == len(clean)
+        assert stats.mean == pytest.approx(statistics.fmean(clean))
+        assert stats.std == pytest.approx(statistics.pstdev(clean))
+        assert (stats.min, stats.max) == (min(clean), max(clean))
+
+
+def _signal(rsrp):
+    return SignalReading("LTE", rsrp=rsrp, level=3, operator="Jio")
+
+
+def test_attached_aggregates_follow_the_store(store):
+    store.append(1, "A", _signal(-90), 100.0, 20.0, device="emu1")
+    store.append(1, "B", _signal(-100), 50.0, None, device="emu2")
+    aggregates = ReadingAggregates.attach(store)
+    store.append(2, "A", _signal(-80), 10.0, 5.0, device="emu1")
+    assert aggregates.groups("floor") == [1, 2]
+    assert aggregates.stats("floor", 1, "Signal Strength (dBm)").mean == -95
+    assert aggregates.stats("device", "emu1", "Download Speed (Mbps)").mean == 55
+    assert aggregates.stats("location", (1, "B"), "Upload Speed (Mbps)").count == 0
+    assert aggregates.carrier_means() == {1: {"Jio": -95}, 2: {"Jio": -80}}
+    store.clear()
+    assert aggregates.groups("building") == []
+
+
+def test_seed_streams_chunks_into_the_sketches(store, monkeypatch):
+    rng = random.Random(5)
+    rows = [(floor, rng.randint(-120, -70)) for floor in (1, 2) for _ in range(60)]
+    rng.shuffle(rows)
+    for floor, rsrp in rows:
+        store.append(floor, "A", _signal(rsrp), 10.0, 1.0)
+    monkeypatch.setattr(aggregates_module, "_SEED_CHUNK", 7)
+    aggregates = ReadingAggregates.attach(store)
+    for floor in (1, 2):
+        values = [rsrp for row_floor, rsrp in rows if row_floor == floor]
+        stats = aggregates.stats("floor", floor, "Signal Strength (dBm)")
+        assert (stats.count, stats.min, stats.max) == (60, min(values), max(values))
+        assert stats.mean == pytest.approx(statistics.fmean(values))
+        assert stats.quantile(0.5) == pytest.approx(statistics.median(values), abs=5)
+    assert aggregates.last_id == 120
+
+
+def _paused_scan(store, monkeypatch):
+    """Make the seed's scan stop after its first chunk until the returned event is set."""
+    started, resume = threading.Event(), threading.Event()
+    scan = store.scan
+
+    def paused(columns, after_id=0, chunk=10_000):
+        for rows in scan(columns, after_id, chunk=1):
+            yield rows
+            started.set()
+            resume.wait(10)
+
+    monkeypatch.setattr(store, "scan", paused)
+    return started, resume
+
+
+def _attach_in_background(store):
+    attached = []
+    thread = threading.Thread(target=lambda: attached.append(ReadingAggregates.attach(store)))
+    thread.start()
+    return thread, attached
+
+
+def test_saves_do_not_wait_for_the_seed(store, monkeypatch):
+    for rsrp in (-90, -100):
+        store.append(1, "A", _signal(rsrp), 10.0, 1.0)
+    started, resume = _paused_scan(store, monkeypatch)
+    thread, attached = _attach_in_background(store)
+    assert started.wait(10)
+    # The writer must not block on the aggregates while the seed is running
+    assert store.submit(2, "B", _signal(-70), 30.0, 3.0).result(timeout=5) == 3
+    resume.set()
+    thread.join(10)
+    aggregates = attached[0]
+    assert aggregates.stats("building", "All", "Signal Strength (dBm)").count == 3
+    assert aggregates.groups("floor") == [1, 2]
+    store.append(2, "B", _signal(-80), 20.0, 2.0)
+    assert aggregates.stats("floor", 2, "Signal Strength (dBm)").mean == -75
+
+
+def test_clear_during_the_seed_drops_seeded_rows(store, monkeypatch):
+    for rsrp in (-90, -100):
+        store.append(1, "A", _signal(rsrp), 10.0, 1.0)
+    started, resume = _paused_scan(store, monkeypatch)
+    thread, attached = _attach_in_background(store)
+    assert started.wait(10)
+    store.clear()
+    store.append(3, "C", _signal(-60), 5.0, 1.0)
+    resume.set()
+    thread.join(10)
+    assert attached[0].groups("floor") == [3]
+
+
+def test_broken_listener_does_not_fail_saves(store):
+    class Broken:
+        def reading(self, row):
+            raise RuntimeError("boom")
+
+        def cleared(self):
+            pass
+
+    store.subscribe(Broken())
+    generation = store.generation
+    assert store.append(1, "A", _signal(-95), 1.0, 1.0) == 1
+    assert isinstance(store.listener_error, RuntimeError)
+    assert store.generation == generation + 1
+
+
+def test_listener_sees_row_before_future_resolves(store):
+    seen = []
+
+    class Listener:
+        def reading(self, row):
+            seen.append((row["id"], row["location"], store.generation))
+
+        def cleared(self):
+            seen.append("cleared")
+
+    store.subscribe(Listener())
+    generation = store.generation
+    store.append(2, "Hall", _signal(-95), 5.0, 1.0)
+    assert seen == [(1, "Hall", generation)]
+    store.clear()
+    assert seen[-1] == "cleared" and store.count() == 0
@@ -0,0 +1,59 @@
+import pytest
+
+from engine.dumpsys import narrow_output, parse_dumpsys, parse_signal
+from engine.signal import format_signal
+
+
+@pytest.mark.parametrize("name, rat, strength, operator", [
+    ("single_sim_lte", "LTE", -97, "Jio 4G"),
+    ("dual_sim_nr_nsa", "NR", -88, "airtel"),
+    ("dual_sim_wcdma_gsm", "WCDMA", -93, "BSNL Mobile"),
+])
+def test_serving_cell_of_each_fixture(dumpsys, name, rat, strength, operator):
+    signal = parse_signal(dumpsys(name), timestamp=1.0)
+    assert (signal.rat, signal.strength, signal.operator, signal.timestamp) == (rat, strength, operator, 1.0)
+
+
+def test_wcdma_and_gsm_metrics_stay_out_of_rsrp(dumpsys):
+    cells = {signal.rat: signal for signal in parse_dumpsys(dumpsys("dual_sim_wcdma_gsm"), 1.0)[1].signals}
+    wcdma, gsm = cells["WCDMA"], cells["GSM"]
+    assert (wcdma.rsrp, wcdma.rsrq, wcdma.rscp, wcdma.ecno, wcdma.level) == (None, None, -93, -7, 3)
+    assert (gsm.rsrp, gsm.rssi, gsm.level) == (None, -81, 2)
+    assert format_signal(parse_signal(dumpsys("dual_sim_wcdma_gsm"))).startswith("BSNL Mobile | 3G WCDMA | RSCP: -93 dBm")
+    assert "Signal Strength: -97 dBm" in format_signal(parse_signal(dumpsys("single_sim_lte")))
+
+
+@pytest.mark.parametrize("name", ["single_sim_lte", "dual_sim_nr_nsa", "dual_sim_wcdma_gsm"])
+def test_narrowed_output_parses_the_same(dumpsys, name):
+    output = dumpsys(name)
+    assert parse_dumpsys(narrow_output(output), 1.0) == parse_dumpsys(output, 1.0)
+
+
+def test_dual_sim_blocks(dumpsys):
+    sims = parse_dumpsys(dumpsys("dual_sim_nr_nsa"), 1.0)
+    assert [sim.phone_id for sim in sims] == [0, 1]
+    assert [sim.operator for sim in sims] == ["airtel", "Vi India"]
+    lte = {signal.rat: signal for signal in sims[0].signals}["LTE"]
+    assert (lte.rsrp, lte.rsrq, lte.sinr, lte.level) == (-92, -9, 18, 3)
+
+
+def test_out_of_service_sim_is_skipped(dumpsys):
+    sims = parse_dumpsys(dumpsys("dual_sim_wcdma_gsm"), 1.0)
+    assert not sims[0].in_service and sims[0].serving_signal() is None
+    assert sims[1].in_service
+
+
+def test_unavailable_values_and_missing_headers():
+    output = ("mSignalStrength=SignalStrength:{mLte=CellSignalStrengthLte: rssi=2147483647 rsrp=-101 "
+              "rsrq=-2147483647 rssnr=2147483647 level=2,primary=CellSignalStrengthLte}")
+    sims = parse_dumpsys(output, 1.0)
+    assert [sim.phone_id for sim in sims] == [0]
+    signal = parse_signal(output, 1.0)
+    assert (signal.rat, signal.rsrp, signal.rsrq, signal.sinr, signal.level) == ("LTE", -101, None, None, 2)
+
+
+def test_parsing_stops_at_local_logs(dumpsys):
+    output = dumpsys("single_sim_lte")
+    head, _, _ = output.partition("local logs:")
+    assert parse_dumpsys(output, 1.0) == parse_dumpsys(head, 1.0)
+    assert parse_signal("") is None
@@ -0,0 +1,137 @@
+import gzip
+import time
+
+import pytest
+
+from engine import cli
+from engine.adaptive import AdaptivePolicy
+from engine.adb import AdbClient, AdbCommandError, AdbError, close_sessions
+from engine.fake_adb import FakeAdbServer, FakeDevice
+from engine.fake_throughput import FixedRateBackend
+from engine.replay import Recorder, RecordingBackend, RecordingClient, ReplayBackend, ReplayClient, Trace, TraceError
+from engine.store import ReadingStore
+from engine.survey import establish_wifi_adb_connection, get_adb_devices, get_internet_speed, get_signal_strength
+from engine.throughput import ThroughputError
+
+
+@pytest.fixture
+def recorded(tmp_path, dumpsys, store):
+    """Path of a trace recorded against the fake server and a fixed-rate backend, and what was seen live."""
+    path = str(tmp_path / "survey.trace.gz")
+    device = FakeDevice.from_dumpsys(dumpsys("dual_sim_nr_nsa"))
+    with FakeAdbServer({"emu1": device}) as server, Recorder(path) as recorder:
+        host, port = server.address
+        client = RecordingClient(AdbClient(host=host, port=port, timeout=5), recorder)
+        backend = RecordingBackend(FixedRateBackend(95.0, 18.0, delay=0.5, jitter=0.02), recorder)
+        live = {
+            "devices": get_adb_devices(client),
+            "signals": [get_signal_strength(client, "emu1") for _ in range(3)],
+            "speed": get_internet_speed(backend, store, 1, "A", policy=AdaptivePolicy(interval=0.05)),
+        }
+        with pytest.raises(AdbCommandError):
+            client.session("emu1").run("missing-tool")
+    close_sessions()
+    return path, live
+
+
+def test_replay_returns_what_was_recorded(recorded, store):
+    path, live = recorded
+    trace = Trace.load(path)
+    client = ReplayClient(trace)
+    assert trace.devices() == ["emu1"]
+    assert get_adb_devices(client) == live["devices"]
+    replayed = [get_signal_strength(client, "emu1") for _ in range(3)]
+    assert [(s.rat, s.rsrp, s.operator) for s in replayed] == [(s.rat, s.rsrp, s.operator) for s in live["signals"]]
+    download, upload, error, bounds = get_internet_speed(ReplayBackend(trace), store, 1, "A", policy=AdaptivePolicy(interval=0.05))
+    assert (download, upload, error) == live["speed"][:3]
+    assert bounds == live["speed"][3]
+    with pytest.raises(AdbCommandError) as info:
+        client.session("emu1").run("missing-tool")
+    assert info.value.status == 127
+
+
+def test_replay_wraps_around_and_reports_missing_calls(recorded):
+    trace = Trace.load(recorded[0])
+    client = ReplayClient(trace)
+    rsrps = [get_signal_strength(client, "emu1").rsrp for _ in range(7)]
+    assert rsrps == [-88] * 7
+    with pytest.raises(AdbError, match="No recorded run on emu9"):
+        client.session("emu9").run("true")
+    with pytest.raises(ThroughputError, match="No recorded upload"):
+        ReplayBackend(Trace([])).upload()
+
+
+def test_truncated_trace_keeps_complete_events(recorded, tmp_path):
+    path, _ = recorded
+    with open(path, "rb") as f:
+        data = f.read()
+    cut = tmp_path / "cut.trace.gz"
+    cut.write_bytes(data[: len(data) * 2 // 3])
+    trace = Trace.load(str(cut))
+    assert 0 < len(trace) < len(Trace.load(path))
+
+
+def test_unreadable_traces(tmp_path):
+    empty = tmp_path / "empty.trace.gz"
+    with gzip.open(empty, "wt"):
+        pass
+    with pytest.raises(TraceError, match="Empty trace"):
+        Trace.load(str(empty))
+    future = tmp_path / "future.trace.gz"
+    with gzip.open(future, "wt") as f:
+        f.write('{"version": 99}\n')
+    with pytest.raises(TraceError, match="Unsupported trace version"):
+        Trace.load(str(future))
+    with pytest.raises(TraceError):
+        Trace.load(str(tmp_path / "missing.trace.gz"))
+
+
+def test_repeated_output_is_stored_once(recorded):
+    path, _ = recorded
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    strings = [line for line in lines if line.startswith('{"s":')]
+    assert len(strings) == len(set(strings))
+    assert sum("SignalStrength:{" in line for line in strings) == 1
+
+
+
+@pytest.fixture
+def wifi_trace(tmp_path, dumpsys, store, monkeypatch):
+    """Path of a trace of a one-point survey that switched its device to Wi-Fi ADB first."""
+    monkeypatch.setattr(AdbClient, "settle", lambda self, seconds: None)
+    path = str(tmp_path / "wifi.trace.gz")
+    with FakeAdbServer({"emu1": FakeDevice.from_dumpsys(dumpsys("single_sim_lte"))}) as server, Recorder(path) as recorder:
+        host, port = server.address
+        client = RecordingClient(AdbClient(host=host, port=port, timeout=5), recorder)
+        backend = RecordingBackend(FixedRateBackend(95.0, 18.0), recorder)
+        get_adb_devices(client)
+        devices = cli._connect_devices(client, ["emu1"], True, lambda message: None)
+        assert devices == ["192.168.1.50:5555"]
+        assert cli.run_survey(cli.build_plan(1, 1), devices, client, backend, store, 0, 1, 20.0) == 1
+    close_sessions()
+    return path
+
+
+def test_wifi_switch_replays_without_waiting(wifi_trace, monkeypatch):
+    monkeypatch.setattr(AdbClient, "settle", lambda self, seconds: pytest.fail("live wait during replay"))
+    client = ReplayClient(Trace.load(wifi_trace))
+    started = time.perf_counter()
+    device_id, message, _ = establish_wifi_adb_connection(client, "emu1")
+    assert device_id == "192.168.1.50:5555", message
+    assert time.perf_counter() - started < 1
+
+
+@pytest.mark.parametrize("flags", [[], ["--wifi"]])
+def test_wifi_trace_replays_with_or_without_the_flag(wifi_trace, tmp_path, capsys, flags):
+    db = str(tmp_path / "replayed.db")
+    argv = ["survey", "--floors", "1", "--points", "2", "--replay", wifi_trace, "--db", db, "--sample-rate", "20"]
+    assert cli.main(argv + flags) == 0
+    out = capsys.readouterr().out
+    assert "Done: 2 point(s) saved" in out
+    assert ("recorded with --wifi" in out) == (not flags)
+    store = ReadingStore(db)
+    try:
+        assert store.read_frame()["Device"].tolist() == ["192.168.1.50:5555"] * 2
+    finally:
+        store.close()
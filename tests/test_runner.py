@@ -0,0 +1,58 @@
+from engine import runner
+from engine.signal import SignalReading
+
+
+def _measure(progress, cancel_event):
+    progress("Download")
+    progress("Upload")
+    return 90.0, 15.0, None, {}
+
+
+def _job(save, measure=_measure):
+    readers = {"emu1": lambda: SignalReading("LTE", rsrp=-95, level=3)}
+    return runner.TestJob(1, "Lobby", readers, measure, save, sample_rate_hz=50.0)
+
+
+def test_job_stays_running_until_its_last_phase_is_closed(monkeypatch):
+    states = []
+    job = _job(lambda *args, **kwargs: (True, "saved"))
+
+    class Tracer:
+        def add(self, name, *args, **kwargs):
+            if name == "test.Saving":
+                states.append(job.state)
+
+    monkeypatch.setattr(runner, "tracer", Tracer())
+    job.start().join(10)
+    assert states == [runner.RUNNING]
+    assert job.state == runner.DONE and "Saving" in job.timings
+
+
+def test_result_reports_failed_saves():
+    job = _job(lambda *args, **kwargs: (False, "disk full")).start()
+    job.join(10)
+    assert job.state == runner.DONE
+    assert job.result["saved"] == {"emu1": False}
+    assert job.result["save_messages"] == {"emu1": "disk full"}
+
+
+def test_failing_speed_test_fails_the_job():
+    def broken(progress, cancel_event):
+        raise RuntimeError("no route")
+
+    job = _job(lambda *args, **kwargs: (True, ""), broken).start()
+    job.join(10)
+    assert (job.state, job.error, job.result) == (runner.FAILED, "no route", None)
+
+
+def test_cancelled_job_saves_nothing():
+    saves = []
+
+    def measure(progress, cancel_event):
+        cancel_event.wait(10)
+        return None, None, None, {}
+
+    job = _job(lambda *args, **kwargs: saves.append(args) or (True, ""), measure).start()
+    job.cancel()
+    job.join(10)
+    assert job.state == runner.CANCELLED and saves == []
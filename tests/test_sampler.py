@@ -0,0 +1,29 @@
+import math
+
+from engine.dumpsys import parse_dumpsys, parse_signal
+from engine.sampler import SignalSampler
+
+
+def test_wcdma_and_gsm_walks_are_sampled(dumpsys):
+    output = dumpsys("dual_sim_wcdma_gsm")
+    gsm = {signal.rat: signal for signal in parse_dumpsys(output, 1.0)[1].signals}["GSM"]
+    readings = iter([parse_signal(output, 1.0), parse_signal(output, 2.0), gsm])
+    sampler = SignalSampler(lambda: next(readings))
+    sampler.set_location("Stairs")
+    sampler.sample_once()
+    sampler.sample_once()
+    sampler.set_location("Lobby")
+    sampler.sample_once()
+    summaries = sampler.summaries()
+    assert (summaries["Stairs"]["count"], summaries["Stairs"]["mean"]) == (2, -93)
+    assert (summaries["Lobby"]["count"], summaries["Lobby"]["mean"]) == (1, -81)
+    _, dbm = sampler.series()
+    assert list(dbm) == [-93, -93, -81]
+
+
+def test_missing_readings_are_buffered_as_gaps():
+    sampler = SignalSampler(lambda: None)
+    sampler.set_location("Lobby")
+    sampler.sample_once()
+    _, dbm = sampler.series()
+    assert math.isnan(dbm[0]) and sampler.summary("Lobby")["count"] == 0
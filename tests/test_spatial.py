@@ -0,0 +1,23 @@
+from engine.signal import SignalReading
+from engine.spatial import HeatmapCache
+
+SIGNAL = SignalReading("LTE", rsrp=-95, level=3)
+METRIC = "Signal Strength (dBm)"
+
+
+def test_heatmap_cache_only_queries_after_a_save(store, monkeypatch):
+    store.append(1, "A", SIGNAL, 10.0, 1.0, position=(0.2, 0.2))
+    queries = []
+    for name in ("count_points", "read_points"):
+        query = getattr(store, name)
+        monkeypatch.setattr(store, name, lambda *args, query=query, name=name: queries.append(name) or query(*args))
+    cache = HeatmapCache(store, columns=16)
+    assert cache.count(1, METRIC) == 1 and cache.get(1, METRIC).count == 1
+    queries.clear()
+    for _ in range(3):
+        assert cache.count(1, METRIC) == 1 and cache.get(1, METRIC).count == 1
+    assert queries == []
+    store.append(1, "B", SIGNAL, 20.0, 2.0, position=(0.8, 0.8))
+    assert cache.count(1, METRIC) == 2 and cache.get(1, METRIC).count == 2
+    assert queries.count("count_points") == 2 and queries.count("read_points") == 1
+    assert cache.get(1, METRIC, aspect=0.5).count == 2
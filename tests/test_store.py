@@ -0,0 +1,159 @@
+import sqlite3
+
+import pandas as pd
+import pytest
+
+from engine import store as store_module
+from engine.signal import SignalReading
+from engine.store import SCHEMA_VERSION, ReadingStore
+
+SIGNAL = SignalReading("LTE", rsrp=-95, rsrq=-10, sinr=12, level=3, timestamp=1_700_000_000.0, operator="Jio")
+
+# Layouts written by earlier releases, by their PRAGMA user_version.
+_V0 = """CREATE TABLE readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, recorded_at REAL NOT NULL, floor INTEGER NOT NULL,
+    location TEXT NOT NULL, signal TEXT, download_mbps REAL, upload_mbps REAL)"""
+_V2 = """CREATE TABLE readings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, recorded_at REAL NOT NULL, floor INTEGER NOT NULL,
+    location TEXT NOT NULL, rat TEXT, rsrp INTEGER, rsrq INTEGER, sinr INTEGER, level INTEGER,
+    download_mbps REAL, upload_mbps REAL)"""
+
+
+def _old_database(path, schema, version, row):
+    conn = sqlite3.connect(path)
+    conn.execute(schema)
+    conn.execute(f"INSERT INTO readings VALUES ({', '.join('?' * len(row))})", row)
+    conn.execute(f"PRAGMA user_version={version}")
+    conn.commit()
+    conn.close()
+
+
+def _columns(path, table="readings"):
+    conn = sqlite3.connect(path)
+    try:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
+
+
+def _fresh(tmp_path):
+    """Path of a database created by the current release."""
+    path = str(tmp_path / "fresh.db")
+    store = ReadingStore(path)
+    store.count()
+    store.close()
+    return path
+
+
+def test_append_round_trip(store):
+    row_id = store.append(1, "Lobby", SIGNAL, 80.5, 20.25, device="emu1", timings={"adb": 0.1},
+                          position=(0.25, 0.75), bounds={"download": (78.0, 83.0)})
+    assert row_id == store.last_id() == 1
+    df = store.read_frame()
+    row = df.iloc[0]
+    assert (row["Floor"], row["Location"], row["Network"], row["Carrier"]) == (1, "Lobby", "LTE", "Jio")
+    assert (row["Signal Strength (dBm)"], row["X"], row["Y"]) == (-95, 0.25, 0.75)
+    assert (row["Download CI Low (Mbps)"], row["Download CI High (Mbps)"]) == (78.0, 83.0)
+    assert pd.isna(row["Upload CI Low (Mbps)"])
+
+
+def test_migrates_typed_layout_to_current(tmp_path):
+    path = str(tmp_path / "v2.db")
+    _old_database(path, _V2, 2, (1, 1_600_000_000.0, 3, "Stairs", "NR", -88, -11, 16, 3, 120.0, 30.0))
+    store = ReadingStore(path)
+    try:
+        df = store.read_frame()
+        assert list(df["Location"]) == ["Stairs"]
+        assert df["Signal Strength (dBm)"].iloc[0] == -88
+        assert store.append(3, "Roof", SIGNAL, 1.0, 1.0, device="emu1", position=(0.5, 0.5)) == 2
+    finally:
+        store.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    conn.close()
+    assert _columns(path) == _columns(_fresh(tmp_path))
+
+
+@pytest.mark.parametrize("version", [2, 3, 4, 5, 6])
+def test_every_intermediate_version_reaches_current(tmp_path, version):
+    path = str(tmp_path / f"v{version}.db")
+    _old_database(path, _V2, 2, (1, 1_600_000_000.0, 1, "A", "LTE", -90, -9, 10, 3, 10.0, 2.0))
+    conn = sqlite3.connect(path)
+    for step in range(2, version):
+        for statement in store_module._MIGRATIONS[step]:
+            conn.execute(statement)
+    conn.execute(f"PRAGMA user_version={version}")
+    conn.commit()
+    conn.close()
+    store = ReadingStore(path)
+    try:
+        assert store.count() == 1
+    finally:
+        store.close()
+    assert _columns(path) == _columns(_fresh(tmp_path))
+
+
+def test_untyped_layout_is_set_aside(tmp_path):
+    path = str(tmp_path / "v0.db")
+    _old_database(path, _V0, 0, (1, 1_500_000_000.0, 1, "Lobby", "4G LTE | -95 dBm", 10.0, 2.0))
+    store = ReadingStore(path)
+    try:
+        assert store.count() == 0
+    finally:
+        store.close()
+    conn = sqlite3.connect(path)
+    assert conn.execute("SELECT location, signal FROM readings_v0").fetchall() == [("Lobby", "4G LTE | -95 dBm")]
+    conn.close()
+
+
+def test_wcdma_and_gsm_strengths_move_out_of_rsrp(tmp_path):
+    path = str(tmp_path / "v2.db")
+    _old_database(path, _V2, 2, (1, 1.0, 1, "A", "WCDMA", -93, -7, None, 3, None, None))
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO readings VALUES (2, 2.0, 1, 'B', 'GSM', -81, NULL, NULL, 2, NULL, NULL)")
+    conn.execute("INSERT INTO readings VALUES (3, 3.0, 1, 'C', 'LTE', -97, -10, 12, 3, NULL, NULL)")
+    conn.commit()
+    conn.close()
+    store = ReadingStore(path)
+    try:
+        df = store.read_frame()
+    finally:
+        store.close()
+    strengths = df[["Signal Strength (dBm)", "RSRQ (dB)", "RSCP (dBm)", "EcNo (dB)", "RSSI (dBm)"]]
+    assert strengths.fillna(0).astype(int).values.tolist() == [[0, 0, -93, -7, 0], [0, 0, 0, 0, -81], [-97, -10, 0, 0, 0]]
+
+
+def test_stores_rat_specific_metrics(store):
+    store.append(1, "A", SignalReading("WCDMA", rscp=-93, ecno=-7, level=3), 1.0, 1.0)
+    row = store.read_frame().iloc[0]
+    assert (row["RSCP (dBm)"], row["EcNo (dB)"]) == (-93, -7)
+    assert pd.isna(row["Signal Strength (dBm)"]) and pd.isna(row["RSSI (dBm)"])
+
+
+def test_generation_follows_rows_appended_by_another_process(tmp_path):
+    path = str(tmp_path / "shared.db")
+    app, cli = ReadingStore(path), ReadingStore(path)
+    seen = []
+
+    class Listener:
+        def reading(self, row):
+            seen.append(row["location"])
+
+        def cleared(self):
+            pass
+
+    try:
+        app.append(1, "A", SIGNAL, 1.0, 1.0)
+        app.subscribe(Listener())
+        generation = app.generation
+        assert app.generation == generation
+        cli.append(1, "B", SIGNAL, 2.0, 1.0)
+        assert app.generation == generation + 1
+        assert app.generation == generation + 1
+        app.append(2, "C", SIGNAL, 3.0, 1.0)
+        cli.append(2, "D", SIGNAL, 4.0, 1.0)
+        app.append(2, "E", SIGNAL, 5.0, 1.0)
+        assert seen == ["B", "C", "D", "E"]
+    finally:
+        app.close()
+        cli.close()
@@ -0,0 +1,57 @@
+import sqlite3
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from engine import store as store_module
+from engine.signal import SignalReading
+
+SIGNAL = SignalReading("LTE", rsrp=-95, rsrq=-10, sinr=12, level=3, timestamp=1_700_000_000.0, operator="Jio")
+
+
+def test_concurrent_submits_all_resolve(store):
+    futures = []
+
+    def worker(device):
+        for i in range(25):
+            futures.append(store.submit(1, f"P{i}", SIGNAL, 50.0, 10.0, device=device))
+
+    threads = [threading.Thread(target=worker, args=(f"emu{n}",)) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [future.result(timeout=10) for future in futures]
+    assert sorted(ids) == list(range(1, 101))
+    assert store.count() == 100
+
+
+def _bad_row():
+    # location is NOT NULL
+    return (1.0,) + (None,) * (len(store_module._INSERT_FIELDS) - 1)
+
+
+def test_failed_write_fails_its_future_and_writer_keeps_going(store):
+    store.append(1, "A", SIGNAL, 1.0, 1.0)
+    with pytest.raises(sqlite3.IntegrityError):
+        store._submit(store_module._INSERT, _bad_row()).result(timeout=10)
+    assert store.append(1, "B", SIGNAL, 1.0, 1.0) == 2
+    assert store.count() == 2
+
+
+def test_failed_batch_rolls_back_and_fails_every_future(store):
+    store.append(1, "A", SIGNAL, 1.0, 1.0)
+    good, bad = Future(), Future()
+    params = store_module._INSERT_FIELDS
+    good_row = tuple({"recorded_at": 2.0, "floor": 1, "location": "B"}.get(field) for field in params)
+    conn = store._connect()
+    try:
+        store._commit(conn, [(store_module._INSERT, good_row, good), (store_module._INSERT, _bad_row(), bad)])
+        assert not conn.in_transaction
+    finally:
+        conn.close()
+    for future in (good, bad):
+        with pytest.raises(sqlite3.IntegrityError):
+            future.result(timeout=0)
+    assert store.count() == 1
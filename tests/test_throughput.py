@@ -0,0 +1,122 @@
+import sys
+import time
+import types
+import urllib.request
+
+import pytest
+
+from engine import throughput
+from engine.adaptive import RateMonitor
+
+
+class _Opener:
+    """Serves an endless body, a chunk per millisecond."""
+
+    def open(self, request):
+        return self
+
+    def read(self, size=10240):
+        time.sleep(0.001)
+        return b"\0" * size
+
+    def close(self):
+        pass
+
+
+def _streamed_download(self):
+    """Reads chunks until stopped or out of time, the way speedtest-cli's threads do."""
+    start = time.perf_counter()
+    received = 0
+    try:
+        response = self._opener.open(urllib.request.Request("http://speedtest.example/random350x350.jpg"))
+        while not self._shutdown_event.isSet() and time.perf_counter() - start <= self.config["length"]["download"]:
+            received += len(response.read(10240))
+        response.close()
+    except IOError:
+        pass
+    return received * 8 / (time.perf_counter() - start)
+
+
+class _Speedtest:
+    """Minimal speedtest-cli client recording the length each transfer ran with."""
+
+    lengths = []
+
+    def __init__(self, timeout=10, shutdown_event=None):
+        self.config = {}
+        self._best = {}
+        self._opener = _Opener()
+        self._shutdown_event = shutdown_event
+        self.get_config()
+
+    def get_config(self):
+        self.config = {"client": {"lat": "0", "lon": "0"}, "length": {"download": 10, "upload": 10}}
+        return self.config
+
+    def get_best_server(self):
+        self._best = {"host": "speedtest.example:8080"}
+        return self._best
+
+    @property
+    def best(self):
+        return self._best
+
+    def download(self):
+        self.lengths.append(("download", self.config["length"]["download"]))
+        return 80_000_000
+
+    def upload(self):
+        self.lengths.append(("upload", self.config["length"]["upload"]))
+        return 20_000_000
+
+
+@pytest.fixture
+def speedtest_stub(monkeypatch):
+    module = types.ModuleType("speedtest")
+    module.Speedtest = _Speedtest
+    monkeypatch.setitem(sys.modules, "speedtest", module)
+    monkeypatch.setattr(throughput, "_CachedSpeedtest", None)
+    throughput._server_cache.clear()
+    _Speedtest.lengths = []
+    yield _Speedtest.lengths
+    throughput._server_cache.clear()
+
+
+def test_adaptive_cap_does_not_leak_into_cached_config(speedtest_stub):
+    backend = throughput.SpeedtestBackend()
+    backend.prepare()
+    assert backend.download(monitor=RateMonitor(max_seconds=3)) == 80
+    backend.prepare()
+    backend.download()
+    backend.upload()
+    assert speedtest_stub == [("download", 3), ("download", 10), ("upload", 10)]
+
+
+def test_cap_is_undone_on_the_same_client(speedtest_stub):
+    backend = throughput.SpeedtestBackend()
+    backend.prepare()
+    backend.upload(monitor=RateMonitor(max_seconds=2.5))
+    backend.upload()
+    assert speedtest_stub == [("upload", 3), ("upload", 10)]
+
+
+def test_server_cache_is_reused_within_ttl(speedtest_stub, monkeypatch):
+    calls = []
+    monkeypatch.setattr(_Speedtest, "get_best_server", lambda self: calls.append(1) or {"host": "x"})
+    backend = throughput.SpeedtestBackend()
+    backend.prepare()
+    backend.prepare()
+    assert len(calls) == 1
+
+
+def test_monitor_stops_the_transfer_early_with_bounds(speedtest_stub, monkeypatch):
+    monkeypatch.setattr(_Speedtest, "download", _streamed_download)
+    backend = throughput.SpeedtestBackend()
+    backend.prepare()
+    monitor = RateMonitor(tolerance=0.5, interval=0.05, max_seconds=5)
+    assert backend.download(monitor=monitor) > 0
+    mean, low, high = monitor.estimate()
+    assert monitor.converged and monitor.elapsed < 5
+    assert low is not None and low <= mean <= high
+    client = backend._local.client
+    assert isinstance(client._opener, _Opener) and client._shutdown_event is None